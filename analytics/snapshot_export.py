@@ -0,0 +1,272 @@
+"""
+Analytics Snapshot Export
+Copies stores, job_submissions and their related tables into a local
+Parquet dataset so analysis runs against files instead of production.
+
+Layout (hive partitioning, readable by pyarrow.dataset / DuckDB / pandas):
+
+    <out>/stores/state_code=TX/month=2025-12/part-<run>-<n>.parquet
+    <out>/job_submissions/state_code=TX/month=2026-03/part-<run>-<n>.parquet
+    <out>/jobs/month=2026-03/...        <out>/skus/...   <out>/brands/...
+    <out>/job_store_skus/month=2026-03/...
+    <out>/_watermarks.json
+
+state_code is the store's normalized state (a submission takes its store's;
+stores keep their raw state column as exported). month is the row's
+created_at month, so a row stays in one partition when it is later updated. job_submissions.data is flattened into data_<key> text
+columns and files into a photo_count plus the raw JSON.
+
+Incremental runs fetch only rows whose updated_at is at or after the last
+watermark and append new part files; an updated row therefore appears once
+per export, and read_snapshot() keeps the newest copy of each id. Tables
+without updated_at (job_store_skus) are re-exported in full each run. Part
+files are written hidden and renamed into place when the table finishes (a
+full refresh removes the previous files only then), and the watermark only
+advances after that, so an interrupted run is simply repeated.
+
+Usage:
+    python3 snapshot_export.py OUT_DIR [--tables stores,job_submissions] [--full]
+
+    from snapshot_export import read_snapshot
+    df = read_snapshot('snapshot', 'job_submissions', filter=('state_code', '==', 'TX'))
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'stores'))
+from store_loader import normalize_state  # noqa: E402
+
+PAGE_SIZE   = 1000
+FLUSH_ROWS  = 100_000   # buffered rows across partitions before part files are written
+UNKNOWN     = '__unknown__'
+
+# table -> partition columns and the column incremental runs filter on (None = full refresh)
+TABLES = {
+    'stores':          {'partition': ('state_code', 'month'), 'watermark': 'updated_at'},
+    'job_submissions': {'partition': ('state_code', 'month'), 'watermark': 'updated_at'},
+    'jobs':            {'partition': ('month',),              'watermark': 'updated_at'},
+    'skus':            {'partition': (),                      'watermark': 'updated_at'},
+    'brands':          {'partition': (),                      'watermark': 'updated_at'},
+    'job_store_skus':  {'partition': ('month',),              'watermark': None},
+}
+
+
+# ── Row shaping ───────────────────────────────────────────────────────────────
+def _text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return json.dumps(value, sort_keys=True)
+
+
+def flatten_submission(row: dict) -> dict:
+    """Spread data JSONB into data_<key> text columns; summarize files."""
+    out = {k: v for k, v in row.items() if k not in ('data', 'files')}
+    data = row.get('data') or {}
+    if isinstance(data, str):
+        data = json.loads(data)
+    for key, value in data.items():
+        out['data_' + key] = _text(value)
+    files = row.get('files') or []
+    if isinstance(files, str):
+        files = json.loads(files)
+    out['photo_count'] = len(files)
+    out['files'] = json.dumps([{k: v for k, v in f.items() if k != 'file_data'} for f in files]) if files else None
+    return out
+
+
+def _month(value) -> str:
+    return str(value)[:7] if value else UNKNOWN
+
+
+def _stringify_nested(row: dict) -> dict:
+    return {k: (json.dumps(v, sort_keys=True) if isinstance(v, (dict, list)) else v) for k, v in row.items()}
+
+
+# ── Writing ───────────────────────────────────────────────────────────────────
+class PartitionWriter:
+    """Buffers rows per partition and writes them as hidden part files until commit()."""
+
+    def __init__(self, table_dir: str, partition: tuple, run_id: str):
+        self.table_dir = table_dir
+        self.partition = partition
+        self.run_id    = run_id
+        self.buffers   = defaultdict(list)
+        self.buffered  = 0
+        self.pending   = []   # (hidden path, final path)
+        self.rows      = 0
+
+    def add(self, key: tuple, row: dict):
+        self.buffers[key].append(row)
+        self.buffered += 1
+        self.rows += 1
+        if self.buffered >= FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        for key, rows in self.buffers.items():
+            if not rows:
+                continue
+            directory = os.path.join(self.table_dir, *(f'{col}={val}' for col, val in zip(self.partition, key)))
+            os.makedirs(directory, exist_ok=True)
+            name = f'part-{self.run_id}-{len(self.pending):05d}.parquet'
+            hidden = os.path.join(directory, '.' + name)
+            pq.write_table(pa.Table.from_pylist(rows), hidden, compression='zstd')
+            self.pending.append((hidden, os.path.join(directory, name)))
+        self.buffers.clear()
+        self.buffered = 0
+
+    def commit(self):
+        self.flush()
+        for hidden, final in self.pending:
+            os.replace(hidden, final)
+        self.pending = []
+
+
+def _load_watermarks(out_dir):
+    path = os.path.join(out_dir, '_watermarks.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def _save_watermarks(out_dir, marks):
+    path = os.path.join(out_dir, '_watermarks.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(marks, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def _part_files(table_dir):
+    return [os.path.join(d, f) for d, _, names in os.walk(table_dir) for f in names if f.endswith('.parquet')]
+
+
+def _iter_rows(client, table, watermark_col, since, page_size):
+    """Page through a table, oldest change first, from since (inclusive) when given."""
+    order_col = watermark_col or 'created_at'
+    start = 0
+    while True:
+        query = client.table(table).select('*')
+        if since is not None:
+            query = query.gte(watermark_col, since)
+        page = query.order(order_col).order('id').range(start, start + page_size - 1).execute().data or []
+        yield from page
+        if len(page) < page_size:
+            break
+        start += page_size
+
+
+def export_snapshot(client, out_dir: str, tables=None, full: bool = False, page_size: int = PAGE_SIZE) -> dict:
+    """Export tables (default: all of TABLES) into out_dir; returns {table: rows written}."""
+    os.makedirs(out_dir, exist_ok=True)
+    marks = _load_watermarks(out_dir)
+    run_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:6]
+    stats = {}
+
+    store_states = None
+    for table in tables or TABLES:
+        spec = TABLES[table]
+        watermark_col = spec['watermark']
+        table_dir = os.path.join(out_dir, table)
+        incremental = watermark_col is not None and not full and (marks.get(table) or {}).get('value') is not None
+        # A full refresh replaces the table's files, but only once the new ones are in place
+        replaced = [] if incremental else _part_files(table_dir)
+
+        if table == 'job_submissions' and store_states is None:
+            from store_loader import load_stores
+            store_states = {s['id']: normalize_state(s.get('state') or '') or UNKNOWN
+                            for s in load_stores(client, 'id, state', page_size)}
+
+        writer = PartitionWriter(table_dir, spec['partition'], run_id)
+        since = marks[table]['value'] if incremental else None
+        high = since
+        started = time.perf_counter()
+        for row in _iter_rows(client, table, watermark_col, since, page_size):
+            if watermark_col and row.get(watermark_col) and (high is None or row[watermark_col] > high):
+                high = row[watermark_col]
+            if table == 'job_submissions':
+                state = store_states.get(row.get('store_id'), UNKNOWN)
+                row = flatten_submission(row)
+            else:
+                state = normalize_state(row.get('state') or '') or UNKNOWN
+                row = _stringify_nested(row)
+            values = {'state_code': state, 'month': _month(row.get('created_at'))}
+            writer.add(tuple(values[col] for col in spec['partition']), row)
+        writer.commit()
+        for path in replaced:
+            os.remove(path)
+
+        marks[table] = {'column': watermark_col, 'value': high,
+                        'exported_at': datetime.now(timezone.utc).isoformat(), 'rows': writer.rows}
+        _save_watermarks(out_dir, marks)
+        stats[table] = writer.rows
+        print(f"   {table}: {writer.rows} rows {'since ' + since if incremental else '(full)'} "
+              f"in {time.perf_counter() - started:.1f}s")
+    return stats
+
+
+# ── Reading ───────────────────────────────────────────────────────────────────
+def open_dataset(out_dir: str, table: str):
+    """pyarrow dataset over every part file of a table, with schemas unified across runs."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    root = os.path.join(out_dir, table)
+    files = sorted(f for f in _part_files(root) if not os.path.basename(f).startswith('.'))
+    part_schema = pa.schema([pa.field(col, pa.string()) for col in TABLES.get(table, {}).get('partition', ())])
+    schema = pa.unify_schemas([pq.read_schema(f) for f in files] + [part_schema], promote_options='permissive')
+    return ds.dataset(files, schema=schema, format='parquet', partition_base_dir=root,
+                      partitioning=ds.partitioning(part_schema, flavor='hive') if len(part_schema) else None)
+
+
+_OPS = {'==': '__eq__', '!=': '__ne__', '>': '__gt__', '>=': '__ge__', '<': '__lt__', '<=': '__le__'}
+
+
+def read_snapshot(out_dir: str, table: str, filter=None, columns=None, latest: bool = True):
+    """
+    Load a table as a pandas DataFrame. filter is a pyarrow expression or a
+    (column, op, value) tuple; partition columns (state_code, month) prune files.
+    With latest, only the newest copy of each id is kept.
+    """
+    import pyarrow.dataset as ds
+    if isinstance(filter, tuple):
+        col, op, value = filter
+        filter = ds.field(col).isin(list(value)) if op == 'in' else getattr(ds.field(col), _OPS[op])(value)
+    watermark_col = TABLES.get(table, {}).get('watermark')
+    if columns is not None and latest:
+        columns = list(dict.fromkeys(list(columns) + ['id'] + ([watermark_col] if watermark_col else [])))
+    df = open_dataset(out_dir, table).to_table(columns=columns, filter=filter).to_pandas()
+    if latest and watermark_col and len(df) and 'id' in df:
+        df = df.sort_values([watermark_col, 'id']).drop_duplicates('id', keep='last').reset_index(drop=True)
+    return df
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export a Parquet snapshot for analytics.')
+    parser.add_argument('out_dir')
+    parser.add_argument('--tables', default=','.join(TABLES), help='comma-separated subset of tables')
+    parser.add_argument('--full', action='store_true', help='ignore watermarks and re-export everything')
+    args = parser.parse_args()
+
+    unknown = [t for t in args.tables.split(',') if t not in TABLES]
+    if unknown:
+        parser.error(f'unknown tables: {unknown}')
+
+    from store_loader import supabase_from_env
+    print(f"📦 Exporting snapshot to {args.out_dir}")
+    stats = export_snapshot(supabase_from_env(), args.out_dir, args.tables.split(','), full=args.full)
+    print(f"✅ {sum(stats.values())} rows exported")
@@ -0,0 +1,300 @@
+"""
+Submission Aggregates
+Materialized rollups of approved job_submissions for brand dashboards and
+rollup reports: stock level and price verification counts per week by
+brand, banner, store and SKU.
+
+Submissions are flattened with the snapshot exporter's rules (data JSONB to
+data_<key> columns) and reduced to one contribution row per submission:
+
+    brand_id, banner, store_id, sku_id, week   (week = Monday of created_at)
+    submissions, in_stock, low_stock, out_of_stock, stock_unknown,
+    price_checked, price_verified, price_mismatch,
+    price_found_n, price_found_sum, price_gap_n, price_gap_sum
+
+Every metric is additive, so each rollup is a sum of contributions. An
+incremental refresh fetches submissions updated since the last watermark,
+subtracts their previous contributions (if any), adds the new ones when the
+submission is approved, and applies the difference to every rollup with a
+vectorized group-by. A submission that stops being approved (superseded,
+rejected) simply drops out.
+
+    <cache>/contributions.parquet       one row per approved submission
+    <cache>/rollup-<level>.parquet      one row per level key and week
+    <cache>/_state.json                 watermark and counts
+
+window() answers "in-stock rate by banner over the last 8 weeks" from an
+in-memory dict keyed by (level key..., week): one lookup per week,
+independent of how many submissions there are.
+
+Usage:
+    python3 submission_aggregates.py refresh CACHE_DIR [--full]
+    python3 submission_aggregates.py query CACHE_DIR --level banner --key BRAND_ID "H-E-B" [--weeks 8]
+
+    from submission_aggregates import SubmissionAggregates
+    agg = SubmissionAggregates('aggregates')
+    agg.window('banner', (brand_id, 'H-E-B'), weeks=8)['in_stock_rate']
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from snapshot_export import PAGE_SIZE, UNKNOWN, _iter_rows, flatten_submission
+
+BATCH_SIZE = 200       # ids per in_() lookup
+APPLY_ROWS = 20_000    # submissions fetched before they are folded into the rollups
+
+DIMENSIONS = ['brand_id', 'banner', 'store_id', 'sku_id', 'week']
+METRICS = ['submissions', 'in_stock', 'low_stock', 'out_of_stock', 'stock_unknown',
+           'price_checked', 'price_verified', 'price_mismatch',
+           'price_found_n', 'price_found_sum', 'price_gap_n', 'price_gap_sum']
+
+# level -> key columns (week is always added)
+LEVELS = {
+    'brand':      ('brand_id',),
+    'banner':     ('brand_id', 'banner'),
+    'store':      ('brand_id', 'store_id'),
+    'sku':        ('brand_id', 'sku_id'),
+    'banner_sku': ('brand_id', 'banner', 'sku_id'),
+}
+
+# stock_level spellings used by the capture forms and generate_report.stock_level_style
+IN_STOCK     = {'in stock', 'full'}
+LOW_STOCK    = {'low', 'low stock'}
+OUT_OF_STOCK = {'out of stock', 'oos', 'empty'}
+
+
+# ── Contributions ─────────────────────────────────────────────────────────────
+def _column(df, name):
+    import pandas as pd
+    return df[name] if name in df else pd.Series(None, index=df.index, dtype=object)
+
+
+def _price(series):
+    import pandas as pd
+    return pd.to_numeric(series.fillna('').astype(str).str.replace(r'[^0-9.\-]', '', regex=True), errors='coerce')
+
+
+def contributions(submissions: list, dims: dict):
+    """
+    DataFrame (index id) of DIMENSIONS + METRICS for approved submissions.
+    dims maps submission id -> {'brand_id', 'banner'}.
+    """
+    import pandas as pd
+    rows = [flatten_submission(s) for s in submissions if s.get('review_outcome') == 'approved']
+    if not rows:
+        return pd.DataFrame(columns=DIMENSIONS + METRICS, index=pd.Index([], name='id'))
+    df = pd.DataFrame(rows).set_index('id')
+    out = pd.DataFrame(index=df.index)
+    out['brand_id'] = [dims.get(i, {}).get('brand_id') or UNKNOWN for i in df.index]
+    out['banner']   = [dims.get(i, {}).get('banner') or UNKNOWN for i in df.index]
+    out['store_id'] = _column(df, 'store_id').fillna(UNKNOWN).astype(str)
+    out['sku_id']   = _column(df, 'sku_id').fillna(UNKNOWN).astype(str)
+    created = pd.to_datetime(_column(df, 'created_at'), utc=True, format='ISO8601')
+    out['week'] = (created.dt.tz_localize(None).dt.normalize()
+                   - pd.to_timedelta(created.dt.weekday, unit='D')).dt.strftime('%Y-%m-%d').fillna(UNKNOWN)
+
+    stock = _column(df, 'data_stock_level').fillna('').astype(str).str.lower().str.replace('_', ' ').str.strip()
+    out['submissions']   = 1
+    out['in_stock']      = stock.isin(IN_STOCK).astype(int)
+    out['low_stock']     = stock.isin(LOW_STOCK).astype(int)
+    out['out_of_stock']  = stock.isin(OUT_OF_STOCK).astype(int)
+    out['stock_unknown'] = 1 - out['in_stock'] - out['low_stock'] - out['out_of_stock']
+
+    verified = _column(df, 'data_price_verified').fillna('').astype(str).str.lower()
+    out['price_verified'] = (verified == 'true').astype(int)
+    out['price_mismatch'] = (verified == 'false').astype(int)
+    out['price_checked']  = out['price_verified'] + out['price_mismatch']
+
+    found = _price(_column(df, 'data_price').fillna(_column(df, 'data_price_found')))
+    gap = found - _price(_column(df, 'data_price_expected'))
+    out['price_found_n']   = found.notna().astype(int)
+    out['price_found_sum'] = found.fillna(0.0)
+    out['price_gap_n']     = gap.notna().astype(int)
+    out['price_gap_sum']   = gap.fillna(0.0)
+    return out[DIMENSIONS + METRICS]
+
+
+def _select_in(client, table, columns, values):
+    rows = []
+    values = [v for v in dict.fromkeys(values) if v]
+    for i in range(0, len(values), BATCH_SIZE):
+        rows.extend(client.table(table).select(columns).in_('id', values[i:i + BATCH_SIZE]).execute().data or [])
+    return {r['id']: r for r in rows}
+
+
+def load_dimensions(client, submissions: list) -> dict:
+    """{submission id: {'brand_id', 'banner'}} from the submissions' jobs and stores."""
+    jobs = _select_in(client, 'jobs', 'id, brand_id', (s.get('job_id') for s in submissions))
+    stores = _select_in(client, 'stores', 'id, banner, store_chain', (s.get('store_id') for s in submissions))
+    dims = {}
+    for s in submissions:
+        store = stores.get(s.get('store_id')) or {}
+        dims[s['id']] = {'brand_id': (jobs.get(s.get('job_id')) or {}).get('brand_id'),
+                         'banner':   store.get('banner') or store.get('store_chain')}
+    return dims
+
+
+# ── Cache ─────────────────────────────────────────────────────────────────────
+def _empty_rollup(level):
+    import pandas as pd
+    return pd.DataFrame(columns=list(LEVELS[level]) + ['week'] + METRICS).set_index(list(LEVELS[level]) + ['week'])
+
+
+def _write_parquet(df, path):
+    df.to_parquet(path + '.tmp', engine='pyarrow', compression='zstd')
+    os.replace(path + '.tmp', path)
+
+
+class SubmissionAggregates:
+    """Contribution table plus one rollup per level, loaded from and saved to cache_dir."""
+
+    def __init__(self, cache_dir: str):
+        import pandas as pd
+        self.cache_dir  = cache_dir
+        self.state_path = os.path.join(cache_dir, '_state.json')
+        self.state = {'watermark': None, 'submissions': 0, 'refreshed_at': None}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        path = os.path.join(cache_dir, 'contributions.parquet')
+        self.contributions = pd.read_parquet(path) if os.path.exists(path) else contributions([], {})
+        self.rollups = {}
+        for level in LEVELS:
+            path = os.path.join(cache_dir, f'rollup-{level}.parquet')
+            self.rollups[level] = pd.read_parquet(path) if os.path.exists(path) else _empty_rollup(level)
+        self._index = {}
+
+    # ── Maintenance ───────────────────────────────────────────────────────────
+    def apply(self, submissions: list, dims: dict) -> dict:
+        """Replace the contributions of these submissions and update every rollup by the difference."""
+        import pandas as pd
+        ids = list(dict.fromkeys(s['id'] for s in submissions))
+        new = contributions(submissions, dims)
+        old = self.contributions.loc[self.contributions.index.intersection(ids)]
+        if new.empty and old.empty:
+            return {'added': 0, 'removed': 0}
+        negated = old.copy()
+        negated[METRICS] = -negated[METRICS]
+        delta = pd.concat([new, negated])
+        for level, cols in LEVELS.items():
+            keys = list(cols) + ['week']
+            change = delta.groupby(keys)[METRICS].sum()
+            rollup = self.rollups[level].add(change, fill_value=0)
+            self.rollups[level] = rollup[rollup['submissions'] > 0]
+        self.contributions = pd.concat([self.contributions.drop(old.index), new])
+        self._index = {}
+        return {'added': len(new), 'removed': len(old)}
+
+    def refresh(self, client, full: bool = False, page_size: int = PAGE_SIZE, progress: bool = False) -> dict:
+        """Fold submissions updated since the watermark (all of them with full) into the cache."""
+        if full:
+            self.contributions = contributions([], {})
+            self.rollups = {level: _empty_rollup(level) for level in LEVELS}
+            self._index = {}
+        since = None if full else self.state['watermark']
+        high, fetched, stats = since, 0, {'added': 0, 'removed': 0}
+        batch = []
+
+        def fold():
+            for key, n in self.apply(batch, load_dimensions(client, batch)).items():
+                stats[key] += n
+            batch.clear()
+
+        for row in _iter_rows(client, 'job_submissions', 'updated_at', since, page_size):
+            if row.get('updated_at') and (high is None or row['updated_at'] > high):
+                high = row['updated_at']
+            batch.append(row)
+            fetched += 1
+            if len(batch) >= APPLY_ROWS:
+                fold()
+                if progress:
+                    print(f"   {fetched} submissions folded in")
+        if batch:
+            fold()
+        self.state.update(watermark=high, submissions=len(self.contributions),
+                          refreshed_at=datetime.now(timezone.utc).isoformat())
+        return dict(stats, fetched=fetched)
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        _write_parquet(self.contributions, os.path.join(self.cache_dir, 'contributions.parquet'))
+        for level, rollup in self.rollups.items():
+            _write_parquet(rollup, os.path.join(self.cache_dir, f'rollup-{level}.parquet'))
+        # written last: a crash before this point repeats the refresh from the old watermark
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    # ── Lookups ───────────────────────────────────────────────────────────────
+    def _lookup(self, level):
+        if level not in self._index:
+            rollup = self.rollups[level]
+            self._index[level] = dict(zip(rollup.index, rollup[METRICS].to_numpy(dtype=np.float64)))
+        return self._index[level]
+
+    def get(self, level: str, key, week: str) -> dict:
+        """Metrics for one level key and week (Monday, YYYY-MM-DD), or None."""
+        key = key if isinstance(key, tuple) else (key,)
+        values = self._lookup(level).get(key + (week,))
+        return None if values is None else dict(zip(METRICS, values.tolist()))
+
+    def window(self, level: str, key, weeks: int = 8, end: str = None) -> dict:
+        """
+        Summed metrics over the weeks weeks ending with end's week (default:
+        the current week), plus in_stock_rate, price_verified_rate,
+        avg_price and avg_price_gap (None without data).
+        """
+        key = key if isinstance(key, tuple) else (key,)
+        day = datetime.fromisoformat(end[:10]) if end else datetime.now(timezone.utc).replace(tzinfo=None)
+        monday = day - timedelta(days=day.weekday())
+        lookup = self._lookup(level)
+        total = np.zeros(len(METRICS))
+        for n in range(weeks):
+            values = lookup.get(key + ((monday - timedelta(weeks=n)).strftime('%Y-%m-%d'),))
+            if values is not None:
+                total += values
+        out = dict(zip(METRICS, total.tolist()))
+        ratio = lambda a, b: round(out[a] / out[b], 4) if out[b] else None
+        out.update(in_stock_rate=ratio('in_stock', 'submissions'),
+                   price_verified_rate=ratio('price_verified', 'price_checked'),
+                   avg_price=ratio('price_found_sum', 'price_found_n'),
+                   avg_price_gap=ratio('price_gap_sum', 'price_gap_n'),
+                   weeks=weeks, end_week=monday.strftime('%Y-%m-%d'))
+        return out
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Maintain and query submission rollups.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_refresh = sub.add_parser('refresh', help='fold new and updated submissions into the cache')
+    p_refresh.add_argument('cache_dir')
+    p_refresh.add_argument('--full', action='store_true', help='rebuild from every submission')
+    p_query = sub.add_parser('query', help='summed metrics for one key over recent weeks')
+    p_query.add_argument('cache_dir')
+    p_query.add_argument('--level', choices=list(LEVELS), required=True)
+    p_query.add_argument('--key', nargs='+', required=True, help='values of the level key columns, in order')
+    p_query.add_argument('--weeks', type=int, default=8)
+    p_query.add_argument('--end', default=None, help='a date in the last week (default: this week)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    agg = SubmissionAggregates(args.cache_dir)
+    if args.command == 'refresh':
+        from store_loader import supabase_from_env
+        print(f"📥 Refreshing aggregates {'(full)' if args.full else 'since ' + str(agg.state['watermark'])}")
+        stats = agg.refresh(supabase_from_env(), full=args.full, progress=True)
+        agg.save()
+        print(f"✅ {stats['fetched']} submissions fetched, {stats['added']} contributions written, "
+              f"{stats['removed']} replaced ({agg.state['submissions']} approved in total, "
+              f"{time.perf_counter() - started:.1f}s)")
+    else:
+        if len(args.key) != len(LEVELS[args.level]):
+            parser.error(f"--key needs {len(LEVELS[args.level])} values: {', '.join(LEVELS[args.level])}")
+        print(json.dumps(agg.window(args.level, tuple(args.key), args.weeks, args.end), indent=2))
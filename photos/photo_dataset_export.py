@@ -0,0 +1,303 @@
+"""
+Shelf Photo Dataset Export
+Streams submission photos and their metadata out of the job_submissions
+bucket into a sharded dataset for the AI annotation program
+(AI_ANNOTATION_PLAN.md, "Metadata Standards").
+
+    <out>/shard-000000.tar      <key>.jpg (.webp for WebP derivatives) + <key>.json per photo
+    <out>/shard-000000.jsonl    one manifest line per photo (metadata, sha256, bytes)
+    <out>/failed.jsonl          photos that could not be downloaded
+    <out>/_checkpoint.json      next shard number and the source cursor
+
+A shard closes at --shard-items photos or --shard-mb megabytes. Photos are
+downloaded on a thread pool with at most 2 x --workers in flight and
+written in source order, so memory stays at a few dozen photos however big
+the export is. Shards are written under a temporary name and renamed when
+complete; the checkpoint advances only after that, so an interrupted export
+resumes at the first unfinished shard with no duplicates or gaps.
+
+Submissions are read oldest first (created_at, id); the cursor is the last
+(created_at, id, file index) written to a finished shard.
+
+Usage:
+    python3 photo_dataset_export.py OUT_DIR [--workers 16] [--shard-items 1000] [--shard-mb 1024]
+                                            [--review-outcome approved] [--limit N] [--size review]
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'reports'))
+
+BUCKET      = 'job_submissions'
+PAGE_SIZE   = 1000
+RETRIES     = 3
+SUBMISSION_COLUMNS = 'id, job_id, store_id, sku_id, contractor_id, data, files, review_outcome, created_at'
+
+
+# ── Source ────────────────────────────────────────────────────────────────────
+def _photo_source(f: dict, bucket: str):
+    """('storage', path) | ('url', url) | ('data', b64) for one files[] entry, or None."""
+    marker = f'/storage/v1/object/public/{bucket}/'
+    if f.get('filename') and f.get('url'):
+        return ('storage', f['filename'])
+    url = f.get('url') or ''
+    if marker in url:
+        return ('storage', unquote(url.split(marker, 1)[1].split('?', 1)[0]))
+    if url.startswith('http'):
+        return ('url', url)
+    data = f.get('file_data') or (url if url.startswith('data:') else None)
+    if data:
+        return ('data', data)
+    return None
+
+
+def iter_photo_items(client, cursor: dict = None, review_outcome: str = None, bucket: str = BUCKET,
+                     page_size: int = PAGE_SIZE, size: str = None):
+    """
+    Yield one item per photo after cursor, oldest submission first. With
+    size, photos that have that derivative (photo_derivatives.py) are read
+    from it instead of the original.
+    """
+    after = (cursor['created_at'], cursor['id'], cursor['file']) if cursor else None
+    start = 0
+    while True:
+        query = client.table('job_submissions').select(SUBMISSION_COLUMNS)
+        if after:
+            query = query.gte('created_at', after[0])
+        if review_outcome:
+            query = query.eq('review_outcome', review_outcome)
+        page = query.order('created_at').order('id').range(start, start + page_size - 1).execute().data or []
+        for sub in page:
+            data = sub.get('data') or {}
+            if isinstance(data, str):
+                data = json.loads(data)
+            files = sub.get('files') or []
+            if isinstance(files, str):
+                files = json.loads(files)
+            for n, f in enumerate(files):
+                position = (sub['created_at'], sub['id'], n)
+                if after and position <= after:
+                    continue
+                source = _photo_source(f, bucket)
+                if source is None:
+                    continue
+                derivative = (f.get('derivatives') or {}).get(size) if size else None
+                if derivative:
+                    source = ('storage', derivative['path'])
+                photo_type = f.get('type') or 'photo'
+                yield {
+                    'key':    f"{sub['id']}_{n}_{photo_type}",
+                    'source': source,
+                    'ext':    'webp' if derivative and derivative.get('format') == 'webp' else 'jpg',
+                    'cursor': {'created_at': sub['created_at'], 'id': sub['id'], 'file': n},
+                    'meta': {
+                        'submission_id':     sub['id'],
+                        'job_id':            sub.get('job_id'),
+                        'store_id':          sub.get('store_id'),
+                        'sku_id':            sub.get('sku_id'),
+                        'contractor_id':     sub.get('contractor_id'),
+                        'photo_type':        photo_type,
+                        'aisle':             data.get('aisle') or '',
+                        'capture_timestamp': data.get('captured_at') or sub['created_at'],
+                        'image_quality':     (f.get('image_quality') or {}).get('label'),   # photo_quality.py
+                        'review_outcome':    sub.get('review_outcome'),
+                        'derivative':        size if derivative else None,
+                        'source':            source[1] if source[0] != 'data' else 'inline',
+                    },
+                }
+        if len(page) < page_size:
+            break
+        start += page_size
+
+
+# ── Download ──────────────────────────────────────────────────────────────────
+class PhotoFetcher:
+    """Downloads photos with one StorageClient (and HTTP session) per thread."""
+
+    def __init__(self, storage_factory, bucket: str = BUCKET, retries: int = RETRIES):
+        self.storage_factory = storage_factory
+        self.bucket  = bucket
+        self.retries = retries
+        self.local   = threading.local()
+
+    def storage(self):
+        """This thread's StorageClient (also used for uploads by photo_derivatives.py)."""
+        client = getattr(self.local, 'storage', None)
+        if client is None:
+            client = self.local.storage = self.storage_factory()
+        return client
+
+    def fetch(self, item: dict) -> bytes:
+        kind, value = item['source']
+        if kind == 'data':
+            return base64.b64decode(value.split(',', 1)[-1])
+        for attempt in range(self.retries):
+            try:
+                storage = self.storage()
+                if kind == 'storage':
+                    return storage.download(self.bucket, value)
+                resp = storage.session.get(value, timeout=storage.timeout)
+                resp.raise_for_status()
+                return resp.content
+            except Exception as e:
+                status = getattr(getattr(e, 'response', None), 'status_code', None)
+                if attempt == self.retries - 1 or (status and status < 500 and status != 429):
+                    raise   # missing objects and auth errors will not get better
+                time.sleep(0.5 * 2 ** attempt)
+
+
+# ── Shards ────────────────────────────────────────────────────────────────────
+class ShardWriter:
+    """One tar shard plus its JSONL manifest; invisible until commit()."""
+
+    def __init__(self, out_dir: str, number: int):
+        self.name     = f'shard-{number:06d}'
+        self.tar_path = os.path.join(out_dir, self.name + '.tar')
+        self.tmp_path = os.path.join(out_dir, '.' + self.name + '.tar.tmp')
+        self.tar      = tarfile.open(self.tmp_path, 'w')
+        self.lines    = []
+        self.failed   = []
+        self.count    = 0
+        self.bytes    = 0
+        self.cursor   = None
+
+    def _member(self, name, payload: bytes, mtime: float):
+        info = tarfile.TarInfo(name)
+        info.size, info.mtime, info.mode = len(payload), mtime, 0o644
+        self.tar.addfile(info, io.BytesIO(payload))
+
+    def add(self, item: dict, payload: bytes):
+        meta = dict(item['meta'], key=item['key'], shard=self.name,
+                    sha256=hashlib.sha256(payload).hexdigest(), bytes=len(payload))
+        mtime = time.time()
+        self._member(item['key'] + '.' + item.get('ext', 'jpg'), payload, mtime)
+        self._member(item['key'] + '.json', json.dumps(meta, sort_keys=True).encode(), mtime)
+        self.lines.append(json.dumps(meta, sort_keys=True))
+        self.count += 1
+        self.bytes += len(payload)
+        self.cursor = item['cursor']
+
+    def skip(self, item: dict, error: str):
+        self.failed.append(json.dumps({'key': item['key'], 'source': item['meta']['source'], 'error': error}))
+        self.cursor = item['cursor']
+
+    def commit(self, out_dir: str):
+        self.tar.close()
+        if self.count:
+            os.replace(self.tmp_path, self.tar_path)
+            manifest = os.path.join(out_dir, self.name + '.jsonl')
+            with open(manifest + '.tmp', 'w') as f:
+                f.write('\n'.join(self.lines) + '\n')
+            os.replace(manifest + '.tmp', manifest)
+        else:
+            os.remove(self.tmp_path)
+        if self.failed:
+            with open(os.path.join(out_dir, 'failed.jsonl'), 'a') as f:
+                f.write('\n'.join(self.failed) + '\n')
+
+
+class DatasetExporter:
+    def __init__(self, out_dir: str, fetcher: PhotoFetcher, workers: int = 16,
+                 shard_items: int = 1000, shard_bytes: int = 1 << 30):
+        self.out_dir     = out_dir
+        self.fetcher     = fetcher
+        self.workers     = workers
+        self.shard_items = shard_items
+        self.shard_bytes = shard_bytes
+        self.checkpoint_path = os.path.join(out_dir, '_checkpoint.json')
+        os.makedirs(out_dir, exist_ok=True)
+        self.state = {'next_shard': 0, 'cursor': None, 'photos': 0, 'bytes': 0, 'failed': 0}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                self.state = json.load(f)
+        for name in os.listdir(out_dir):   # leftovers from an interrupted run
+            if name.startswith('.shard-') and name.endswith('.tmp'):
+                os.remove(os.path.join(out_dir, name))
+
+    def _commit(self, shard: ShardWriter):
+        shard.commit(self.out_dir)
+        self.state.update(next_shard=self.state['next_shard'] + (1 if shard.count else 0), cursor=shard.cursor,
+                          photos=self.state['photos'] + shard.count, bytes=self.state['bytes'] + shard.bytes,
+                          failed=self.state['failed'] + len(shard.failed))
+        with open(self.checkpoint_path + '.tmp', 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+
+    def run(self, items, limit: int = None, progress: bool = False) -> dict:
+        """Export items (from iter_photo_items starting at self.state['cursor'])."""
+        started, written = time.perf_counter(), 0
+        window = deque()
+        shard = None
+        items = iter(items)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            def refill():
+                nonlocal limit
+                while len(window) < self.workers * 2 and (limit is None or limit > 0):
+                    item = next(items, None)
+                    if item is None:
+                        return
+                    if limit is not None:
+                        limit -= 1
+                    window.append((item, pool.submit(self.fetcher.fetch, item)))
+
+            refill()
+            while window:
+                item, future = window.popleft()
+                refill()
+                if shard is None:
+                    shard = ShardWriter(self.out_dir, self.state['next_shard'])
+                try:
+                    shard.add(item, future.result())
+                    written += 1
+                except Exception as e:
+                    print(f"  Warning: {item['key']} failed: {e}", file=sys.stderr)
+                    shard.skip(item, str(e))
+                if shard.count >= self.shard_items or shard.bytes >= self.shard_bytes:
+                    self._commit(shard)
+                    shard = None
+                    if progress:
+                        rate = self.state['bytes'] / 1e6 / (time.perf_counter() - started)
+                        print(f"   {self.state['photos']} photos, {self.state['next_shard']} shards, {rate:.1f} MB/s")
+            if shard is not None:
+                self._commit(shard)
+        return dict(self.state, written=written, seconds=round(time.perf_counter() - started, 2))
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export submission photos as a sharded dataset.')
+    parser.add_argument('out_dir')
+    parser.add_argument('--workers', type=int, default=16, help='concurrent downloads')
+    parser.add_argument('--shard-items', type=int, default=1000)
+    parser.add_argument('--shard-mb', type=int, default=1024)
+    parser.add_argument('--review-outcome', default=None, help="only submissions with this review_outcome, e.g. approved")
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many photos (this run)')
+    parser.add_argument('--size', choices=['thumb', 'report', 'review'], default=None,
+                        help='export this photo_derivatives.py size where a photo has it (default: originals)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'stores'))
+    from storage import StorageClient
+    from store_loader import supabase_from_env
+
+    client = supabase_from_env()
+    exporter = DatasetExporter(args.out_dir, PhotoFetcher(StorageClient.from_env), args.workers,
+                               args.shard_items, args.shard_mb * 1024 * 1024)
+    if exporter.state['cursor']:
+        print(f"↻ Resuming after {exporter.state['photos']} photos at shard {exporter.state['next_shard']}")
+    result = exporter.run(iter_photo_items(client, exporter.state['cursor'], args.review_outcome, size=args.size),
+                          limit=args.limit, progress=True)
+    print(f"✅ {result['photos']} photos in {result['next_shard']} shards "
+          f"({result['bytes'] / 1e9:.2f} GB, {result['failed']} failed)")
@@ -0,0 +1,182 @@
+"""
+Photo Derivatives
+Builds fixed-size copies of every submission photo so reports, dashboards
+and exports can fetch the smallest asset that fits instead of the original.
+
+    thumb    320 px long side, WebP   dashboards, rollup report thumbnails
+    report   1024 px, JPEG            single-submission report (ReportLab embeds JPEG as-is)
+    review   2048 px, WebP            review screen, annotation export
+
+Each photo is decoded once (JPEG draft mode at about the largest size,
+EXIF orientation applied) and shrunk size by size, largest first. The files
+go to the same bucket under derivatives/<submission id>/<n>_<size>.<ext>
+and are recorded on the submission as files[n].derivatives:
+
+    {"thumb": {"path", "url", "width", "height", "bytes", "format"}, ...}
+
+Runs are incremental: submissions are read oldest first from the watermark
+(created_at of the last submission finished) kept in the state file, and
+photos whose derivatives already cover SIZES are skipped. Photos that fail
+are logged and left without derivatives; a --since run picks them up again.
+The run is a photo_jobs.py job: downloads and uploads on a thread pool,
+resizing on a process pool, and files[n].derivatives merged into the
+current row so a concurrent prescreen's image_quality is kept.
+
+Usage:
+    python3 photo_derivatives.py [--state photo-derivatives-state.json] [--since 2026-01-01]
+                                 [--threads 16] [--processes N] [--rebuild] [--limit N]
+
+    from photo_derivatives import derivative_url
+    url = derivative_url(files[0], 600)   # smallest copy at least 600 px, else the original
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+
+from photo_dataset_export import BUCKET
+from photo_jobs import run_photo_job
+
+SIZES = {                 # name: (long side px, format, quality)
+    'thumb':  (320,  'WEBP', 70),
+    'report': (1024, 'JPEG', 80),
+    'review': (2048, 'WEBP', 80),
+}
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+CONTENT_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+PREFIX     = 'derivatives'
+STATE_FILE = 'photo-derivatives-state.json'
+
+
+# ── Rendering ─────────────────────────────────────────────────────────────────
+def render_derivatives(image_bytes: bytes, sizes: dict = SIZES) -> dict:
+    """{size: (encoded bytes, width, height, format)} for one encoded image."""
+    from PIL import Image, ImageOps
+    img = Image.open(io.BytesIO(image_bytes))
+    largest = max(px for px, _, _ in sizes.values())
+    img.draft('RGB', (largest, largest))
+    img = ImageOps.exif_transpose(img).convert('RGB')
+    out = {}
+    for name, (px, fmt, quality) in sorted(sizes.items(), key=lambda kv: -kv[1][0]):
+        img.thumbnail((px, px), Image.LANCZOS)   # in place; the next (smaller) size starts from here
+        buf = io.BytesIO()
+        img.save(buf, fmt, quality=quality, **({'optimize': True} if fmt == 'JPEG' else {'method': 4}))
+        out[name] = (buf.getvalue(), img.width, img.height, fmt)
+    return out
+
+
+def _render_or_error(image_bytes):
+    try:
+        return render_derivatives(image_bytes)
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def derivative_path(submission_id, n: int, size: str) -> str:
+    return f"{PREFIX}/{submission_id}/{n}_{size}.{EXTENSIONS[SIZES[size][1]]}"
+
+
+def has_derivatives(f: dict) -> bool:
+    return set(SIZES) <= set(f.get('derivatives') or {})
+
+
+def derivative_url(f: dict, min_px: int) -> str:
+    """
+    URL of the smallest derivative whose long side is at least min_px, or
+    of the largest one when the original itself is that small; the
+    original's url when the photo has no derivatives.
+    """
+    derivs = [d for d in (f.get('derivatives') or {}).values() if d.get('url')]
+    if not derivs:
+        return f.get('url') or ''
+    long_side = lambda d: max(d.get('width') or 0, d.get('height') or 0)
+    fits = [d for d in derivs if long_side(d) >= min_px]
+    return (min(fits, key=long_side) if fits else max(derivs, key=long_side))['url']
+
+
+# ── Incremental build ─────────────────────────────────────────────────────────
+def load_state(path: str) -> dict:
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {'watermark': None, 'photos': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+
+def save_state(path: str, state: dict):
+    if not path:
+        return
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _count_bytes(stats, blob, result):
+    stats['bytes_in']  = stats.get('bytes_in', 0) + len(blob)
+    stats['bytes_out'] = stats.get('bytes_out', 0) + sum(len(payload) for payload, *_ in result.values())
+
+
+def build_derivatives(client, fetcher, state: dict = None, state_path: str = None, threads: int = 16,
+                      processes: int = None, since: str = None, rebuild: bool = False, limit: int = None,
+                      bucket: str = BUCKET, progress: bool = False) -> dict:
+    """
+    Render and upload SIZES for every photo from the watermark (or since)
+    on, write files[n].derivatives back to job_submissions, and advance
+    state['watermark'] after each batch of finished submissions.
+    """
+    state = state if state is not None else load_state(state_path)
+    flushed = {'photos': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def upload(submission_id, n, blob, result):
+        storage = fetcher.storage()
+        derivatives = {}
+        for size, (payload, w, h, fmt) in result.items():
+            path = derivative_path(submission_id, n, size)
+            storage.upload(bucket, path, payload, content_type=CONTENT_TYPES[fmt])
+            derivatives[size] = {'path': path, 'url': storage.public_url(bucket, path), 'width': w, 'height': h,
+                                 'bytes': len(payload), 'format': fmt.lower()}
+        return derivatives
+
+    def checkpoint(last, stats):
+        state['watermark'] = max(state.get('watermark') or '', last['created_at'])
+        for key in flushed:
+            state[key] = state.get(key, 0) + stats.get(key, 0) - flushed[key]
+            flushed[key] = stats.get(key, 0)
+        save_state(state_path, state)
+
+    stats = run_photo_job(client, fetcher, 'derivatives', lambda f: rebuild or not has_derivatives(f),
+                          _render_or_error, finish=upload, tally=_count_bytes, on_flush=checkpoint,
+                          threads=threads, processes=processes, since=since or state.get('watermark'),
+                          limit=limit, bucket=bucket, progress=progress)
+    stats.setdefault('bytes_in', 0)
+    stats.setdefault('bytes_out', 0)
+    return stats
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build thumb/report/review copies of submission photos.')
+    parser.add_argument('--state', default=STATE_FILE, help='watermark file')
+    parser.add_argument('--since', default=None, help='start here instead of at the watermark')
+    parser.add_argument('--rebuild', action='store_true', help='redo photos that already have derivatives')
+    parser.add_argument('--threads', type=int, default=16, help='concurrent downloads/uploads')
+    parser.add_argument('--processes', type=int, default=None, help='resizing processes (default: CPU count)')
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many photos')
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.join(here, 'stores'))
+    from photo_dataset_export import PhotoFetcher
+    from storage import StorageClient
+    from store_loader import supabase_from_env
+
+    state = load_state(args.state)
+    print(f"🖼️  Building photo derivatives from {args.since or state.get('watermark') or 'the beginning'}...")
+    result = build_derivatives(supabase_from_env(), PhotoFetcher(StorageClient.from_env), state, args.state,
+                               args.threads, args.processes, args.since, args.rebuild, args.limit, progress=True)
+    saved = result['bytes_in'] and 1 - result['bytes_out'] / result['bytes_in']
+    print(f"✅ {result['photos']} photos in {result['seconds']}s ({result['failed']} failed); "
+          f"derivatives are {result['bytes_out'] / 1e6:.1f} MB for {result['bytes_in'] / 1e6:.1f} MB of originals "
+          f"({saved:.0%} smaller)")
+    print(f"💾 Watermark {state.get('watermark')} saved to: {args.state}")
@@ -0,0 +1,345 @@
+"""
+Photo Near-Duplicate Index
+Perceptual hashes for submission photos, for spotting the same (or nearly
+the same) shelf photo submitted again on another job or at another store.
+
+Each photo gets a 64-bit pHash (DCT of a 32x32 grayscale thumbnail; JPEGs
+are decoded in draft mode, so hashing costs a fraction of a full decode).
+Photos whose hashes differ in at most d bits look the same to a person;
+re-encodes and light crops land within 4-8 bits.
+
+The index uses multi-index hashing: the hash is split into 4 16-bit chunks,
+each with its own table. Two hashes within distance d agree to within
+d // 4 bits on at least one chunk, so a query only looks up the chunk
+values within that radius and checks the few candidates it finds.
+Corpus-wide clustering does the same lookups for every photo at once with
+numpy (one pass per chunk table and bit flip) and joins close pairs with
+union-find.
+
+    <index>/hashes.jsonl    one line per photo: key, hash, submission/job/store/contractor
+    <index>/_state.json     cursor into job_submissions for incremental builds
+
+Usage:
+    python3 photo_hash_index.py build INDEX_DIR [--workers 16] [--review-outcome approved]
+    python3 photo_hash_index.py query INDEX_DIR photo.jpg [--distance 8]
+    python3 photo_hash_index.py clusters INDEX_DIR [--distance 6] [--out clusters.json]
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+
+import numpy as np
+
+HASH_BITS   = 64
+CHUNKS      = 4
+CHUNK_BITS  = HASH_BITS // CHUNKS
+CHUNK_MASK  = (1 << CHUNK_BITS) - 1
+DEFAULT_DISTANCE = 6
+
+
+# ── Hashing ───────────────────────────────────────────────────────────────────
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def phash(image_bytes: bytes) -> int:
+    """64-bit perceptual hash of an encoded image."""
+    from PIL import Image
+    img = Image.open(io.BytesIO(image_bytes))
+    img.draft('L', (64, 64))
+    pixels = np.asarray(img.convert('L').resize((32, 32), Image.BILINEAR), dtype=np.float64)
+    low = (_DCT32 @ pixels @ _DCT32.T)[:8, :8].ravel()
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+# ── Index ─────────────────────────────────────────────────────────────────────
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return _POPCOUNT8[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def _close_pairs(hashes, order, rows, begin, length, distance, block=4_000_000):
+    """
+    Expand each sorted row into its partner range [begin, begin + length)
+    and yield the (a, b) position arrays of pairs within distance, a block
+    of about block pairs at a time to bound memory.
+    """
+    ends = np.cumsum(length)
+    lo = 0
+    while lo < len(rows):
+        hi = int(np.searchsorted(ends, (ends[lo - 1] if lo else 0) + block, side='right'))
+        hi = max(hi, lo + 1)
+        seg_len = length[lo:hi]
+        offsets = np.repeat(np.cumsum(seg_len) - seg_len, seg_len)
+        left = order[np.repeat(rows[lo:hi], seg_len)]
+        right = order[np.repeat(begin[lo:hi], seg_len) + (np.arange(int(seg_len.sum())) - offsets)]
+        close = _popcount(hashes[left] ^ hashes[right]) <= distance
+        if close.any():
+            yield left[close], right[close]
+        lo = hi
+
+
+class HashIndex:
+    """Multi-index hashing over 64-bit hashes; add() is incremental."""
+
+    def __init__(self):
+        self.hashes  = []                 # position -> hash
+        self.records = []                 # position -> metadata
+        self.keys    = {}                 # key -> position
+        self.tables  = [defaultdict(list) for _ in range(CHUNKS)]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    @staticmethod
+    def _chunks(h: int):
+        return [(h >> (CHUNK_BITS * i)) & CHUNK_MASK for i in range(CHUNKS)]
+
+    def add(self, h: int, record: dict) -> int:
+        key = record.get('key')
+        if key in self.keys:
+            return self.keys[key]
+        pos = len(self.hashes)
+        self.hashes.append(h)
+        self.records.append(record)
+        if key is not None:
+            self.keys[key] = pos
+        for table, chunk in zip(self.tables, self._chunks(h)):
+            table[chunk].append(pos)
+        return pos
+
+    @staticmethod
+    def _flips(distance: int) -> list:
+        radius = distance // CHUNKS
+        return [0] + [sum(1 << b for b in bits) for r in range(1, radius + 1)
+                      for bits in combinations(range(CHUNK_BITS), r)]
+
+    def _candidates(self, h: int, distance: int):
+        flips = self._flips(distance)
+        seen = set()
+        for table, chunk in zip(self.tables, self._chunks(h)):
+            for flip in flips:
+                for pos in table.get(chunk ^ flip, ()):
+                    if pos not in seen:
+                        seen.add(pos)
+                        yield pos
+
+    def near(self, h: int, distance: int = DEFAULT_DISTANCE) -> list:
+        """[(distance, record)] for every indexed hash within distance of h, closest first."""
+        hits = []
+        for pos in self._candidates(h, distance):
+            d = (self.hashes[pos] ^ h).bit_count()
+            if d <= distance:
+                hits.append((d, pos))
+        hits.sort()
+        return [(d, self.records[pos]) for d, pos in hits]
+
+    def clusters(self, distance: int = DEFAULT_DISTANCE) -> list:
+        """
+        Groups of two or more photos linked by hashes within distance.
+
+        One vectorized pass per (chunk table, bit flip): every photo is
+        paired with the photos whose chunk equals its own chunk XOR the flip,
+        and pairs within distance are merged with union-find.
+        """
+        n = len(self.hashes)
+        hashes = np.array(self.hashes, dtype=np.uint64)
+        found = []
+        for t in range(CHUNKS):
+            chunk = ((hashes >> np.uint64(CHUNK_BITS * t)) & np.uint64(CHUNK_MASK)).astype(np.int64)
+            order = np.argsort(chunk, kind='stable')
+            sorted_chunk = chunk[order]
+            counts = np.bincount(sorted_chunk, minlength=1 << CHUNK_BITS)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            rank = np.arange(n)
+            for flip in self._flips(distance):
+                partner = sorted_chunk ^ flip
+                if flip:
+                    # each bucket pair once, from its lower side
+                    mask = sorted_chunk < partner
+                    begin, length = starts[partner], counts[partner]
+                else:
+                    # within a bucket, each photo pairs with the ones after it
+                    mask = np.ones(n, dtype=bool)
+                    begin = rank + 1
+                    length = starts[sorted_chunk] + counts[sorted_chunk] - begin
+                mask &= length > 0
+                found.extend(_close_pairs(hashes, order, rank[mask], begin[mask], length[mask], distance))
+
+        parent = list(range(n))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b in found:
+            for x, y in zip(a.tolist(), b.tolist()):
+                ra, rb = find(x), find(y)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+
+        groups = defaultdict(list)
+        for pos in range(n):
+            groups[find(pos)].append(pos)
+        return [[self.records[p] for p in members] for members in groups.values() if len(members) > 1]
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+    @classmethod
+    def load(cls, index_dir: str) -> 'HashIndex':
+        index = cls()
+        path = os.path.join(index_dir, 'hashes.jsonl')
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        index.add(int(record['hash'], 16), record)
+        return index
+
+    @staticmethod
+    def append(index_dir: str, records: list):
+        with open(os.path.join(index_dir, 'hashes.jsonl'), 'a') as f:
+            for record in records:
+                f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def describe_cluster(records: list) -> dict:
+    """Cluster summary with the signals reviewers care about."""
+    distinct = lambda col: sorted({r.get(col) for r in records if r.get(col)})
+    stores, jobs, shelfers = distinct('store_id'), distinct('job_id'), distinct('contractor_id')
+    flags = []
+    if len(stores) > 1:
+        flags.append('cross_store')
+    if len(jobs) > 1:
+        flags.append('cross_job')
+    if len(shelfers) > 1:
+        flags.append('cross_shelfer')
+    return {'size': len(records), 'flags': flags, 'stores': stores, 'jobs': jobs, 'shelfers': shelfers,
+            'photos': [r['key'] for r in records]}
+
+
+# ── Build ─────────────────────────────────────────────────────────────────────
+def build_index(client, fetcher, index_dir: str, workers: int = 16, review_outcome: str = None,
+                batch: int = 500) -> dict:
+    """Hash every photo after the saved cursor and append it to the index."""
+    from photo_dataset_export import iter_photo_items
+    os.makedirs(index_dir, exist_ok=True)
+    state_path = os.path.join(index_dir, '_state.json')
+    state = {'cursor': None, 'photos': 0, 'failed': 0}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+
+    def hash_item(item):
+        return item, phash(fetcher.fetch(item))
+
+    def save(records, cursor, failed):
+        HashIndex.append(index_dir, records)
+        state.update(cursor=cursor, photos=state['photos'] + len(records), failed=state['failed'] + failed)
+        with open(state_path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(state_path + '.tmp', state_path)
+
+    started = time.perf_counter()
+    items = iter_photo_items(client, state['cursor'], review_outcome)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            chunk = [item for _, item in zip(range(batch), items)]
+            if not chunk:
+                break
+            records, failed = [], 0
+            futures = [pool.submit(hash_item, item) for item in chunk]
+            for item, future in zip(chunk, futures):
+                try:
+                    _, h = future.result()
+                except Exception as e:
+                    print(f"  Warning: {item['key']} failed: {e}", file=sys.stderr)
+                    failed += 1
+                    continue
+                meta = item['meta']
+                records.append({'key': item['key'], 'hash': f'{h:016x}', 'submission_id': meta['submission_id'],
+                                'job_id': meta['job_id'], 'store_id': meta['store_id'],
+                                'contractor_id': meta['contractor_id'],
+                                'captured_at': meta['capture_timestamp']})
+            save(records, chunk[-1]['cursor'], failed)
+            print(f"   {state['photos']} photos hashed ({state['photos'] / (time.perf_counter() - started):.0f}/s)")
+    return state
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Perceptual-hash index of submission photos.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_build = sub.add_parser('build', help='hash new submission photos into the index')
+    p_build.add_argument('index_dir')
+    p_build.add_argument('--workers', type=int, default=16)
+    p_build.add_argument('--review-outcome', default=None)
+    p_query = sub.add_parser('query', help='near-duplicates of a photo file')
+    p_query.add_argument('index_dir')
+    p_query.add_argument('photo')
+    p_query.add_argument('--distance', type=int, default=DEFAULT_DISTANCE)
+    p_clusters = sub.add_parser('clusters', help='group the whole corpus into near-duplicate clusters')
+    p_clusters.add_argument('index_dir')
+    p_clusters.add_argument('--distance', type=int, default=DEFAULT_DISTANCE)
+    p_clusters.add_argument('--out', default=None)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        sys.path.insert(0, os.path.join(here, 'reports'))
+        sys.path.insert(0, os.path.join(here, 'stores'))
+        from photo_dataset_export import PhotoFetcher
+        from storage import StorageClient
+        from store_loader import supabase_from_env
+        result = build_index(supabase_from_env(), PhotoFetcher(StorageClient.from_env), args.index_dir,
+                             args.workers, args.review_outcome)
+        print(f"✅ {result['photos']} photos indexed ({result['failed']} failed)")
+        sys.exit(0)
+
+    started = time.perf_counter()
+    index = HashIndex.load(args.index_dir)
+    print(f"Loaded {len(index)} hashes in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+    if args.command == 'query':
+        with open(args.photo, 'rb') as f:
+            h = phash(f.read())
+        started = time.perf_counter()
+        hits = index.near(h, args.distance)
+        elapsed = (time.perf_counter() - started) * 1000
+        for d, record in hits:
+            print(f"{d:2} bits  {record['key']}  store={record.get('store_id')}  shelfer={record.get('contractor_id')}")
+        print(f"{len(hits)} near-duplicates of {h:016x} in {elapsed:.2f}ms", file=sys.stderr)
+    else:
+        started = time.perf_counter()
+        clusters = sorted((describe_cluster(c) for c in index.clusters(args.distance)),
+                          key=lambda c: (-len(c['flags']), -c['size']))
+        print(f"{len(clusters)} clusters ({sum(1 for c in clusters if c['flags'])} flagged) "
+              f"in {time.perf_counter() - started:.2f}s")
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump(clusters, f, indent=2)
+            print(f"💾 Clusters saved to: {args.out}")
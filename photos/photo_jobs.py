@@ -0,0 +1,166 @@
+"""
+Submission Photo Jobs
+The batch loop shared by the photo jobs that compute something per photo
+and keep it on the submission as files[n].<key>: photo_quality.py
+(image_quality) and photo_derivatives.py (derivatives).
+
+Submissions are read oldest first (created_at, id). Photos that need work
+are collected until about 4 x max(threads, processes) are queued, then
+downloaded on a thread pool, processed on a process pool, optionally
+finished on the thread pool (uploads), and written back.
+
+Jobs run for minutes and may overlap, so files is never written from the
+copy read at the start: merge_files re-reads the row, sets only the job's
+key on the photos it processed (matched by their source, so a reordered
+files array is safe) and writes with updated_at as a compare-and-set,
+retrying when another writer got there first.
+
+Usage:
+    from photo_jobs import run_photo_job
+    stats = run_photo_job(client, fetcher, 'image_quality', needs_work=lambda f: not f.get('image_quality'),
+                          process=_score_or_error)
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from photo_dataset_export import BUCKET, PAGE_SIZE, _photo_source
+
+WRITE_RETRIES = 5
+
+
+def iter_submissions(client, since=None, review_outcome=None, page_size=PAGE_SIZE):
+    """job_submissions (id, files, created_at) oldest first, from created_at since."""
+    start = 0
+    while True:
+        query = client.table('job_submissions').select('id, files, created_at')
+        if since:
+            query = query.gte('created_at', since)
+        if review_outcome:
+            query = query.eq('review_outcome', review_outcome)
+        page = query.order('created_at').order('id').range(start, start + page_size - 1).execute().data or []
+        yield from page
+        if len(page) < page_size:
+            break
+        start += page_size
+
+
+def _files(row: dict) -> list:
+    files = row.get('files') or []
+    return json.loads(files) if isinstance(files, str) else files
+
+
+def merge_files(client, submission_id, key: str, values: dict, bucket: str = BUCKET,
+                retries: int = WRITE_RETRIES) -> bool:
+    """
+    Set files[n][key] for {n: (source, value)} on the row as it is now,
+    leaving every other key (and photos whose source changed) alone.
+    """
+    for _ in range(retries):
+        rows = client.table('job_submissions').select('files, updated_at').eq('id', submission_id).execute().data
+        if not rows:
+            return False
+        files = list(_files(rows[0]))
+        for n, (source, value) in values.items():
+            if n < len(files) and _photo_source(files[n], bucket) == source:
+                files[n] = dict(files[n], **{key: value})
+        query = client.table('job_submissions').update({'files': files}).eq('id', submission_id)
+        if rows[0].get('updated_at'):
+            query = query.eq('updated_at', rows[0]['updated_at'])
+        if query.execute().data:
+            return True
+    print(f"  Warning: submission {submission_id} kept changing; its {key} was not saved", file=sys.stderr)
+    return False
+
+
+def run_photo_job(client, fetcher, key: str, needs_work, process, finish=None, tally=None, on_flush=None,
+                  threads: int = 16, processes: int = None, since: str = None, review_outcome: str = None,
+                  limit: int = None, bucket: str = BUCKET, progress: bool = False) -> dict:
+    """
+    For every photo where needs_work(files[n]) is true: download it,
+    run process(bytes) on the process pool (a dict; {'error': ...} on
+    failure), then finish(submission_id, n, bytes, result) on the thread
+    pool (default: the result itself), and store that as files[n][key].
+
+    tally(stats, bytes, result) adds job-specific counts; on_flush(last
+    submission, stats) runs after each batch is written (watermarks).
+    """
+    processes = processes or os.cpu_count() or 1
+    window = max(threads, processes) * 4
+    stats = {'submissions': 0, 'photos': 0, 'failed': 0}
+    started = time.perf_counter()
+
+    def fetch(item):
+        try:
+            return fetcher.fetch(item)
+        except Exception as e:
+            print(f"  Warning: {item['key']} failed: {e}", file=sys.stderr)
+            return None
+
+    def finish_one(job):
+        sub_id, n, item, blob, result = job
+        try:
+            return finish(sub_id, n, blob, result) if finish else result
+        except Exception as e:
+            print(f"  Warning: {item['key']} could not be saved: {e}", file=sys.stderr)
+            return None
+
+    def flush(pending):
+        # pending: [(submission, [(n, item)])]
+        work = [(sub, n, item) for sub, photos in pending for n, item in photos]
+        blobs = list(io_pool.map(fetch, [item for *_, item in work]))
+        fetched = [b for b in blobs if b is not None]
+        results = iter(cpu_pool.map(process, fetched, chunksize=max(1, len(fetched) // (processes * 2))))
+        done = []
+        for (sub, n, item), blob in zip(work, blobs):
+            result = next(results) if blob is not None else None
+            if result is None or 'error' in result:
+                if result is not None:
+                    print(f"  Warning: {item['key']} could not be processed: {result['error']}", file=sys.stderr)
+                stats['failed'] += 1
+                continue
+            done.append((sub['id'], n, item, blob, result))
+        values = {}
+        for (sub_id, n, item, blob, result), value in zip(done, io_pool.map(finish_one, done)):
+            if value is None:
+                stats['failed'] += 1
+                continue
+            values.setdefault(sub_id, {})[n] = (item['source'], value)
+            stats['photos'] += 1
+            if tally:
+                tally(stats, blob, result)
+        for sub, _ in pending:
+            if sub['id'] in values and merge_files(client, sub['id'], key, values[sub['id']], bucket):
+                stats['submissions'] += 1
+        if on_flush:
+            on_flush(pending[-1][0], stats)
+        if progress:
+            rate = (stats['photos'] + stats['failed']) / (time.perf_counter() - started)
+            print(f"   {stats['photos']} photos in {stats['submissions']} submissions ({rate:.1f}/s)")
+
+    with ThreadPoolExecutor(max_workers=threads) as io_pool, ProcessPoolExecutor(max_workers=processes) as cpu_pool:
+        pending, queued = [], 0
+        for sub in iter_submissions(client, since, review_outcome):
+            photos = []
+            for n, f in enumerate(_files(sub)):
+                source = _photo_source(f, bucket)
+                if source is None or not needs_work(f):
+                    continue
+                photos.append((n, {'key': f"{sub['id']}_{n}_{f.get('type') or 'photo'}", 'source': source}))
+            if limit is not None:
+                photos = photos[:max(0, limit)]
+                limit -= len(photos)
+            pending.append((sub, photos))
+            queued += len(photos)
+            if queued >= window:
+                flush(pending)
+                pending, queued = [], 0
+            if limit is not None and limit <= 0:
+                break
+        if pending:
+            flush(pending)
+    stats['seconds'] = round(time.perf_counter() - started, 2)
+    return stats
@@ -0,0 +1,178 @@
+"""
+Photo Quality Prescreen
+Scores submission photos for the image_quality label the annotation plan
+asks for (AI_ANNOTATION_PLAN.md, "Metadata Standards") and writes the
+scores back onto the submission.
+
+Each photo is decoded in draft mode to grayscale at about SCORE_SIZE pixels
+on the long side, then scored with a handful of numpy array operations:
+
+    blur      variance of the 4-neighbour Laplacian (low = soft/blurry)
+    glare     share of pixels at or above GLARE_LEVEL (blown-out highlights)
+    exposure  mean brightness, 0-1
+    dark      share of pixels at or below DARK_LEVEL
+
+and labelled with one of the plan's values, good, blurry, glare or
+partial_shelf: glare for blown-out highlights or an overexposed frame,
+blurry for a soft or underexposed one (too dark to read), else good.
+Exposure stays in the numeric exposure/dark scores. partial_shelf cannot be
+told from pixel statistics and is left to annotators.
+
+Scores are stored as files[n].image_quality on job_submissions, so the
+dataset export and report payloads pick them up. The batch run is a
+photo_jobs.py job: photos are downloaded on a thread pool, scored on a
+process pool and merged into the current row; photos already scored are
+skipped unless --rescore.
+
+precheck_report(data) is the fast check before a report is rendered: it
+uses stored scores and only downloads and scores photos that have none.
+
+Usage:
+    python3 photo_quality.py [--since 2026-01-01] [--review-outcome approved] [--rescore]
+                             [--threads 16] [--processes N] [--limit N]
+    python3 photo_quality.py --files photo.jpg ...
+
+    from photo_quality import precheck_report
+    issues = [p for p in precheck_report(payload) if p['label'] != 'good']
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+
+import numpy as np
+
+from photo_dataset_export import BUCKET
+from photo_jobs import run_photo_job
+
+SCORE_SIZE    = 512     # long side, pixels, after draft decoding
+BLUR_MIN      = 80.0    # Laplacian variance below this is blurry
+GLARE_LEVEL   = 250
+GLARE_MAX     = 0.08    # share of saturated pixels above this is glare
+DARK_LEVEL    = 10
+DARK_MEAN     = 0.18    # mean brightness below this is too dark to read (blurry)
+BRIGHT_MEAN   = 0.85    # ... above this is washed out (glare)
+REPORT_PHOTOS = 3       # photos a report shows (generate_report.photo_section)
+
+
+# ── Scoring ───────────────────────────────────────────────────────────────────
+def _grayscale(image_bytes: bytes, size: int = SCORE_SIZE) -> np.ndarray:
+    from PIL import Image
+    img = Image.open(io.BytesIO(image_bytes))
+    img.draft('L', (size, size))
+    img = img.convert('L')
+    img.thumbnail((size, size))
+    return np.asarray(img, dtype=np.float32)
+
+
+def quality_label(scores: dict) -> str:
+    """good, blurry or glare (AI_ANNOTATION_PLAN.md image_quality values)."""
+    if scores['glare'] > GLARE_MAX or scores['exposure'] > BRIGHT_MEAN:
+        return 'glare'
+    if scores['blur'] < BLUR_MIN or scores['exposure'] < DARK_MEAN:
+        return 'blurry'
+    return 'good'
+
+
+def score_image(image_bytes: bytes) -> dict:
+    """{'label', 'blur', 'glare', 'exposure', 'dark'} for one encoded image."""
+    g = _grayscale(image_bytes)
+    lap = g[:-2, 1:-1] + g[2:, 1:-1] + g[1:-1, :-2] + g[1:-1, 2:] - 4 * g[1:-1, 1:-1]
+    scores = {
+        'blur':     round(float(lap.var()), 1),
+        'glare':    round(float((g >= GLARE_LEVEL).mean()), 4),
+        'exposure': round(float(g.mean()) / 255, 3),
+        'dark':     round(float((g <= DARK_LEVEL).mean()), 4),
+    }
+    return dict(scores, label=quality_label(scores))
+
+
+def _score_or_error(image_bytes):
+    try:
+        return score_image(image_bytes)
+    except Exception as e:
+        return {'error': str(e)}
+
+
+# ── Pre-check ─────────────────────────────────────────────────────────────────
+def precheck_report(data: dict, session=None) -> list:
+    """
+    [{'type', 'url', 'label', ...scores}] for the photos a report will show,
+    from stored scores where the payload has them (report_payloads passes
+    files[n].image_quality through) and scored on the spot otherwise.
+    Photos that cannot be loaded get label 'missing'.
+    """
+    import base64
+    import requests
+    results = []
+    for ph in (data.get('photos') or [])[:REPORT_PHOTOS]:
+        url = ph.get('url') or ''
+        scores = ph.get('image_quality')
+        if not scores:
+            try:
+                if url.startswith('data:'):
+                    payload = base64.b64decode(url.split(',', 1)[-1])
+                else:
+                    resp = (session or requests).get(url, timeout=10)
+                    resp.raise_for_status()
+                    payload = resp.content
+                scores = score_image(payload)
+            except Exception as e:
+                scores = {'label': 'missing', 'error': str(e)}
+        results.append(dict(scores, type=ph.get('type'), url=url if not url.startswith('data:') else 'inline'))
+    return results
+
+
+# ── Batch prescreen ───────────────────────────────────────────────────────────
+def _count_label(stats, blob, result):
+    labels = stats.setdefault('labels', {})
+    labels[result['label']] = labels.get(result['label'], 0) + 1
+
+
+def prescreen_submissions(client, fetcher, threads: int = 16, processes: int = None, since: str = None,
+                          review_outcome: str = None, rescore: bool = False, limit: int = None,
+                          bucket: str = BUCKET, progress: bool = False) -> dict:
+    """
+    Score every unscored photo on job_submissions (from since, when given)
+    and write the scores into files[n].image_quality.
+    """
+    stats = run_photo_job(client, fetcher, 'image_quality', lambda f: rescore or not f.get('image_quality'),
+                          _score_or_error, tally=_count_label, threads=threads, processes=processes, since=since,
+                          review_outcome=review_outcome, limit=limit, bucket=bucket, progress=progress)
+    stats.setdefault('labels', {})
+    return stats
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score submission photos for image quality.')
+    parser.add_argument('--files', nargs='+', metavar='PHOTO', help='score local image files and print the results')
+    parser.add_argument('--since', default=None, help='only submissions created at or after this date')
+    parser.add_argument('--review-outcome', default=None)
+    parser.add_argument('--rescore', action='store_true', help='score photos that already have image_quality')
+    parser.add_argument('--threads', type=int, default=16, help='concurrent downloads')
+    parser.add_argument('--processes', type=int, default=None, help='scoring processes (default: CPU count)')
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many photos')
+    args = parser.parse_args()
+
+    if args.files:
+        for path in args.files:
+            with open(path, 'rb') as f:
+                print(json.dumps(dict(score_image(f.read()), file=path)))
+        sys.exit(0)
+
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.join(here, 'reports'))
+    sys.path.insert(0, os.path.join(here, 'stores'))
+    from photo_dataset_export import PhotoFetcher
+    from storage import StorageClient
+    from store_loader import supabase_from_env
+
+    print("🔍 Prescreening submission photos...")
+    result = prescreen_submissions(supabase_from_env(), PhotoFetcher(StorageClient.from_env), args.threads,
+                                   args.processes, args.since, args.review_outcome, args.rescore, args.limit,
+                                   progress=True)
+    print(f"✅ {result['photos']} photos scored in {result['seconds']}s ({result['failed']} failed): "
+          + ', '.join(f'{label} {n}' for label, n in sorted(result['labels'].items())))
@@ -0,0 +1,57 @@
+"""Incremental derivative builds of photo_derivatives.py, against LocalStorage and LocalTables."""
+import io
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.join(os.path.dirname(HERE), 'reports')]
+from PIL import Image
+
+from local_storage import serve_local_storage
+from local_tables import LocalTables
+from photo_dataset_export import BUCKET, PhotoFetcher
+from photo_derivatives import SIZES, build_derivatives, derivative_path, derivative_url
+from storage import StorageClient
+
+
+def _jpeg(width, height):
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), (180, 40, 40)).save(out, 'JPEG')
+    return out.getvalue()
+
+
+def _submissions(base_url):
+    return [{'id': f'sub-{i}', 'created_at': f'2026-03-0{i + 1}T00:00:00Z', 'updated_at': 't0',
+             'review_outcome': 'approved',
+             'files': [{'type': 'product_closeup', 'url': f'{base_url}/storage/v1/object/public/{BUCKET}/orig/{i}.jpg',
+                        'image_quality': {'label': 'good'}}]}
+            for i in range(2)]
+
+
+def test_build_uploads_every_size_and_records_it():
+    with serve_local_storage() as (base_url, server):
+        server.objects[(BUCKET, 'orig/0.jpg')] = _jpeg(3000, 2000)
+        server.objects[(BUCKET, 'orig/1.jpg')] = _jpeg(600, 900)
+        db = LocalTables({'job_submissions': _submissions(base_url)})
+        fetcher = PhotoFetcher(lambda: StorageClient(base_url, 'dev'))
+        state = {}
+
+        stats = build_derivatives(db, fetcher, state, threads=2, processes=1)
+        assert (stats['photos'], stats['failed']) == (2, 0)
+        assert state['watermark'] == '2026-03-02T00:00:00Z'
+        for sub in db.tables['job_submissions']:
+            f = sub['files'][0]
+            assert f['image_quality'] == {'label': 'good'}   # other keys on the photo are kept
+            assert set(f['derivatives']) == set(SIZES)
+            for size, d in f['derivatives'].items():
+                assert d['path'] == derivative_path(sub['id'], 0, size)
+                blob = server.objects[(BUCKET, d['path'])]
+                assert Image.open(io.BytesIO(blob)).size == (d['width'], d['height'])
+
+        big = db.tables['job_submissions'][0]['files'][0]['derivatives']
+        assert (big['review']['width'], big['report']['width'], big['thumb']['width']) == (2048, 1024, 320)
+        assert derivative_url(db.tables['job_submissions'][0]['files'][0], 660) == big['report']['url']
+
+        uploads = len(server.objects)
+        stats = build_derivatives(db, fetcher, state, since='2026-03-01', threads=2, processes=1)
+        assert stats['photos'] == 0 and len(server.objects) == uploads   # nothing left to build
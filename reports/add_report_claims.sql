@@ -0,0 +1,18 @@
+-- Claim columns for reports/report_poller.py
+-- Run this in the Supabase SQL editor after add_report_sent_at.sql
+
+ALTER TABLE job_submissions
+ADD COLUMN IF NOT EXISTS report_claimed_by TEXT DEFAULT NULL,
+ADD COLUMN IF NOT EXISTS report_claimed_at TIMESTAMPTZ DEFAULT NULL,
+ADD COLUMN IF NOT EXISTS report_attempts INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS report_error TEXT DEFAULT NULL;
+
+COMMENT ON COLUMN job_submissions.report_claimed_by IS 'Report poller that is rendering (or rendered) this submission''s report.';
+COMMENT ON COLUMN job_submissions.report_claimed_at IS 'When report_claimed_by took the claim; claims older than the poller lease are taken over.';
+COMMENT ON COLUMN job_submissions.report_attempts IS 'Claims taken on this submission''s report; the poller stops at --max-attempts. Reset to 0 to retry.';
+COMMENT ON COLUMN job_submissions.report_error IS 'Last error from rendering this submission''s report.';
+
+-- The poller only ever looks at approved submissions whose report has not been sent
+CREATE INDEX IF NOT EXISTS idx_job_submissions_report_pending
+ON job_submissions (updated_at, id)
+WHERE review_outcome = 'approved' AND report_sent_at IS NULL;
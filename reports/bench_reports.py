@@ -0,0 +1,183 @@
+"""
+ShelfAssured Report Benchmark
+Renders synthetic reports whose photos are realistic phone-camera JPEGs
+served over HTTP by a local storage stand-in, and reports throughput,
+latency percentiles, peak RSS, PDF size and per-phase time.
+
+Peak RSS is ru_maxrss, the high-water mark of a whole process, so it is
+reported once per batch (the largest of the batch process and its render
+processes), not per phase. Styles are built on a renderer's first report
+inside the style_setup phase, so that phase shows their one-off cost
+spread over the batch.
+
+Each batch runs in a fresh child process so its peak RSS is its own, and
+the photo server runs in another process so it does not compete with the
+renderer for the GIL.
+
+Usage:
+    python3 bench_reports.py [--batches 1,100,1000] [--photo-size 4032x3024]
+                             [--photos 3] [--workers 0] [--json results.json]
+
+--workers 0 renders serially in one process; N > 0 uses N render processes.
+"""
+
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+DISTINCT_PHOTOS = 12
+PHOTO_TYPES     = ['product_closeup', 'section_context', 'wide_angle']
+
+
+def make_photo(width: int, height: int, seed: int) -> bytes:
+    """A noisy gradient JPEG that compresses like a real shelf photo (~3-4MB at 12MP)."""
+    from PIL import Image
+    noise = Image.effect_noise((width, height), 24 + seed)
+    base  = Image.linear_gradient('L').resize((width, height))
+    img   = Image.merge('RGB', (noise, base, Image.blend(noise, base, 0.5)))
+    out = io.BytesIO()
+    img.save(out, 'JPEG', quality=85)
+    return out.getvalue()
+
+
+def _serve_photos(width, height, port_queue):
+    from local_storage import LocalStorageServer
+    server = LocalStorageServer(('127.0.0.1', 0))
+    for i in range(DISTINCT_PHOTOS):
+        server.objects[('job_submissions', f'bench/{i}.jpg')] = make_photo(width, height, i)
+    port_queue.put((server.base_url, sum(len(v) for v in server.objects.values()) // DISTINCT_PHOTOS))
+    server.serve_forever()
+
+
+def sample_payload(i: int, base_url: str, photos: int) -> dict:
+    return {
+        'job_title':          f'Bench Brand — Store {i} Shelf Audit',
+        'brand_name':         'Bench Brand',
+        'store_banner':       'H-E-B',
+        'store_name':         f'H-E-B – Austin – TX – Lamar {i}',
+        'store_address':      f'{1000 + i} N Lamar Blvd, Austin, TX 78703',
+        'sku_name':           'Original Boudain',
+        'sku_upc':            '736526115552',
+        'shelfer_first_name': 'Bench',
+        'submitted_at':       '2026-03-06T14:32:00Z',
+        'photos': [
+            {'url': f'{base_url}/storage/v1/object/public/job_submissions/bench/{(i * 3 + k) % DISTINCT_PHOTOS}.jpg',
+             'type': PHOTO_TYPES[k % 3]}
+            for k in range(photos)
+        ],
+        'price_verified':     i % 3 != 0,
+        'price_found':        '5.99',
+        'price_expected':     '5.99',
+        'stock_level':        ['In Stock', 'Low', 'Out of Stock'][i % 3],
+        'shelfer_notes':      'Product was well-stocked and properly faced.',
+        'report_id':          f'RPT-BENCH-{i:05d}',
+    }
+
+
+# ── Render side (runs inside the batch child process / its pool) ──────────────
+_state = {}
+
+
+def _init_renderer():
+    import requests
+    _state['session'] = requests.Session()
+
+
+def _render_one(payload):
+    from generate_report import make_styles, render_report
+    phases = defaultdict(float)
+
+    def on_phase(name, seconds):
+        phases[name] += seconds
+
+    started = time.perf_counter()
+    if 'styles' not in _state:
+        _state['styles'] = make_styles()
+        on_phase('style_setup', time.perf_counter() - started)
+    pdf = render_report(payload, None, styles=_state['styles'], session=_state['session'], on_phase=on_phase)
+    return time.perf_counter() - started, len(pdf), dict(phases), _peak_rss_mb()
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_batch(size, base_url, photos, workers, result_queue):
+    payloads = [sample_payload(i, base_url, photos) for i in range(size)]
+    started = time.perf_counter()
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_renderer) as pool:
+            results = list(pool.map(_render_one, payloads, chunksize=max(1, size // (workers * 8))))
+    else:
+        _init_renderer()
+        results = [_render_one(p) for p in payloads]
+    wall = time.perf_counter() - started
+
+    latencies = sorted(r[0] for r in results)
+    phases = defaultdict(float)
+    for _, _, ph, _ in results:
+        for name, seconds in ph.items():
+            phases[name] += seconds
+    result_queue.put({
+        'batch':          size,
+        'workers':        workers,
+        'wall_s':         round(wall, 3),
+        'reports_per_s':  round(size / wall, 2),
+        'p50_ms':         round(_pct(latencies, 50) * 1000, 1),
+        'p99_ms':         round(_pct(latencies, 99) * 1000, 1),
+        'process_peak_rss_mb': round(max([_peak_rss_mb()] + [r[3] for r in results]), 1),
+        'pdf_bytes_avg':  sum(r[1] for r in results) // size,
+        'phase_ms_per_report': {k: round(v / size * 1000, 1) for k, v in sorted(phases.items())},
+    })
+
+
+def _pct(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark ShelfAssured report rendering.')
+    parser.add_argument('--batches', default='1,100,1000', help='comma-separated batch sizes')
+    parser.add_argument('--photo-size', default='4032x3024', help='synthetic photo WIDTHxHEIGHT')
+    parser.add_argument('--photos', type=int, default=3, help='photos per report (0-3)')
+    parser.add_argument('--workers', type=int, default=0, help='render processes (0 = serial)')
+    parser.add_argument('--json', help='also write results to this file')
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.photo_size.lower().split('x'))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    port_queue = mp.Queue()
+    server = mp.Process(target=_serve_photos, args=(width, height, port_queue), daemon=True)
+    server.start()
+    base_url, photo_bytes = port_queue.get(timeout=120)
+    print(f"Photo stand-in: {base_url} ({DISTINCT_PHOTOS} photos, {photo_bytes / 1e6:.1f} MB each)")
+
+    results = []
+    try:
+        for size in (int(b) for b in args.batches.split(',') if b.strip()):
+            result_queue = mp.Queue()
+            child = mp.Process(target=_run_batch, args=(size, base_url, args.photos, args.workers, result_queue))
+            child.start()
+            result = result_queue.get()
+            child.join()
+            results.append(result)
+            print(f"batch={result['batch']:>5}  {result['reports_per_s']:>7} reports/s  "
+                  f"p50={result['p50_ms']}ms  p99={result['p99_ms']}ms  "
+                  f"process peak rss={result['process_peak_rss_mb']}MB  pdf={result['pdf_bytes_avg'] / 1e3:.0f}KB  "
+                  f"phases={result['phase_ms_per_report']}")
+    finally:
+        server.terminate()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written: {args.json}")
@@ -0,0 +1,2 @@
+# test_report.py is a script that writes sample_report.pdf when imported, not a pytest module
+collect_ignore = ['test_report.py']
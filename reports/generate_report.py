@@ -4,15 +4,24 @@ Generates a branded PDF report for a completed shelf audit job.
 
 Usage:
     python3 generate_report.py '<json_data>' output.pdf
+    python3 generate_report.py '<json_data>' -                      (PDF to stdout)
+    python3 generate_report.py '<json_data>' storage://bucket/path.pdf
 
-Or import and call generate_report(data_dict, output_path)
+Options (before the positional arguments):
+    --generated-at=2026-03-06T14:32:00Z   pin the "Generated" date and PDF timestamps
+    --skip-if-unchanged                   skip rendering when the manifest next to
+                                          output.pdf shows identical inputs
+
+Or import and call generate_report(data_dict, output_path), or
+render_report(data_dict) to get the PDF bytes without touching disk.
 """
 
 import sys
 import json
 import os
+import gc
 import io
-import requests
+import time
 from datetime import datetime
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
@@ -24,6 +33,10 @@ from reportlab.platypus import (
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
 from reportlab.platypus import Flowable
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.lib.utils import TimeStamp
+
+from report_manifest import check_report, write_manifest
 
 # ── Brand Colors ──────────────────────────────────────────────────────────────
 RED        = HexColor('#C62828')
@@ -53,15 +66,35 @@ class ChromeRule(Flowable):
         self.canv.rect(24, 0, self.width - 24, self.height, fill=1, stroke=0)
 
 
-def fetch_image(url, max_w=2.8*inch, max_h=2.4*inch):
+class _phase:
+    """Context manager that reports elapsed seconds to an on_phase(name, seconds) hook."""
+    def __init__(self, on_phase, name):
+        self.on_phase = on_phase
+        self.name     = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.on_phase:
+            self.on_phase(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def fetch_image(url, max_w=2.8*inch, max_h=2.4*inch, session=None, on_phase=None):
     """Download an image URL and return a ReportLab Image flowable, or None."""
     if not url:
         return None
     try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        img_data = io.BytesIO(resp.content)
-        img = Image(img_data)
+        with _phase(on_phase, 'image_fetch'):
+            if session is None:
+                import requests as session
+            resp = session.get(url, timeout=10)
+            resp.raise_for_status()
+        with _phase(on_phase, 'image_decode'):
+            img_data = io.BytesIO(resp.content)
+            img = Image(img_data)
         # Scale proportionally to fit within max dimensions
         ratio = min(max_w / img.drawWidth, max_h / img.drawHeight)
         img.drawWidth  *= ratio
@@ -169,10 +202,120 @@ def field_row(label, value, styles):
     ]
 
 
-def generate_report(data: dict, output_path: str, personal_note: str = None):
+def price_status(price_verified, styles):
+    """Return (text, style) describing a price verification result."""
+    if price_verified is True:
+        return 'VERIFIED — Price matches expected', styles['StatusGood']
+    if price_verified is False:
+        return 'MISMATCH — Price does not match expected', styles['StatusWarn']
+    return 'Not recorded', styles['FieldValue']
+
+
+def stock_level_style(stock_level, styles):
+    """Pick the paragraph style used to colour a stock level value."""
+    level = (stock_level or '').lower()
+    if level in ('in stock', 'full'):
+        return styles['StatusGood']
+    if level in ('low', 'low stock'):
+        return styles['StatusWarn']
+    if level in ('out of stock', 'empty'):
+        return ParagraphStyle('StockBad', fontName='Helvetica-Bold', fontSize=10, textColor=RED)
+    return styles['FieldValue']
+
+
+def pinned_canvas(generated_at: datetime):
+    """
+    Canvas class whose PDF CreationDate/ModDate are generated_at and whose
+    document ID is derived from content, so identical input gives
+    byte-identical output.
+    """
+    ts = TimeStamp(invariant=1)
+    ts.t      = generated_at.timestamp()
+    ts.lt     = time.gmtime(ts.t)
+    ts.YMDhms = tuple(ts.lt)[:6]
+
+    class PinnedCanvas(Canvas):
+        def __init__(self, *args, **kwargs):
+            kwargs['invariant'] = 1
+            Canvas.__init__(self, *args, **kwargs)
+            self._doc._timeStamp = ts
+
+    return PinnedCanvas
+
+
+def photo_section(photos, s, page_w, session=None, on_phase=None):
+    """Return the 'Shelf Photos' flowables for up to 3 photos (empty list if none)."""
+    if not photos:
+        return []
+
+    photo_captions = {
+        'product_closeup': 'Product Close-Up',
+        'section_context': 'Shelf Section',
+        'wide_angle':      'Wide-Angle Aisle View',
+    }
+
+    # Fetch images (up to 3)
+    photo_cells = []
+    for ph in photos[:3]:
+        url     = ph.get('url', '')
+        ph_type = ph.get('type', '')
+        caption = photo_captions.get(ph_type, ph.get('caption', ph_type.replace('_', ' ').title()))
+        img = fetch_image(url, max_w=2.2*inch, max_h=2.0*inch, session=session, on_phase=on_phase)
+        if img:
+            cell = [img, Paragraph(caption, s['PhotoCaption'])]
+        else:
+            cell = [
+                Paragraph('[Photo not available]', s['PhotoCaption']),
+                Paragraph(caption, s['PhotoCaption'])
+            ]
+        photo_cells.append(cell)
+
+    # Pad to 3 columns
+    while len(photo_cells) < 3:
+        photo_cells.append('')
+
+    col_w = page_w / 3
+    photo_tbl = Table(
+        [photo_cells],
+        colWidths=[col_w, col_w, col_w]
+    )
+    photo_tbl.setStyle(TableStyle([
+        ('ALIGN',   (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN',  (0, 0), (-1, -1), 'TOP'),
+        ('TOPPADDING',    (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('BOX', (0, 0), (-1, -1), 0.5, CHROME),
+        ('INNERGRID', (0, 0), (-1, -1), 0.25, HexColor('#E0E0E0')),
+        ('BACKGROUND', (0, 0), (-1, -1), LIGHT_GRAY),
+    ]))
+    return [Paragraph('Shelf Photos', s['SectionHeader']), photo_tbl, Spacer(1, 14)]
+
+
+def generate_report(data: dict, output_path, personal_note: str = None,
+                    styles=None, session=None, generated_at: datetime = None,
+                    skip_if_unchanged: bool = False, on_phase=None):
     """
     Generate a ShelfAssured PDF report.
 
+    output_path may be a filesystem path or any writable binary stream
+    (io.BytesIO, a socket file, sys.stdout.buffer, ...).
+
+    styles (from make_styles()) and session (a requests.Session) may be
+    passed in by long-running callers so they are built once, not per report.
+
+    generated_at pins the "Generated" header date and the PDF timestamps;
+    with it set, the same input always renders to the same bytes.
+
+    With skip_if_unchanged (path outputs only) the input hash is compared
+    with the manifest written next to the output on the previous run, and
+    rendering is skipped when nothing changed.
+
+    on_phase, if given, is called as on_phase(name, seconds) for each timed
+    phase: 'manifest' (skip_if_unchanged only), 'style_setup', then
+    'image_fetch' and 'image_decode' once per photo, and finally 'build'.
+    'image_decode' covers opening and sizing the image; reportlab's own
+    pixel work happens later and is counted in 'build'.
+
     data keys expected:
         job_title, brand_name, brand_logo_url (optional),
         store_banner, store_name, store_address,
@@ -185,7 +328,17 @@ def generate_report(data: dict, output_path: str, personal_note: str = None):
         shelfer_notes (str),
         report_id (str)
     """
-    s = make_styles()
+    is_path = isinstance(output_path, (str, os.PathLike))
+    input_hash = None
+    if skip_if_unchanged and is_path:
+        with _phase(on_phase, 'manifest'):
+            input_hash, current = check_report(data, personal_note, output_path, session)
+        if current:
+            print(f"Report unchanged, skipped: {output_path}")
+            return output_path
+
+    with _phase(on_phase, 'style_setup'):
+        s = styles or make_styles()
     doc = SimpleDocTemplate(
         output_path,
         pagesize=letter,
@@ -206,7 +359,7 @@ def generate_report(data: dict, output_path: str, personal_note: str = None):
             'H', fontName='Helvetica-Bold', fontSize=24, textColor=RED)),
         Paragraph(
             f'<font color="#78909C">Shelf Audit Report</font><br/>'
-            f'<font color="#9E9E9E" size="8">Generated {datetime.now().strftime("%B %d, %Y")}</font>',
+            f'<font color="#9E9E9E" size="8">Generated {(generated_at or datetime.now()).strftime("%B %d, %Y")}</font>',
             ParagraphStyle('HR', fontName='Helvetica', fontSize=11, alignment=TA_RIGHT)
         )
     ]]
@@ -273,24 +426,8 @@ def generate_report(data: dict, output_path: str, personal_note: str = None):
     price_expected = data.get('price_expected', 'N/A')
     stock_level    = data.get('stock_level', 'N/A')
 
-    if price_verified is True:
-        price_status_style = s['StatusGood']
-        price_status_text  = 'VERIFIED — Price matches expected'
-    elif price_verified is False:
-        price_status_style = s['StatusWarn']
-        price_status_text  = 'MISMATCH — Price does not match expected'
-    else:
-        price_status_style = s['FieldValue']
-        price_status_text  = 'Not recorded'
-
-    if stock_level and stock_level.lower() in ('in stock', 'full'):
-        stock_style = s['StatusGood']
-    elif stock_level and stock_level.lower() in ('low', 'low stock'):
-        stock_style = s['StatusWarn']
-    elif stock_level and stock_level.lower() in ('out of stock', 'empty'):
-        stock_style = ParagraphStyle('StockBad', fontName='Helvetica-Bold', fontSize=10, textColor=RED)
-    else:
-        stock_style = s['FieldValue']
+    price_status_text, price_status_style = price_status(price_verified, s)
+    stock_style = stock_level_style(stock_level, s)
 
     verif_data = [
         [Paragraph('Price Status', s['FieldLabel']),
@@ -318,52 +455,8 @@ def generate_report(data: dict, output_path: str, personal_note: str = None):
     story.append(Spacer(1, 14))
 
     # ── Photos ────────────────────────────────────────────────────────────────
-    photos = data.get('photos', [])
-    if photos:
-        story.append(Paragraph('Shelf Photos', s['SectionHeader']))
-
-        photo_captions = {
-            'product_closeup': 'Product Close-Up',
-            'section_context': 'Shelf Section',
-            'wide_angle':      'Wide-Angle Aisle View',
-        }
-
-        # Fetch images (up to 3)
-        photo_cells = []
-        for ph in photos[:3]:
-            url     = ph.get('url', '')
-            ph_type = ph.get('type', '')
-            caption = photo_captions.get(ph_type, ph.get('caption', ph_type.replace('_', ' ').title()))
-            img = fetch_image(url, max_w=2.2*inch, max_h=2.0*inch)
-            if img:
-                cell = [img, Paragraph(caption, s['PhotoCaption'])]
-            else:
-                cell = [
-                    Paragraph(f'[Photo not available]', s['PhotoCaption']),
-                    Paragraph(caption, s['PhotoCaption'])
-                ]
-            photo_cells.append(cell)
-
-        # Pad to 3 columns
-        while len(photo_cells) < 3:
-            photo_cells.append(['', ''])
-
-        col_w = page_w / 3
-        photo_tbl = Table(
-            [photo_cells],
-            colWidths=[col_w, col_w, col_w]
-        )
-        photo_tbl.setStyle(TableStyle([
-            ('ALIGN',   (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN',  (0, 0), (-1, -1), 'TOP'),
-            ('TOPPADDING',    (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('BOX', (0, 0), (-1, -1), 0.5, CHROME),
-            ('INNERGRID', (0, 0), (-1, -1), 0.25, HexColor('#E0E0E0')),
-            ('BACKGROUND', (0, 0), (-1, -1), LIGHT_GRAY),
-        ]))
-        story.append(photo_tbl)
-        story.append(Spacer(1, 14))
+    photo_flowables = photo_section(data.get('photos', []), s, page_w, session, on_phase)
+    story.extend(photo_flowables)
 
     # ── Shelfer Notes ─────────────────────────────────────────────────────────
     shelfer_notes = data.get('shelfer_notes', '').strip()
@@ -419,19 +512,54 @@ def generate_report(data: dict, output_path: str, personal_note: str = None):
     story.append(Paragraph(footer_text, s['FooterText']))
 
     # ── Build ─────────────────────────────────────────────────────────────────
-    doc.build(story)
-    print(f"Report generated: {output_path}")
+    with _phase(on_phase, 'build'):
+        if generated_at:
+            doc.build(story, canvasmaker=pinned_canvas(generated_at))
+        else:
+            doc.build(story)
+    # reportlab's ImageReader (it keeps a bound method of itself) and the
+    # doc/canvas pair are reference cycles, so the decoded photos (~36MB each
+    # at 12MP) are only freed by a full GC pass. In a batch that pass comes
+    # too rarely and RSS climbs by hundreds of MB per report; collecting here
+    # costs ~15ms.
+    if photo_flowables:
+        del story, doc, photo_flowables
+        gc.collect()
+    if is_path:
+        if input_hash:
+            write_manifest(output_path, input_hash, generated_at or datetime.now())
+        print(f"Report generated: {output_path}")
     return output_path
 
 
+def render_report(data: dict, personal_note: str = None, **kwargs) -> bytes:
+    """Render a report entirely in memory and return the PDF bytes."""
+    buf = io.BytesIO()
+    generate_report(data, buf, personal_note, **kwargs)
+    return buf.getvalue()
+
+
 # ── CLI entry point ────────────────────────────────────────────────────────────
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
-        print("Usage: python3 generate_report.py '<json>' output.pdf [personal_note]")
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    opts = dict(a[2:].partition('=')[::2] for a in sys.argv[1:] if a.startswith('--'))
+    if len(args) < 2:
+        print("Usage: python3 generate_report.py [--generated-at=ISO] [--skip-if-unchanged] '<json>' output.pdf [personal_note]")
         sys.exit(1)
 
-    data        = json.loads(sys.argv[1])
-    output_path = sys.argv[2]
-    note        = sys.argv[3] if len(sys.argv) > 3 else None
-
-    generate_report(data, output_path, note)
+    data        = json.loads(args[0])
+    output_path = args[1]
+    note        = args[2] if len(args) > 2 else None
+    kwargs      = {}
+    if opts.get('generated-at'):
+        kwargs['generated_at'] = datetime.fromisoformat(opts['generated-at'].replace('Z', '+00:00'))
+
+    if output_path == '-':
+        generate_report(data, sys.stdout.buffer, note, **kwargs)
+    elif output_path.startswith('storage://'):
+        from storage import StorageClient
+        bucket, _, object_path = output_path[len('storage://'):].partition('/')
+        url = StorageClient.from_env().upload(bucket, object_path, render_report(data, note, **kwargs))
+        print(f"Report uploaded: {url}")
+    else:
+        generate_report(data, output_path, note, skip_if_unchanged='skip-if-unchanged' in opts, **kwargs)
@@ -0,0 +1,331 @@
+"""
+ShelfAssured Brand Rollup Report Generator
+Generates one branded PDF covering every store in a campaign: a table of
+contents, a per-store summary table of stock level and price verification,
+and a detail card with photo thumbnails for each store.
+
+Rows are consumed as a stream. Photos are downloaded a few at a time (the
+thumb derivative when the payload has a thumb_url), shrunk to thumbnails
+and the full-resolution bytes are dropped right away, so memory stays
+bounded by the thumbnail size rather than the photo size.
+
+Usage:
+    python3 generate_rollup_report.py campaign.json rows.jsonl output.pdf
+
+campaign.json holds campaign_title, brand_name and optionally report_id and
+period; rows.jsonl holds one generate_report-style dict per submission.
+
+Or import and call generate_rollup_report(campaign, rows, output)
+"""
+
+import io
+import json
+import os
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from PIL import Image as PILImage
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.lib.colors import HexColor
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.enums import TA_RIGHT
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import (
+    BaseDocTemplate, PageTemplate, Frame, Paragraph, Spacer, Table,
+    TableStyle, KeepTogether, PageBreak, Flowable,
+)
+from reportlab.platypus.tableofcontents import TableOfContents
+
+from generate_report import (
+    RED, CHROME, LIGHT_GRAY, MID_GRAY, DARK_CHROME, TEXT_BLACK,
+    ChromeRule, make_styles, price_status, stock_level_style,
+)
+
+THUMB_PX      = 320          # longest edge of an embedded thumbnail
+THUMB_QUALITY = 70
+THUMB_W       = 1.6*inch
+THUMB_H       = 1.2*inch
+FETCH_WORKERS = 8
+
+
+def fetch_thumbnail(url, max_px=THUMB_PX, session=None):
+    """
+    Download a photo and return it re-encoded as a small JPEG (bytes), or None.
+
+    JPEG draft mode lets Pillow decode at 1/2, 1/4 or 1/8 scale, so large
+    phone photos are never fully decoded.
+    """
+    if not url:
+        return None
+    try:
+        resp = (session or requests).get(url, timeout=10)
+        resp.raise_for_status()
+        img = PILImage.open(io.BytesIO(resp.content))
+        img.draft('RGB', (max_px, max_px))
+        img = img.convert('RGB')
+        img.thumbnail((max_px, max_px))
+        out = io.BytesIO()
+        img.save(out, 'JPEG', quality=THUMB_QUALITY, optimize=True)
+        return out.getvalue()
+    except Exception as e:
+        print(f"  Warning: could not fetch thumbnail {url}: {e}", file=sys.stderr)
+        return None
+
+
+def _store_label(row):
+    return row.get('store_name') or row.get('store_banner') or 'Unknown Store'
+
+
+class Thumbnail(Flowable):
+    """
+    A JPEG thumbnail that keeps only its encoded bytes between draws.
+
+    platypus.Image holds on to the decoded bitmap once drawn, which adds up
+    to hundreds of MB across a few thousand photos; here the reader is
+    created for the draw call and thrown away again.
+    """
+    def __init__(self, jpeg_bytes, max_w=THUMB_W, max_h=THUMB_H):
+        Flowable.__init__(self)
+        self.jpeg = jpeg_bytes
+        w, h = ImageReader(io.BytesIO(jpeg_bytes)).getSize()
+        ratio = min(max_w / w, max_h / h)
+        self.width, self.height = w * ratio, h * ratio
+
+    def draw(self):
+        self.canv.drawImage(ImageReader(io.BytesIO(self.jpeg)), 0, 0, self.width, self.height)
+
+
+class RollupDocTemplate(BaseDocTemplate):
+    """Doc template that feeds section headings into the table of contents."""
+
+    def __init__(self, output, campaign, **kwargs):
+        BaseDocTemplate.__init__(self, output, **kwargs)
+        self.campaign = campaign
+        frame = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id='body')
+        self.addPageTemplates([PageTemplate(id='page', frames=[frame], onPage=self._decorate)])
+
+    def _decorate(self, canv, doc):
+        canv.saveState()
+        canv.setFont('Helvetica', 7)
+        canv.setFillColor(MID_GRAY)
+        footer = f"{self.campaign.get('brand_name', '')} — {self.campaign.get('campaign_title', 'Campaign Rollup')}"
+        canv.drawString(self.leftMargin, 0.45*inch, footer)
+        canv.drawRightString(self.leftMargin + self.width, 0.45*inch, f'Page {doc.page}')
+        canv.restoreState()
+
+    def afterFlowable(self, flowable):
+        if isinstance(flowable, Paragraph) and flowable.style.name in ('TOCSection', 'TOCBanner'):
+            level = 0 if flowable.style.name == 'TOCSection' else 1
+            text  = flowable.getPlainText()
+            key   = f'toc-{self.seq.nextf("toc")}'
+            self.canv.bookmarkPage(key)
+            self.notify('TOCEntry', (level, text, self.page, key))
+
+
+def _rollup_styles():
+    s = make_styles()
+    s.add(ParagraphStyle('TOCSection', parent=s['SectionHeader']))
+    s.add(ParagraphStyle('TOCBanner', fontName='Helvetica-Bold', fontSize=12,
+                         textColor=RED, spaceBefore=10, spaceAfter=4))
+    s.add(ParagraphStyle('StoreHeading', fontName='Helvetica-Bold', fontSize=10,
+                         textColor=TEXT_BLACK, spaceAfter=1))
+    s.add(ParagraphStyle('StoreAddress', fontName='Helvetica', fontSize=8,
+                         textColor=DARK_CHROME, spaceAfter=4))
+    s.add(ParagraphStyle('Cell', fontName='Helvetica', fontSize=8, textColor=TEXT_BLACK, leading=10))
+    s.add(ParagraphStyle('CellHead', fontName='Helvetica-Bold', fontSize=8, textColor=DARK_CHROME, leading=10))
+    return s
+
+
+def _summary_table(rows, s, page_w):
+    """One line per store: banner, store, location, stock level and price status."""
+    head = ['Banner', 'Store', 'City / State', 'Stock Level', 'Price']
+    data = [[Paragraph(h, s['CellHead']) for h in head]]
+    for row in rows:
+        price_text = {True: 'Verified', False: 'Mismatch'}.get(row.get('price_verified'), 'Not recorded')
+        _, price_style = price_status(row.get('price_verified'), s)
+        stock = row.get('stock_level') or 'N/A'
+        data.append([
+            Paragraph(row.get('store_banner') or 'N/A', s['Cell']),
+            Paragraph(_store_label(row), s['Cell']),
+            Paragraph(', '.join(filter(None, [row.get('store_city'), row.get('store_state')])) or 'N/A', s['Cell']),
+            Paragraph(str(stock), ParagraphStyle('c', parent=stock_level_style(stock, s), fontSize=8, leading=10)),
+            Paragraph(price_text, ParagraphStyle('c', parent=price_style, fontSize=8, leading=10)),
+        ])
+    tbl = Table(data, colWidths=[w * page_w for w in (0.18, 0.32, 0.2, 0.15, 0.15)], repeatRows=1)
+    tbl.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), LIGHT_GRAY),
+        ('VALIGN',     (0, 0), (-1, -1), 'TOP'),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        ('LINEBELOW', (0, 0), (-1, -1), 0.25, HexColor('#E0E0E0')),
+        ('BOX', (0, 0), (-1, -1), 0.5, CHROME),
+    ]))
+    return tbl
+
+
+def _store_card(row, thumbs, s, page_w):
+    """Detail block for one store: heading, verification line and thumbnails."""
+    price_text, price_style = price_status(row.get('price_verified'), s)
+    stock = row.get('stock_level') or 'N/A'
+    found = row.get('price_found')
+    verif = Table([[
+        Paragraph('Stock Level', s['FieldLabel']), Paragraph(str(stock), stock_level_style(stock, s)),
+        Paragraph('Price', s['FieldLabel']), Paragraph(price_text, price_style),
+        Paragraph('Found', s['FieldLabel']), Paragraph(f'${found}' if found else 'N/A', s['FieldValue']),
+    ]], colWidths=[w * page_w for w in (0.13, 0.15, 0.08, 0.42, 0.09, 0.13)])
+    verif.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), LIGHT_GRAY),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+    ]))
+
+    parts = [
+        Paragraph(_store_label(row), s['StoreHeading']),
+        Paragraph(row.get('store_address') or 'Address not recorded', s['StoreAddress']),
+        verif,
+    ]
+    cells = [Thumbnail(t) for t in thumbs if t]
+    if cells:
+        cells += [''] * (3 - len(cells))
+        photo_tbl = Table([cells], colWidths=[page_w / 3] * 3)
+        photo_tbl.setStyle(TableStyle([
+            ('ALIGN',  (0, 0), (-1, -1), 'CENTER'),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ]))
+        parts.append(photo_tbl)
+    parts.append(Spacer(1, 10))
+    return KeepTogether(parts)
+
+
+def generate_rollup_report(campaign: dict, rows, output, fetch_workers: int = FETCH_WORKERS):
+    """
+    Generate a campaign rollup PDF.
+
+    campaign keys: campaign_title, brand_name, report_id (optional), period (optional)
+    rows: iterable of generate_report-style dicts (store_banner, store_name,
+          store_address, store_city, store_state, price_verified, price_found,
+          stock_level, photos, ...). Consumed once, in order.
+    output: filesystem path or writable binary stream.
+    """
+    s = _rollup_styles()
+    page_w = letter[0] - 1.5*inch
+
+    # Photo URLs are queued for thumbnailing as rows arrive; the pool holds at
+    # most fetch_workers full-size downloads at a time.
+    pool    = ThreadPoolExecutor(max_workers=fetch_workers)
+    session = requests.Session()
+    by_banner = defaultdict(list)
+    stock_counts = Counter()
+    price_counts = Counter()
+    total = 0
+    try:
+        for row in rows:
+            total += 1
+            urls = [p.get('thumb_url') or p.get('url', '') for p in (row.get('photos') or [])[:3]]
+            slim = {k: v for k, v in row.items() if k != 'photos'}
+            slim['_thumbs'] = [pool.submit(fetch_thumbnail, u, THUMB_PX, session) for u in urls if u]
+            by_banner[row.get('store_banner') or 'Other'].append(slim)
+            stock_counts[(row.get('stock_level') or 'Not recorded').title()] += 1
+            price_counts[{True: 'Verified', False: 'Mismatch'}.get(row.get('price_verified'), 'Not recorded')] += 1
+
+        story = []
+
+        # ── Cover / header ────────────────────────────────────────────────────
+        header_tbl = Table([[
+            Paragraph('<font color="#C62828"><b>ShelfAssured</b></font>', ParagraphStyle(
+                'H', fontName='Helvetica-Bold', fontSize=24, textColor=RED)),
+            Paragraph(
+                f'<font color="#78909C">Campaign Rollup Report</font><br/>'
+                f'<font color="#9E9E9E" size="8">Generated {datetime.now().strftime("%B %d, %Y")}</font>',
+                ParagraphStyle('HR', fontName='Helvetica', fontSize=11, alignment=TA_RIGHT)),
+        ]], colWidths=[page_w * 0.55, page_w * 0.45])
+        header_tbl.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'MIDDLE')]))
+        story += [header_tbl, Spacer(1, 6), ChromeRule(page_w), Spacer(1, 14)]
+        story.append(Paragraph(campaign.get('campaign_title', 'Campaign Rollup'), s['ReportTitle']))
+        subtitle = ' · '.join(filter(None, [campaign.get('brand_name'), campaign.get('period')]))
+        if subtitle:
+            story.append(Paragraph(subtitle, s['FieldValue']))
+
+        overview = [['Stores covered', str(total)]]
+        overview += [[f'Stock: {k}', str(v)] for k, v in sorted(stock_counts.items())]
+        overview += [[f'Price: {k}', str(v)] for k, v in sorted(price_counts.items())]
+        ov_tbl = Table([[Paragraph(a, s['FieldLabel']), Paragraph(b, s['FieldValue'])] for a, b in overview],
+                       colWidths=[2.0*inch, page_w - 2.0*inch])
+        ov_tbl.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), LIGHT_GRAY),
+            ('LINEBELOW', (0, 0), (-1, -2), 0.5, HexColor('#E0E0E0')),
+            ('BOX', (0, 0), (-1, -1), 0.5, CHROME),
+        ]))
+        story += [Spacer(1, 8), ov_tbl, Spacer(1, 14)]
+
+        toc = TableOfContents()
+        toc.levelStyles = [
+            ParagraphStyle('TOC0', fontName='Helvetica-Bold', fontSize=10, leftIndent=0, leading=14),
+            ParagraphStyle('TOC1', fontName='Helvetica', fontSize=9, leftIndent=14, leading=12),
+        ]
+        story += [Paragraph('Contents', s['SectionHeader']), toc, PageBreak()]
+
+        # ── Store summary table ───────────────────────────────────────────────
+        banners = sorted(by_banner)
+        for rows_ in by_banner.values():
+            rows_.sort(key=lambda r: (r.get('store_state') or '', r.get('store_city') or '', _store_label(r)))
+        story.append(Paragraph('Store Summary', s['TOCSection']))
+        story.append(_summary_table((r for b in banners for r in by_banner[b]), s, page_w))
+        story.append(PageBreak())
+
+        # ── Per-store detail ──────────────────────────────────────────────────
+        story.append(Paragraph('Store Detail', s['TOCSection']))
+        for banner in banners:
+            story.append(Paragraph(banner, s['TOCBanner']))
+            for row in by_banner[banner]:
+                thumbs = [f.result() for f in row.pop('_thumbs')]
+                story.append(_store_card(row, thumbs, s, page_w))
+    finally:
+        pool.shutdown(wait=True)
+
+    report_id = campaign.get('report_id')
+    footer = 'Photos and data remain the property of ShelfAssured. For questions, contact hello@beshelfassured.com'
+    if report_id:
+        footer += f'  |  Report ID: {report_id}'
+    story += [Spacer(1, 6), ChromeRule(page_w), Spacer(1, 6), Paragraph(footer, s['FooterText'])]
+
+    doc = RollupDocTemplate(
+        output,
+        campaign,
+        pagesize=letter,
+        leftMargin=0.75*inch,
+        rightMargin=0.75*inch,
+        topMargin=0.6*inch,
+        bottomMargin=0.75*inch,
+        title=f"ShelfAssured Rollup — {campaign.get('campaign_title', 'Campaign')}",
+        author='ShelfAssured',
+    )
+    # Two passes: the first collects page numbers for the table of contents.
+    doc.multiBuild(story)
+    if isinstance(output, (str, os.PathLike)):
+        print(f"Rollup report generated: {output} ({total} stores)")
+    return output
+
+
+def iter_jsonl(path):
+    """Yield one dict per non-blank line of a JSON Lines file."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        print("Usage: python3 generate_rollup_report.py campaign.json rows.jsonl output.pdf")
+        sys.exit(1)
+
+    with open(sys.argv[1]) as f:
+        campaign = json.load(f)
+    generate_rollup_report(campaign, iter_jsonl(sys.argv[2]), sys.argv[3])
@@ -0,0 +1,171 @@
+"""
+Local Supabase Storage stand-in
+Serves the subset of the Storage REST API that storage.py uses (upload,
+download, public download, list) from memory or from a local directory.
+
+Usage:
+    python3 local_storage.py [port] [root_dir]
+
+Or from Python:
+    with serve_local_storage() as (base_url, server):
+        client = StorageClient(base_url, 'dev')
+        ...
+        server.objects  # {(bucket, path): bytes} when running in memory
+"""
+
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+OBJECT_PREFIX = '/storage/v1/object/'
+
+
+class LocalStorageServer(ThreadingHTTPServer):
+    """HTTP server holding objects in a dict, or under root_dir when one is given."""
+
+    daemon_threads = True
+
+    def __init__(self, address, root_dir: str = None):
+        super().__init__(address, LocalStorageHandler)
+        self.root_dir = root_dir
+        self.objects  = {}
+        self.lock     = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _disk_path(self, bucket, path):
+        full = os.path.normpath(os.path.join(self.root_dir, bucket, path))
+        if not full.startswith(os.path.normpath(self.root_dir) + os.sep):
+            raise PermissionError(path)
+        return full
+
+    def put(self, bucket, path, chunks):
+        if self.root_dir:
+            full = self._disk_path(bucket, path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        else:
+            data = b''.join(chunks)
+            with self.lock:
+                self.objects[(bucket, path)] = data
+
+    def get(self, bucket, path):
+        if self.root_dir:
+            full = self._disk_path(bucket, path)
+            if not os.path.isfile(full):
+                return None
+            with open(full, 'rb') as f:
+                return f.read()
+        with self.lock:
+            return self.objects.get((bucket, path))
+
+    def list(self, bucket, prefix):
+        if self.root_dir:
+            base = os.path.join(self.root_dir, bucket)
+            names = []
+            for dirpath, _, files in os.walk(base):
+                for name in files:
+                    names.append(os.path.relpath(os.path.join(dirpath, name), base).replace(os.sep, '/'))
+        else:
+            with self.lock:
+                names = [p for (b, p) in self.objects if b == bucket]
+        return sorted(n for n in names if n.startswith(prefix))
+
+
+class LocalStorageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _split(self):
+        path = unquote(urlparse(self.path).path)
+        if not path.startswith(OBJECT_PREFIX):
+            return None, None, None
+        rest = path[len(OBJECT_PREFIX):]
+        kind = None
+        for k in ('public/', 'list/'):
+            if rest.startswith(k):
+                kind, rest = k.rstrip('/'), rest[len(k):]
+        bucket, _, obj = rest.partition('/')
+        return kind, bucket, obj
+
+    def _read_body(self):
+        """Yield the request body, honouring both Content-Length and chunked encoding."""
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return
+                yield self.rfile.read(size)
+                self.rfile.readline()
+        remaining = int(self.headers.get('Content-Length') or 0)
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 64 * 1024))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+    def _reply(self, status, body=b'', content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        kind, bucket, obj = self._split()
+        if kind == 'list':
+            opts = json.loads(b''.join(self._read_body()) or b'{}')
+            prefix = opts.get('prefix', '')
+            offset, limit = int(opts.get('offset', 0)), int(opts.get('limit', 100))
+            names = self.server.list(bucket, prefix)[offset:offset + limit]
+            self._reply(200, json.dumps([{'name': n} for n in names]).encode())
+            return
+        if not bucket or not obj:
+            self._reply(404, b'{"error":"not found"}')
+            return
+        self.server.put(bucket, obj, self._read_body())
+        self._reply(200, json.dumps({'Key': f'{bucket}/{obj}'}).encode())
+
+    do_PUT = do_POST
+
+    def do_GET(self):
+        kind, bucket, obj = self._split()
+        data = self.server.get(bucket, obj) if bucket and obj else None
+        if data is None:
+            self._reply(404, b'{"error":"not found"}')
+        else:
+            self._reply(200, data, 'application/octet-stream')
+
+
+@contextmanager
+def serve_local_storage(host: str = '127.0.0.1', port: int = 0, root_dir: str = None):
+    """Run a stand-in server on a background thread; yields (base_url, server)."""
+    server = LocalStorageServer((host, port), root_dir)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.base_url, server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 54321
+    root = sys.argv[2] if len(sys.argv) > 2 else None
+    server = LocalStorageServer(('127.0.0.1', port), root)
+    print(f"Local storage stand-in on {server.base_url} ({root or 'in memory'})")
+    server.serve_forever()
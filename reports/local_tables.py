@@ -0,0 +1,159 @@
+"""
+Local Supabase table stand-in
+An in-memory replacement for the supabase-py query builder covering the
+calls our Python tools make: select / eq / neq / in_ / is_ / gt / gte / lt /
+lte / order / range / limit, plus insert, update and upsert.
+
+Every execute() is counted in .queries, so batch loaders can be checked for
+how many round trips they would make against the real database. Selects
+return at most max_rows rows (1000, Supabase's default), so a loader that
+forgets to page is caught here too.
+
+    client = LocalTables({'stores': [{'id': 's1', 'STORE': 'H-E-B – Austin – TX – Lamar'}]})
+    client.table('stores').select('id, STORE').in_('id', ['s1']).execute().data
+"""
+
+import copy
+import threading
+import uuid
+
+
+class LocalResponse:
+    def __init__(self, data, count=None):
+        self.data  = data
+        self.count = count
+
+
+class LocalTables:
+    """Dict-of-lists database; tables are created on first use."""
+
+    def __init__(self, tables: dict = None, max_rows: int = 1000):
+        self.tables   = {name: [dict(r) for r in rows] for name, rows in (tables or {}).items()}
+        self.queries  = 0
+        self.max_rows = max_rows
+        self.lock     = threading.Lock()
+
+    def table(self, name: str) -> 'LocalQuery':
+        return LocalQuery(self, name)
+
+    from_ = table
+
+
+class LocalQuery:
+    def __init__(self, db: LocalTables, name: str):
+        self.db       = db
+        self.name     = name
+        self.columns  = None
+        self.filters  = []
+        self.ordering = []
+        self.window   = None
+        self.action   = 'select'
+        self.payload  = None
+        self.want_count = False
+        self.on_conflict = 'id'
+
+    # ── Builders ──────────────────────────────────────────────────────────────
+    def select(self, columns: str = '*', count: str = None):
+        cols = [c.strip() for c in columns.split(',') if c.strip()]
+        self.columns = None if cols in ([], ['*']) else cols
+        self.want_count = bool(count)
+        return self
+
+    def _filter(self, fn):
+        self.filters.append(fn)
+        return self
+
+    def eq(self, col, value):
+        return self._filter(lambda r: r.get(col) == value)
+
+    def neq(self, col, value):
+        return self._filter(lambda r: r.get(col) != value)
+
+    def in_(self, col, values):
+        values = set(values)
+        return self._filter(lambda r: r.get(col) in values)
+
+    def is_(self, col, value):
+        if str(value).lower() == 'null':
+            return self._filter(lambda r: r.get(col) is None)
+        return self._filter(lambda r: r.get(col) is value)
+
+    def gt(self, col, value):
+        return self._filter(lambda r: r.get(col) is not None and r.get(col) > value)
+
+    def gte(self, col, value):
+        return self._filter(lambda r: r.get(col) is not None and r.get(col) >= value)
+
+    def lt(self, col, value):
+        return self._filter(lambda r: r.get(col) is not None and r.get(col) < value)
+
+    def lte(self, col, value):
+        return self._filter(lambda r: r.get(col) is not None and r.get(col) <= value)
+
+    def order(self, col, desc: bool = False):
+        self.ordering.append((col, desc))
+        return self
+
+    def range(self, start: int, end: int):
+        self.window = (start, end + 1)
+        return self
+
+    def limit(self, n: int):
+        self.window = (0, n)
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = 'insert', rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = 'id'):
+        self.action, self.payload, self.on_conflict = 'upsert', rows, on_conflict
+        return self
+
+    def update(self, values: dict):
+        self.action, self.payload = 'update', values
+        return self
+
+    # ── Execution ─────────────────────────────────────────────────────────────
+    def _project(self, row):
+        if self.columns is None:
+            return copy.deepcopy(row)
+        return {c: copy.deepcopy(row.get(c)) for c in self.columns}
+
+    def execute(self) -> LocalResponse:
+        with self.db.lock:
+            self.db.queries += 1
+            rows = self.db.tables.setdefault(self.name, [])
+
+            if self.action in ('insert', 'upsert'):
+                new = self.payload if isinstance(self.payload, list) else [self.payload]
+                keys = [k.strip() for k in self.on_conflict.split(',')]
+                out = []
+                for item in new:
+                    item = dict(item)
+                    existing = None
+                    if self.action == 'upsert':
+                        existing = next((r for r in rows if all(r.get(k) == item.get(k) for k in keys)), None)
+                    if existing is not None:
+                        existing.update(item)
+                        out.append(dict(existing))
+                    else:
+                        item.setdefault('id', str(uuid.uuid4()))
+                        rows.append(item)
+                        out.append(dict(item))
+                return LocalResponse(out)
+
+            matched = [r for r in rows if all(f(r) for f in self.filters)]
+            if self.action == 'update':
+                for r in matched:
+                    r.update(self.payload)
+                return LocalResponse([dict(r) for r in matched])
+
+            for col, desc in reversed(self.ordering):
+                matched.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+            total = len(matched)
+            if self.window:
+                matched = matched[self.window[0]:self.window[1]]
+            if self.db.max_rows is not None:
+                matched = matched[:self.db.max_rows]
+            return LocalResponse([self._project(r) for r in matched], total if self.want_count else None)
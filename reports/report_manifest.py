@@ -0,0 +1,152 @@
+"""
+ShelfAssured Report Manifests
+The skip-if-unchanged bookkeeping for generate_report.py, kept free of
+reportlab (and of requests until a photo has to be checked) so callers can
+tell whether a report needs rendering before paying for the renderer.
+
+Next to each rendered output.pdf sits output.pdf.manifest.json:
+
+    {"input_hash", "template_version", "generated_at", "output_sha256", "bytes"}
+
+input_hash covers the report data, the personal note, TEMPLATE_VERSION and
+a HEAD-request fingerprint of each photo; the report is current when the
+hash matches and the PDF on disk is the one the manifest describes.
+
+Storage outputs keep the same manifest as a second object next to the PDF
+(bucket/path.pdf.manifest.json), uploaded after the PDF so it only exists
+for a finished upload; the PDF itself is not downloaded to be re-hashed.
+
+Usage:
+    from report_manifest import check_report, check_stored_report
+    input_hash, current = check_report(data, note, 'out/RPT-001.pdf')
+    input_hash, current = check_stored_report(data, note, storage, 'reports', 'RPT-001.pdf')
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+# Bump whenever the layout in generate_report.py changes so cached reports are re-rendered.
+TEMPLATE_VERSION = '2'
+
+
+def photo_validator(url, session=None):
+    """
+    Return a cheap fingerprint of a photo's current content, or None.
+
+    Uses the ETag (or Last-Modified + Content-Length) from a HEAD request
+    so unchanged photos are not re-downloaded just to be hashed.
+    """
+    if not url:
+        return ''
+    if url.startswith('data:'):
+        return hashlib.sha256(url.encode()).hexdigest()
+    if session is None:
+        import requests as session
+    try:
+        resp = session.head(url, timeout=10, allow_redirects=True)
+        resp.raise_for_status()
+    except Exception:
+        return None
+    etag = resp.headers.get('ETag')
+    if etag:
+        return etag
+    modified, length = resp.headers.get('Last-Modified'), resp.headers.get('Content-Length')
+    return f'{modified}|{length}' if modified else None
+
+
+def report_input_hash(data: dict, personal_note: str = None, validators=None) -> str:
+    """Stable hash over everything that determines a report's content."""
+    payload = {
+        'template_version': TEMPLATE_VERSION,
+        'data':             data,
+        'personal_note':    (personal_note or '').strip(),
+        'photos':           validators or [],
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def manifest_path(output_path) -> str:
+    return f'{os.fspath(output_path)}.manifest.json'
+
+
+def _file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_report_current(output_path, input_hash: str) -> bool:
+    """True if output_path exists, is intact and its manifest records input_hash."""
+    try:
+        with open(manifest_path(output_path)) as f:
+            manifest = json.load(f)
+        return (manifest.get('input_hash') == input_hash
+                and manifest.get('output_sha256') == _file_sha256(output_path))
+    except (OSError, ValueError):
+        return False
+
+
+def _manifest(input_hash: str, generated_at: datetime, output_sha256: str, size: int) -> dict:
+    return {
+        'input_hash':       input_hash,
+        'template_version': TEMPLATE_VERSION,
+        'generated_at':     generated_at.isoformat(),
+        'output_sha256':    output_sha256,
+        'bytes':            size,
+    }
+
+
+def write_manifest(output_path, input_hash: str, generated_at: datetime):
+    manifest = _manifest(input_hash, generated_at, _file_sha256(output_path), os.path.getsize(output_path))
+    tmp = manifest_path(output_path) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path(output_path))
+
+
+def write_stored_manifest(storage, bucket: str, path: str, input_hash: str, pdf: bytes, generated_at: datetime):
+    """Upload the manifest for the PDF just uploaded to bucket/path (a storage.StorageClient)."""
+    manifest = _manifest(input_hash, generated_at, hashlib.sha256(pdf).hexdigest(), len(pdf))
+    storage.upload(bucket, manifest_path(path), json.dumps(manifest, indent=2).encode(),
+                   content_type='application/json')
+
+
+def is_stored_report_current(storage, bucket: str, path: str, input_hash: str) -> bool:
+    """True if the manifest stored next to bucket/path records input_hash."""
+    try:
+        manifest = json.loads(storage.download(bucket, manifest_path(path)))
+    except Exception:   # no manifest yet (404), or unreadable
+        return False
+    return manifest.get('input_hash') == input_hash
+
+
+def _input_hash(data: dict, personal_note: str, session=None):
+    validators = [photo_validator(ph.get('url', ''), session) for ph in data.get('photos', [])[:3]]
+    if None in validators:
+        return None
+    return report_input_hash(data, personal_note, validators)
+
+
+def check_report(data: dict, personal_note: str, output_path, session=None) -> tuple:
+    """
+    (input_hash, current) for rendering data to output_path. input_hash is
+    None when a photo could not be fingerprinted; such a report is never
+    current and gets no manifest.
+    """
+    input_hash = _input_hash(data, personal_note, session)
+    if input_hash is None:
+        return None, False
+    return input_hash, is_report_current(output_path, input_hash)
+
+
+def check_stored_report(data: dict, personal_note: str, storage, bucket: str, path: str, session=None) -> tuple:
+    """check_report for a PDF uploaded to bucket/path."""
+    input_hash = _input_hash(data, personal_note, session)
+    if input_hash is None:
+        return None, False
+    return input_hash, is_stored_report_current(storage, bucket, path, input_hash)
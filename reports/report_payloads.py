@@ -0,0 +1,263 @@
+"""
+ShelfAssured Report Payload Loader
+Builds generate_report input dicts for many submissions at once.
+
+Each chunk of submissions costs one query per table (job_submissions, jobs,
+brands, job_store_skus, stores, skus, users) using in_() on the collected
+ids, and rows already fetched for an earlier chunk are not fetched again, so
+a 1000-report batch is a few dozen queries rather than several thousand.
+Rows are joined in memory following the same rules as admin/report-queue.html:
+
+    store   submission.store_id, else the job's first job_store_skus row (oldest, then lowest id)
+    sku     submission.sku_id, else the job's first job_store_skus row
+    name    STORE || name
+    price   data.price || data.price_found
+    photos  the smallest derivative that fits (photos/photo_derivatives.py), else the original
+
+Usage:
+    from report_payloads import iter_report_payloads
+    for payload in iter_report_payloads(supabase, submission_ids=[...]):
+        generate_report(payload, f"{payload['report_id']}.pdf")
+
+    python3 report_payloads.py --submissions ID [ID ...] > payloads.jsonl
+    python3 report_payloads.py --jobs ID [ID ...] [--approved-only] > payloads.jsonl
+
+The client is anything with the supabase-py table().select().in_().execute()
+interface; local_tables.LocalTables works for offline runs.
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'photos'))
+from photo_derivatives import derivative_url
+
+BATCH_SIZE = 200   # ids per in_() filter; keeps PostgREST URLs well under proxy limits
+PAGE_SIZE  = 1000  # Supabase's default max rows per request
+PHOTO_PX   = 660   # a 2.2in report photo at 300dpi
+THUMB_PX   = 320   # generate_rollup_report thumbnails
+
+SUBMISSION_COLUMNS = 'id, job_id, store_id, sku_id, contractor_id, data, files, review_outcome, created_at, updated_at'
+TABLE_COLUMNS = {
+    'jobs':   'id, title, brand_id',
+    'brands': 'id, name, logo_url',
+    'stores': 'id, STORE, name, banner, store_chain, address, city, state, zip_code',
+    'skus':   'id, name, upc',
+    'users':  'id, full_name',
+}
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _select_in(client, table, columns, column, values, batch_size=BATCH_SIZE, order=()):
+    """Fetch every row whose column is in values, batching the filter and paging the result (in order, if given)."""
+    rows = []
+    for chunk in _chunks(list(values), batch_size):
+        start = 0
+        while True:
+            query = client.table(table).select(columns).in_(column, chunk)
+            for key in order:
+                query = query.order(key)
+            page = query.range(start, start + PAGE_SIZE - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+    return rows
+
+
+class PayloadLoader:
+    """
+    Holds per-table caches so that rows shared between submissions (the job,
+    its brand, a store visited for several SKUs) are fetched once per run.
+    With stores (a stores/store_table.StoreTable) store rows come from the
+    mapped file as it was last written, and only stores missing from it are
+    queried; the file is reopened when it has been rebuilt since.
+    """
+
+    def __init__(self, client, batch_size: int = BATCH_SIZE, stores=None):
+        self.client      = client
+        self.batch_size  = batch_size
+        self.stores      = stores
+        self.cache       = {table: {} for table in TABLE_COLUMNS}
+        self.job_targets = {}   # job_id -> first job_store_skus row (by created_at, then id)
+
+    def _fill(self, table, ids):
+        missing = {i for i in ids if i and i not in self.cache[table]}
+        if table == 'stores' and self.stores is not None:
+            for i in list(missing):
+                row = self.stores.get(i)
+                if row is not None:
+                    self.cache[table][i] = row
+                    missing.discard(i)
+        if not missing:
+            return
+        for row in _select_in(self.client, table, TABLE_COLUMNS[table], 'id', sorted(missing), self.batch_size):
+            self.cache[table][row['id']] = row
+        for i in missing:
+            self.cache[table].setdefault(i, None)  # remember misses too
+
+    def _fill_targets(self, job_ids):
+        missing = sorted({j for j in job_ids if j and j not in self.job_targets})
+        if not missing:
+            return
+        rows = _select_in(self.client, 'job_store_skus', 'job_id, store_id, sku_id', 'job_id', missing, self.batch_size,
+                          order=('created_at', 'id'))
+        for row in rows:
+            self.job_targets.setdefault(row['job_id'], row)
+        for j in missing:
+            self.job_targets.setdefault(j, None)
+
+    def payloads(self, submissions: list) -> list:
+        """Resolve every related row for a chunk of submissions and return joined payloads."""
+        if self.stores is not None:
+            stores = self.stores.refresh()
+            if stores is not self.stores:
+                self.stores = stores
+                self.cache['stores'].clear()
+        self._fill('jobs', [s.get('job_id') for s in submissions])
+        self._fill('brands', [(self.cache['jobs'].get(s.get('job_id')) or {}).get('brand_id') for s in submissions])
+        self._fill_targets([s.get('job_id') for s in submissions
+                            if not s.get('store_id') or not s.get('sku_id')])
+
+        store_ids, sku_ids = [], []
+        for s in submissions:
+            target = self.job_targets.get(s.get('job_id')) or {}
+            store_ids.append(s.get('store_id') or target.get('store_id'))
+            sku_ids.append(s.get('sku_id') or target.get('sku_id'))
+        self._fill('stores', store_ids)
+        self._fill('skus', sku_ids)
+        self._fill('users', [s.get('contractor_id') for s in submissions])
+
+        return [build_payload(s,
+                              job=self.cache['jobs'].get(s.get('job_id')),
+                              brand=self.cache['brands'].get((self.cache['jobs'].get(s.get('job_id')) or {}).get('brand_id')),
+                              store=self.cache['stores'].get(store_id),
+                              sku=self.cache['skus'].get(sku_id),
+                              user=self.cache['users'].get(s.get('contractor_id')))
+                for s, store_id, sku_id in zip(submissions, store_ids, sku_ids)]
+
+
+def format_store_address(store: dict) -> str:
+    """'address, city, state zip' with missing parts dropped."""
+    region = ' '.join(p for p in (store.get('state'), store.get('zip_code')) if p)
+    return ', '.join(p for p in (store.get('address'), store.get('city'), region) if p)
+
+
+def report_id_for(submission: dict) -> str:
+    # created_at, not updated_at: claims and photo-file merges bump updated_at,
+    # and a retried report must keep its id, output name and input hash
+    stamp = (submission.get('created_at') or '')[:10].replace('-', '')
+    return f"RPT-{stamp or datetime.now().strftime('%Y%m%d')}-{str(submission['id'])[:8].upper()}"
+
+
+def build_payload(submission: dict, job=None, brand=None, store=None, sku=None, user=None) -> dict:
+    """Join one submission with its related rows into the dict generate_report expects."""
+    job, brand, store, sku, user = (job or {}), (brand or {}), (store or {}), (sku or {}), (user or {})
+    data = submission.get('data') or {}
+    if isinstance(data, str):
+        data = json.loads(data)
+    files = submission.get('files') or []
+    if isinstance(files, str):
+        files = json.loads(files)
+
+    photos = []
+    for f in files:
+        src = f.get('url') or f.get('file_data')
+        if src:
+            photo = {'url': derivative_url(f, PHOTO_PX) or src, 'type': f.get('type') or 'photo'}
+            if f.get('derivatives'):
+                photo['thumb_url'] = derivative_url(f, THUMB_PX)
+            if f.get('image_quality'):
+                photo['image_quality'] = f['image_quality']
+            photos.append(photo)
+
+    full_name = (user.get('full_name') or '').strip()
+    return {
+        'submission_id':      submission['id'],
+        'report_id':          report_id_for(submission),
+        'job_title':          job.get('title') or 'Shelf Audit',
+        'brand_name':         brand.get('name') or '',
+        'brand_logo_url':     brand.get('logo_url'),
+        'store_banner':       store.get('banner') or store.get('store_chain') or '',
+        'store_name':         store.get('STORE') or store.get('name') or 'Unknown Store',
+        'store_address':      format_store_address(store),
+        'store_city':         store.get('city') or '',
+        'store_state':        store.get('state') or '',
+        'sku_name':           sku.get('name') or 'Unknown Product',
+        'sku_upc':            sku.get('upc') or '',
+        'shelfer_first_name': full_name.split()[0] if full_name else 'Shelfer',
+        'submitted_at':       submission.get('created_at') or '',
+        'photos':             photos,
+        'price_verified':     data.get('price_verified'),
+        'price_found':        data.get('price') or data.get('price_found') or '',
+        'price_expected':     data.get('price_expected') or '',
+        'stock_level':        data.get('stock_level') or '',
+        'shelfer_notes':      data.get('notes') or '',
+    }
+
+
+def iter_report_payloads(client, submission_ids=None, job_ids=None, approved_only: bool = False,
+                         batch_size: int = BATCH_SIZE):
+    """
+    Yield generate_report payloads for the given submissions, or for every
+    submission on the given jobs, one chunk of batch_size at a time.
+    Submission ids are yielded in the order given; missing ids are skipped
+    with a warning.
+    """
+    if not submission_ids and not job_ids:
+        return
+    loader = PayloadLoader(client, batch_size)
+
+    if submission_ids:
+        ordered = list(dict.fromkeys(submission_ids))
+        for chunk in _chunks(ordered, batch_size):
+            found = {}
+            for row in _select_in(client, 'job_submissions', SUBMISSION_COLUMNS, 'id', chunk, batch_size):
+                if not approved_only or row.get('review_outcome') == 'approved':
+                    found[row['id']] = row
+            for sid in chunk:
+                if sid not in found:
+                    print(f"  Warning: submission {sid} not found or not approved, skipping", file=sys.stderr)
+            yield from loader.payloads([found[sid] for sid in chunk if sid in found])
+        return
+
+    for job_chunk in _chunks(list(dict.fromkeys(job_ids)), batch_size):
+        start = 0
+        while True:
+            query = client.table('job_submissions').select(SUBMISSION_COLUMNS).in_('job_id', job_chunk)
+            if approved_only:
+                query = query.eq('review_outcome', 'approved')
+            page = query.order('created_at').order('id').range(start, start + batch_size - 1).execute().data or []
+            yield from loader.payloads(page)
+            if len(page) < batch_size:
+                break
+            start += batch_size
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write generate_report payloads as JSON lines.')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--submissions', nargs='+', metavar='ID')
+    group.add_argument('--jobs', nargs='+', metavar='ID')
+    parser.add_argument('--approved-only', action='store_true', help="only submissions with review_outcome='approved'")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from supabase import create_client
+    load_dotenv()
+    supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY'))
+
+    count = 0
+    for payload in iter_report_payloads(supabase, args.submissions, args.jobs, args.approved_only, args.batch_size):
+        sys.stdout.write(json.dumps(payload) + '\n')
+        count += 1
+    print(f"Wrote {count} payloads", file=sys.stderr)
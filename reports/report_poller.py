@@ -0,0 +1,281 @@
+"""
+ShelfAssured Report Poller
+Renders the report for every submission as soon as it is approved and marks
+it sent, so nobody has to run generate_report.py per job and nothing is
+rendered twice.
+
+Each poll reads the approved submissions with no report_sent_at whose
+updated_at (bumped by the approval) is at or after the watermark, oldest
+first, and claims them with one conditional update per attempt count:
+
+    report_claimed_by = <this poller>, report_attempts = n + 1
+        where report_sent_at IS NULL AND report_claimed_by IS NULL AND report_attempts = n
+
+Only the rows that update returns belong to this poller, so several pollers
+can run at once and each submission is rendered by one of them. The batch is
+joined by report_payloads.PayloadLoader, rendered on a warm process pool
+(report_worker._render_request) and finished with
+
+    report_sent_at = now()   where report_claimed_by = <this poller>
+
+A claim older than the lease (a crashed poller, or a render that failed) is
+taken over by the next poll. The report id (so the output name) and the
+"Completed" date come from created_at, which claims and photo-file merges
+never touch: a retried render overwrites the same file, and a taken-over
+report whose output is already current is not rendered again
+(skip_if_unchanged). Every claim counts as an attempt; a submission that
+has used max_attempts is left alone, with the last error in report_error,
+until report_attempts is reset. updated_at is only the watermark: the
+newest one seen, kept in the state file and read back with a small overlap
+for transactions that committed late. Needs add_report_claims.sql.
+
+Usage:
+    python3 report_poller.py [--output 'storage://reports/{report_id}.pdf'] [--interval 5] [--once]
+                             [--state report-poller-state.json] [--since 2026-01-01] [--workers N]
+                             [--max-attempts 5]
+
+    from report_poller import ReportPoller
+    with ReportPoller(supabase, 'out/{report_id}.pdf') as poller:
+        poller.poll()
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from report_payloads import PayloadLoader
+from report_worker import _render_request, _warm_up
+
+OUTPUT       = 'storage://reports/{report_id}.pdf'
+STATE_FILE   = 'report-poller-state.json'
+BATCH_SIZE   = 50    # reports per claim; one render batch
+LEASE_S      = 600   # a claim this old is abandoned and may be taken over
+MAX_ATTEMPTS = 5     # claims per submission before it is left for a person to look at
+OVERLAP_S    = 120   # re-read this far behind the watermark for late commits
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(moment: datetime) -> str:
+    return moment.isoformat()
+
+
+def _parse(stamp: str) -> datetime:
+    moment = datetime.fromisoformat(stamp.replace('Z', '+00:00'))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def load_state(path: str) -> dict:
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {'watermark': None, 'reports': 0, 'failed': 0}
+
+
+def save_state(path: str, state: dict):
+    if not path:
+        return
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+class ReportPoller:
+    """
+    Claims newly approved submissions in batches and renders their reports.
+    Use as a context manager so the render processes are started once and
+    stay warm between polls.
+    """
+
+    def __init__(self, client, output: str = OUTPUT, state: dict = None, state_path: str = None,
+                 batch_size: int = BATCH_SIZE, workers: int = None, lease_s: int = LEASE_S,
+                 overlap_s: int = OVERLAP_S, personal_note: str = None, stores=None,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.client        = client
+        self.output        = output
+        self.state_path    = state_path
+        self.state         = state if state is not None else load_state(state_path)
+        self.batch_size    = batch_size
+        self.workers       = workers or os.cpu_count() or 1
+        self.lease_s       = lease_s
+        self.overlap_s     = overlap_s
+        self.personal_note = personal_note
+        self.stores        = stores   # optional store_table.StoreTable
+        self.max_attempts  = max_attempts
+        self.token         = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.pool          = None
+
+    def __enter__(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+        return self
+
+    def __exit__(self, *exc):
+        self.pool.shutdown()
+        self.pool = None
+
+    # ── Claims ────────────────────────────────────────────────────────────────
+    def _pending(self, columns: str):
+        return self.client.table('job_submissions').select(columns) \
+            .eq('review_outcome', 'approved').is_('report_sent_at', 'null') \
+            .lt('report_attempts', self.max_attempts)
+
+    def _claim(self, rows: list, stale_before: str = None) -> list:
+        """
+        The rows this poller now owns; fresh claims unless stale_before is
+        given. report_attempts is bumped in the same update, matched on the
+        count that was read, so a row claimed in between is not taken.
+        """
+        by_attempts = {}
+        for r in rows:
+            by_attempts.setdefault(r.get('report_attempts') or 0, []).append(r['id'])
+        claimed = []
+        for attempts, ids in sorted(by_attempts.items()):
+            query = self.client.table('job_submissions') \
+                .update({'report_claimed_by': self.token, 'report_claimed_at': _iso(_now()),
+                         'report_attempts': attempts + 1}) \
+                .in_('id', ids).eq('review_outcome', 'approved').is_('report_sent_at', 'null') \
+                .eq('report_attempts', attempts)
+            if stale_before:
+                query = query.lt('report_claimed_at', stale_before)
+            else:
+                query = query.is_('report_claimed_by', 'null')
+            claimed.extend(query.execute().data or [])
+        return claimed
+
+    def claim_new(self) -> tuple:
+        """(claimed rows, newest updated_at seen) for the oldest batch_size unclaimed approvals."""
+        query = self._pending('id, updated_at, report_attempts').is_('report_claimed_by', 'null')
+        watermark = self.state.get('watermark')
+        if watermark:
+            query = query.gte('updated_at', _iso(_parse(watermark) - timedelta(seconds=self.overlap_s)))
+        rows = query.order('updated_at').order('id').limit(self.batch_size).execute().data or []
+        newest = max((r['updated_at'] for r in rows if r.get('updated_at')), default=None)
+        return self._claim(rows), newest
+
+    def claim_abandoned(self) -> list:
+        """Take over claims older than the lease."""
+        stale_before = _iso(_now() - timedelta(seconds=self.lease_s))
+        rows = self._pending('id, report_attempts').lt('report_claimed_at', stale_before) \
+            .order('report_claimed_at').limit(self.batch_size).execute().data or []
+        return self._claim(rows, stale_before)
+
+    # ── Rendering ─────────────────────────────────────────────────────────────
+    def render(self, submissions: list) -> tuple:
+        """(sent ids, failed ids) after rendering one claimed batch and marking it sent."""
+        if self.stores is not None:
+            self.stores = self.stores.refresh()   # pick up a table rebuilt by an import
+        payloads = PayloadLoader(self.client, self.batch_size, self.stores).payloads(submissions)
+        requests = []
+        for payload in payloads:
+            request = {'data': payload, 'output': self.output.format(**payload), 'skip_if_unchanged': True}
+            if self.personal_note:
+                request['personal_note'] = self.personal_note
+            requests.append(request)
+        futures = [(p['submission_id'], self.pool.submit(_render_request, r)) for p, r in zip(payloads, requests)]
+        attempts = {s['id']: s.get('report_attempts') or 0 for s in submissions}
+
+        rendered, failed = [], []
+        for submission_id, future in futures:
+            try:
+                future.result()
+                rendered.append(submission_id)
+            except Exception as e:
+                # keep the claim: the submission is retried once the lease runs out,
+                # until it has used max_attempts
+                failed.append(submission_id)
+                self.client.table('job_submissions').update({'report_error': str(e)[:1000]}) \
+                    .eq('id', submission_id).eq('report_claimed_by', self.token).execute()
+                if attempts.get(submission_id, 0) >= self.max_attempts:
+                    print(f"  Warning: report for submission {submission_id} failed {self.max_attempts} times, "
+                          f"giving up (reset report_attempts to retry): {e}", file=sys.stderr)
+                else:
+                    print(f"  Warning: report for submission {submission_id} failed: {e}", file=sys.stderr)
+        if not rendered:
+            return [], failed
+
+        sent = self.client.table('job_submissions').update({'report_sent_at': _iso(_now())}) \
+            .in_('id', rendered).eq('report_claimed_by', self.token).is_('report_sent_at', 'null').execute().data or []
+        sent_ids = {r['id'] for r in sent}
+        for submission_id in rendered:
+            if submission_id not in sent_ids:
+                print(f"  Warning: claim on submission {submission_id} was taken over; "
+                      f"its report was rendered again", file=sys.stderr)
+        return [i for i in rendered if i in sent_ids], failed
+
+    def poll(self) -> dict:
+        """One pass: abandoned claims first, then every new approval, a batch at a time."""
+        stats = {'claimed': 0, 'sent': 0, 'failed': 0}
+        claimed, newest = self.claim_abandoned(), None
+        while True:
+            if claimed:
+                sent, failed = self.render(claimed)
+                stats['claimed'] += len(claimed)
+                stats['sent']    += len(sent)
+                stats['failed']  += len(failed)
+            if newest:
+                self.state['watermark'] = max(self.state.get('watermark') or '', newest)
+            claimed, newest = self.claim_new()
+            if not claimed and not newest:
+                break
+        self.state['reports'] = self.state.get('reports', 0) + stats['sent']
+        self.state['failed']  = self.state.get('failed', 0) + stats['failed']
+        save_state(self.state_path, self.state)
+        return stats
+
+    def run(self, interval: float = 5.0, once: bool = False):
+        """Poll every interval seconds (straight away again after a busy pass) until interrupted."""
+        while True:
+            started = time.perf_counter()
+            stats = self.poll()
+            if stats['claimed']:
+                print(f"✅ {stats['sent']} reports sent, {stats['failed']} failed "
+                      f"in {time.perf_counter() - started:.1f}s (watermark {self.state.get('watermark')})")
+            if once:
+                return stats
+            if not stats['claimed']:
+                time.sleep(interval)
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render and mark sent the reports of newly approved submissions.')
+    parser.add_argument('--output', default=OUTPUT, help='path or storage:// template; {report_id} and {submission_id} are filled in')
+    parser.add_argument('--state', default=STATE_FILE, help='watermark file')
+    parser.add_argument('--since', default=None, help='start here instead of at the watermark')
+    parser.add_argument('--interval', type=float, default=5.0, help='seconds between polls when idle')
+    parser.add_argument('--once', action='store_true', help='one pass, then exit')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=None, help='render processes (default: CPU count)')
+    parser.add_argument('--lease', type=int, default=LEASE_S, help='seconds before an unfinished claim is taken over')
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help='claims per submission before giving up on it')
+    parser.add_argument('--note', default=None, help='personal note for every report')
+    parser.add_argument('--store-table', default=None, help='read stores from this store_table.py file')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'stores'))
+    from store_loader import supabase_from_env
+    stores = None
+    if args.store_table:
+        from store_table import StoreTable
+        stores = StoreTable.open(args.store_table)
+
+    state = load_state(args.state)
+    if args.since:
+        state['watermark'] = args.since
+    print(f"📥 Polling approvals from {state.get('watermark') or 'the beginning'} as {args.output}...")
+    with ReportPoller(supabase_from_env(), args.output, state, args.state, args.batch_size,
+                      args.workers, args.lease, personal_note=args.note, stores=stores,
+                      max_attempts=args.max_attempts) as poller:
+        try:
+            poller.run(args.interval, args.once)
+        except KeyboardInterrupt:
+            pass
+    print(f"💾 Watermark {state.get('watermark')} saved to: {args.state}")
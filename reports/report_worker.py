@@ -0,0 +1,385 @@
+"""
+ShelfAssured Report Worker
+Resident worker that renders queued report requests with warm state, so a
+report costs its render time instead of interpreter start-up plus the
+reportlab/requests imports and style setup.
+
+The queue is a spool directory:
+
+    <queue>/incoming/     requests waiting to be rendered (*.json)
+    <queue>/processing/   claimed by a worker (atomic rename)
+    <queue>/done/         finished, with the result appended
+    <queue>/failed/       failed, with the error appended
+
+Each request file is {"data": {...}, "personal_note": "...", "output": "..."}
+where output is a path or storage://bucket/path.pdf; optional keys
+"generated_at" (ISO timestamp) and "skip_if_unchanged" are passed through
+to generate_report (for storage outputs the manifest is a second object
+next to the PDF). With "precheck_photos" the report's photos are scored
+first (photos/photo_quality.py) and the scores are added to the result as
+photo_quality; poor photos are warned about but still rendered. Several
+worker processes may share one queue directory; the rename makes claims
+exclusive. A request file that is not a JSON object is moved to failed/ as
+it is claimed; if a render process dies, the requests in flight on its
+pool are failed and a new pool is started.
+
+Usage:
+    python3 report_worker.py QUEUE_DIR [--workers N] [--port 8090] [--drain]
+    python3 report_worker.py QUEUE_DIR --enqueue '<json_data>' output.pdf [personal_note]
+
+With --port the worker also serves:
+    GET  /metrics    queue depth, in-flight count and latency percentiles (JSON)
+    POST /reports    enqueue a request; 503 once the queue is over --max-queue
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'photos'))
+
+
+class DirectoryQueue:
+    """File-per-request queue; names sort by enqueue time."""
+
+    def __init__(self, root: str):
+        self.root = root
+        for sub in ('incoming', 'processing', 'done', 'failed'):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    def _path(self, state, request_id):
+        return os.path.join(self.root, state, f'{request_id}.json')
+
+    def put(self, request: dict) -> str:
+        request_id = f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}'
+        tmp = self._path('incoming', request_id) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(request, f)
+        os.replace(tmp, self._path('incoming', request_id))
+        return request_id
+
+    def depth(self) -> int:
+        return sum(1 for n in os.listdir(os.path.join(self.root, 'incoming')) if n.endswith('.json'))
+
+    def claim(self, limit: int) -> list:
+        """
+        Move up to limit requests to processing/ and return [(id, request, enqueued_at)].
+        A request file that is not a JSON object goes straight on to failed/.
+        """
+        claimed = []
+        if limit <= 0:
+            return claimed
+        names = sorted(n for n in os.listdir(os.path.join(self.root, 'incoming')) if n.endswith('.json'))
+        for name in names:
+            request_id = name[:-len('.json')]
+            try:
+                os.rename(self._path('incoming', request_id), self._path('processing', request_id))
+            except FileNotFoundError:
+                continue  # another worker got it first
+            try:
+                with open(self._path('processing', request_id)) as f:
+                    request = json.load(f)
+                if not isinstance(request, dict):
+                    raise ValueError('request is not a JSON object')
+            except ValueError as e:
+                print(f"  Warning: report {request_id} is not a valid request: {e}", file=sys.stderr)
+                self.fail(request_id, f'invalid request: {e}')
+                continue
+            enqueued_at = int(request_id.split('-')[0]) / 1e9
+            claimed.append((request_id, request, enqueued_at))
+            if len(claimed) >= limit:
+                break
+        return claimed
+
+    def _finish(self, state, request_id, extra):
+        src = self._path('processing', request_id)
+        with open(src) as f:
+            raw = f.read()
+        try:
+            request = json.loads(raw)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):
+            request = {'raw': raw}   # keep what was sent next to the error
+        request.update(extra)
+        with open(self._path(state, request_id), 'w') as f:
+            json.dump(request, f)
+        os.remove(src)
+
+    def complete(self, request_id, result: dict):
+        self._finish('done', request_id, {'result': result})
+
+    def fail(self, request_id, error: str):
+        self._finish('failed', request_id, {'error': error})
+
+    def recover(self) -> int:
+        """Return requests stranded in processing/ (after a crash) to incoming/."""
+        names = [n for n in os.listdir(os.path.join(self.root, 'processing')) if n.endswith('.json')]
+        for name in names:
+            os.rename(os.path.join(self.root, 'processing', name), os.path.join(self.root, 'incoming', name))
+        return len(names)
+
+
+class WorkerMetrics:
+    """Thread-safe counters plus a rolling window of latencies."""
+
+    def __init__(self, window: int = 1000):
+        self.lock      = threading.Lock()
+        self.render    = deque(maxlen=window)
+        self.total     = deque(maxlen=window)
+        self.completed = 0
+        self.failed    = 0
+        self.in_flight = 0
+        self.started   = time.time()
+
+    def record(self, render_s: float, total_s: float, ok: bool):
+        with self.lock:
+            self.render.append(render_s)
+            self.total.append(total_s)
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self, queue_depth: int) -> dict:
+        with self.lock:
+            render, total = sorted(self.render), sorted(self.total)
+            uptime = time.time() - self.started
+            return {
+                'queue_depth':     queue_depth,
+                'in_flight':       self.in_flight,
+                'completed':       self.completed,
+                'failed':          self.failed,
+                'uptime_s':        round(uptime, 1),
+                'reports_per_s':   round(self.completed / uptime, 3) if uptime else 0.0,
+                'render_p50_ms':   _percentile_ms(render, 50),
+                'render_p99_ms':   _percentile_ms(render, 99),
+                'end_to_end_p50_ms': _percentile_ms(total, 50),
+                'end_to_end_p99_ms': _percentile_ms(total, 99),
+            }
+
+
+def _percentile_ms(sorted_values, pct):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[idx] * 1000, 1)
+
+
+# ── Worker-process state ──────────────────────────────────────────────────────
+# Built once per pool process by _warm_up and reused for every report.
+_warm = {}
+
+
+def _warm_up():
+    import requests
+    from generate_report import make_styles
+    _warm['styles']  = make_styles()
+    _warm['session'] = requests.Session()
+
+
+def _render_request(request: dict) -> dict:
+    from datetime import datetime
+    from generate_report import generate_report, render_report
+    started = time.perf_counter()
+    data, note, output = request['data'], request.get('personal_note'), request['output']
+    kwargs = {'styles': _warm.get('styles'), 'session': _warm.get('session')}
+    quality = None
+    if request.get('precheck_photos'):
+        from photo_quality import precheck_report
+        quality = precheck_report(data, _warm.get('session'))
+        poor = [f"{p['type']}: {p['label']}" for p in quality if p['label'] != 'good']
+        if poor:
+            print(f"  Warning: {data.get('report_id') or output} has poor photos ({', '.join(poor)})", file=sys.stderr)
+    if request.get('generated_at'):
+        kwargs['generated_at'] = datetime.fromisoformat(request['generated_at'].replace('Z', '+00:00'))
+    if output.startswith('storage://'):
+        from report_manifest import check_stored_report, write_stored_manifest
+        from storage import StorageClient
+        if 'storage' not in _warm:
+            _warm['storage'] = StorageClient.from_env()
+        storage = _warm['storage']
+        bucket, _, object_path = output[len('storage://'):].partition('/')
+        input_hash = None
+        if request.get('skip_if_unchanged'):
+            input_hash, current = check_stored_report(data, note, storage, bucket, object_path, kwargs['session'])
+            if current:
+                print(f"Report unchanged, skipped: {output}")
+                return {'output': storage.object_url(bucket, object_path), 'bytes': 0, 'skipped': True,
+                        'render_s': time.perf_counter() - started}
+        pdf = render_report(data, note, **kwargs)
+        location = storage.upload(bucket, object_path, pdf)
+        if input_hash:
+            write_stored_manifest(storage, bucket, object_path, input_hash, pdf,
+                                  kwargs.get('generated_at') or datetime.now())
+        size = len(pdf)
+    else:
+        generate_report(data, output, note, skip_if_unchanged=bool(request.get('skip_if_unchanged')), **kwargs)
+        location, size = output, os.path.getsize(output)
+    result = {'output': location, 'bytes': size, 'render_s': time.perf_counter() - started}
+    if quality is not None:
+        result['photo_quality'] = quality
+    return result
+
+
+class ReportWorker:
+    """
+    Pulls requests from a DirectoryQueue and renders them on a warm process pool.
+
+    At most max_in_flight requests are claimed at once; the rest stay in
+    incoming/, where other workers can pick them up and where producers can
+    see the backlog (the HTTP endpoint refuses new work above max_queue).
+    """
+
+    def __init__(self, queue: DirectoryQueue, workers: int = None, max_in_flight: int = None,
+                 max_queue: int = 10000, poll_interval: float = 0.25):
+        self.queue         = queue
+        self.workers       = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.max_queue     = max_queue
+        self.poll_interval = poll_interval
+        self.metrics       = WorkerMetrics()
+        self.stop_event    = threading.Event()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+
+    def _collect(self, fut, request_id, enqueued_at) -> bool:
+        """Move one finished request to done/ or failed/; True if its process pool is broken."""
+        try:
+            result = fut.result()
+            self.queue.complete(request_id, result)
+            self.metrics.record(result['render_s'], time.time() - enqueued_at, ok=True)
+            return False
+        except Exception as e:
+            print(f"  Warning: report {request_id} failed: {e}", file=sys.stderr)
+            self.queue.fail(request_id, str(e) or type(e).__name__)
+            self.metrics.record(0.0, time.time() - enqueued_at, ok=False)
+            return isinstance(e, BrokenProcessPool)
+
+    def run(self, drain: bool = False):
+        """
+        Process requests until stop() is called, or until the queue is empty if drain.
+        If a render process dies, the requests it took down are failed and the pool is rebuilt.
+        """
+        pending = {}
+        pool = self._pool()
+        try:
+            while not self.stop_event.is_set():
+                for request_id, request, enqueued_at in self.queue.claim(self.max_in_flight - len(pending)):
+                    pending[pool.submit(_render_request, request)] = (request_id, enqueued_at)
+                self.metrics.in_flight = len(pending)
+
+                if not pending:
+                    if drain and self.queue.depth() == 0:
+                        break
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+
+                done, _ = wait(pending, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                broken = False
+                for fut in done:
+                    broken |= self._collect(fut, *pending.pop(fut))
+                if broken:
+                    # the rest of the dead pool's requests fail with it; none are left running
+                    print("  Warning: a render process died; starting a new pool", file=sys.stderr)
+                    for fut in wait(pending).done:
+                        self._collect(fut, *pending.pop(fut))
+                    pool.shutdown(wait=False)
+                    pool = self._pool()
+                self.metrics.in_flight = len(pending)
+        finally:
+            pool.shutdown()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def serve_http(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """Start the metrics/enqueue endpoint on a background thread."""
+        worker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/metrics':
+                    self._reply(200, worker.metrics.snapshot(worker.queue.depth()))
+                else:
+                    self._reply(404, {'error': 'not found'})
+
+            def do_POST(self):
+                if self.path.rstrip('/') != '/reports':
+                    self._reply(404, {'error': 'not found'})
+                    return
+                if worker.queue.depth() >= worker.max_queue:
+                    self._reply(503, {'error': 'queue full', 'queue_depth': worker.queue.depth()})
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+                except ValueError as e:
+                    self._reply(400, {'error': f'invalid JSON: {e}'})
+                    return
+                if not isinstance(request, dict) or 'data' not in request or 'output' not in request:
+                    self._reply(400, {'error': 'data and output are required'})
+                    return
+                self._reply(202, {'id': worker.queue.put(request)})
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render queued ShelfAssured reports.')
+    parser.add_argument('queue_dir')
+    parser.add_argument('--workers', type=int, default=None, help='render processes (default: CPU count)')
+    parser.add_argument('--max-in-flight', type=int, default=None, help='claimed requests at once (default: 2x workers)')
+    parser.add_argument('--max-queue', type=int, default=10000, help='refuse HTTP enqueues above this depth')
+    parser.add_argument('--port', type=int, default=None, help='serve /metrics and /reports on this port')
+    parser.add_argument('--drain', action='store_true', help='exit once the queue is empty')
+    parser.add_argument('--recover', action='store_true', help='requeue requests left in processing/ by a crash')
+    parser.add_argument('--enqueue', nargs='+', metavar=('JSON', 'OUTPUT'),
+                        help="enqueue '<json_data>' output.pdf [personal_note] and exit")
+    args = parser.parse_args()
+
+    queue = DirectoryQueue(args.queue_dir)
+    if args.enqueue:
+        if len(args.enqueue) < 2:
+            parser.error('--enqueue needs <json_data> and output')
+        req = {'data': json.loads(args.enqueue[0]), 'output': args.enqueue[1]}
+        if len(args.enqueue) > 2:
+            req['personal_note'] = args.enqueue[2]
+        print(f"Enqueued: {queue.put(req)}")
+        sys.exit(0)
+
+    if args.recover:
+        print(f"Requeued {queue.recover()} stranded requests")
+
+    worker = ReportWorker(queue, args.workers, args.max_in_flight, args.max_queue)
+    if args.port:
+        worker.serve_http(args.port)
+        print(f"Metrics on http://127.0.0.1:{args.port}/metrics")
+    print(f"Report worker: {worker.workers} processes, queue {args.queue_dir}")
+    try:
+        worker.run(drain=args.drain)
+    except KeyboardInterrupt:
+        worker.stop()
+    print(json.dumps(worker.metrics.snapshot(queue.depth()), indent=2))
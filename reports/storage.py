@@ -0,0 +1,117 @@
+"""
+ShelfAssured Storage Client
+Thin wrapper over the Supabase Storage REST API used by the report tools.
+
+Uploads stream their body (bytes, a file-like object or an iterable of
+chunks) straight onto the socket, so a report rendered in memory never has
+to be written to local disk first.
+
+Point SUPABASE_URL at local_storage.py to exercise everything without a
+real project:
+
+    python3 local_storage.py 54321 &
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_SERVICE_ROLE_KEY=dev \\
+        python3 generate_report.py '<json>' storage://reports/RPT-001.pdf
+"""
+
+import io
+import os
+from urllib.parse import quote
+
+import requests
+
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_chunks(stream, chunk_size=CHUNK_SIZE):
+    """Yield successive chunks from a readable binary stream."""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class StorageClient:
+    """Minimal Supabase Storage client: upload, download, stream and list objects."""
+
+    def __init__(self, base_url: str, api_key: str, session: requests.Session = None, timeout: int = 60):
+        self.base_url = base_url.rstrip('/')
+        self.api_key  = api_key
+        self.timeout  = timeout
+        self.session  = session or requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'apikey':        api_key,
+        })
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Build a client from SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY (or SUPABASE_ANON_KEY)."""
+        url = os.getenv('SUPABASE_URL')
+        key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
+        if not url or not key:
+            raise RuntimeError('SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY (or SUPABASE_ANON_KEY) must be set')
+        return cls(url, key, **kwargs)
+
+    def object_url(self, bucket: str, path: str) -> str:
+        return f"{self.base_url}/storage/v1/object/{bucket}/{quote(path.lstrip('/'))}"
+
+    def public_url(self, bucket: str, path: str) -> str:
+        return f"{self.base_url}/storage/v1/object/public/{bucket}/{quote(path.lstrip('/'))}"
+
+    def upload(self, bucket: str, path: str, body, content_type: str = 'application/pdf', upsert: bool = True) -> str:
+        """
+        Stream body to bucket/path and return the object URL.
+
+        body may be bytes, a readable binary stream or an iterable of byte
+        chunks. Bytes and seekable streams are sent with a Content-Length;
+        anything else goes out with chunked transfer encoding.
+        """
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            body = io.BytesIO(body)
+        elif hasattr(body, 'read') and not _is_sized(body):
+            body = iter_chunks(body)
+
+        resp = self.session.post(
+            self.object_url(bucket, path),
+            data=body,
+            headers={
+                'Content-Type': content_type,
+                'x-upsert':     'true' if upsert else 'false',
+            },
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        return self.object_url(bucket, path)
+
+    def download(self, bucket: str, path: str) -> bytes:
+        """Fetch a whole object into memory."""
+        resp = self.session.get(self.object_url(bucket, path), timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.content
+
+    def open(self, bucket: str, path: str) -> requests.Response:
+        """Open an object for streaming; iterate resp.iter_content() and close it when done."""
+        resp = self.session.get(self.object_url(bucket, path), stream=True, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp
+
+    def list(self, bucket: str, prefix: str = '', limit: int = 1000, offset: int = 0) -> list:
+        """List objects under prefix (one page; call again with a larger offset for more)."""
+        resp = self.session.post(
+            f"{self.base_url}/storage/v1/object/list/{bucket}",
+            json={'prefix': prefix, 'limit': limit, 'offset': offset,
+                  'sortBy': {'column': 'name', 'order': 'asc'}},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+
+def _is_sized(stream) -> bool:
+    """True if a stream can report its length up front (so requests can set Content-Length)."""
+    try:
+        return stream.seekable()
+    except (AttributeError, ValueError):
+        return False
@@ -1,6 +1,12 @@
-"""Test the PDF report generator with sample data."""
+"""Test the PDF report generator with sample data.
+
+Writes sample_report.pdf next to this script. For timings with real photo
+sizes, use bench_reports.py instead.
+"""
+import os
 import sys
-sys.path.insert(0, '/home/ubuntu/shelfassured-demo/reports')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
 from generate_report import generate_report
 
 sample_data = {
@@ -31,6 +37,6 @@ personal_note = (
     "Great shelf presence this week! Reach out if you have any questions about this report."
 )
 
-output = '/home/ubuntu/shelfassured-demo/reports/sample_report.pdf'
+output = os.path.join(HERE, 'sample_report.pdf')
 generate_report(sample_data, output, personal_note)
 print(f"Test complete. Output: {output}")
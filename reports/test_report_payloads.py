@@ -0,0 +1,70 @@
+"""Batched joins of report_payloads.py, against LocalTables."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from local_tables import LocalTables
+from report_payloads import _select_in, build_payload, iter_report_payloads
+
+
+def _tables():
+    subs = [{'id': f'sub-{i:04d}-aaaa', 'job_id': f'j{i % 2}', 'store_id': 's1', 'sku_id': 'k1',
+             'contractor_id': 'u1', 'data': {'price_found': '5.99', 'notes': 'Faced'},
+             'files': [{'url': f'https://x/{i}.jpg', 'type': 'product_closeup'}], 'review_outcome': 'approved',
+             'created_at': '2026-03-06T14:32:00Z', 'updated_at': '2026-03-09T08:00:00Z'}
+            for i in range(4)]
+    subs[3].update(store_id=None, sku_id=None)   # falls back to the job's first job_store_skus row
+    return LocalTables({
+        'job_submissions': subs,
+        'jobs':   [{'id': 'j0', 'title': 'Audit A', 'brand_id': 'b1'},
+                   {'id': 'j1', 'title': 'Audit B', 'brand_id': 'b1'}],
+        'brands': [{'id': 'b1', 'name': "DJ's Boudain"}],
+        'job_store_skus': [
+            {'id': 'x2', 'job_id': 'j1', 'store_id': 's3', 'sku_id': 'k3', 'created_at': '2026-03-02'},
+            {'id': 'x1', 'job_id': 'j1', 'store_id': 's2', 'sku_id': 'k2', 'created_at': '2026-03-01'},
+        ],
+        'stores': [{'id': 's1', 'STORE': 'Kroger Pearland', 'banner': 'Kroger', 'address': '2350 Smith Ranch Rd',
+                    'city': 'Pearland', 'state': 'TX', 'zip_code': '77584'},
+                   {'id': 's2', 'name': 'H-E-B Lamar', 'store_chain': 'H-E-B', 'city': 'Austin', 'state': 'TX'}],
+        'skus':   [{'id': 'k1', 'name': 'Original Boudain', 'upc': '736526115552'},
+                   {'id': 'k2', 'name': 'Hot Boudain', 'upc': '736526115569'}],
+        'users':  [{'id': 'u1', 'full_name': 'Courtney Henderson'}],
+    })
+
+
+def test_payloads_join_every_table_in_one_query_each():
+    db = _tables()
+    ids = [r['id'] for r in db.tables['job_submissions']]
+    payloads = list(iter_report_payloads(db, submission_ids=ids[::-1]))
+    assert db.queries == 7   # job_submissions, jobs, brands, job_store_skus, stores, skus, users
+    assert [p['submission_id'] for p in payloads] == ids[::-1]
+
+    fallback, direct = payloads[0], payloads[1]
+    assert (fallback['store_name'], fallback['store_banner'], fallback['sku_name']) == \
+        ('H-E-B Lamar', 'H-E-B', 'Hot Boudain')
+    assert direct['store_address'] == '2350 Smith Ranch Rd, Pearland, TX 77584'
+    assert (direct['job_title'], direct['brand_name'], direct['shelfer_first_name']) == \
+        ('Audit A', "DJ's Boudain", 'Courtney')
+    assert (direct['price_found'], direct['shelfer_notes']) == ('5.99', 'Faced')
+    assert direct['photos'] == [{'url': 'https://x/2.jpg', 'type': 'product_closeup'}]
+
+
+def test_shared_rows_are_not_fetched_again():
+    db = _tables()
+    ids = [r['id'] for r in db.tables['job_submissions']]
+    list(iter_report_payloads(db, submission_ids=ids, batch_size=2))
+    assert db.queries == 6 + 4   # the second chunk reads submissions, job_store_skus and only the new store and sku
+
+
+def test_report_id_and_date_come_from_created_at():
+    submission = _tables().tables['job_submissions'][0]
+    payload = build_payload(submission)
+    assert payload['report_id'] == 'RPT-20260306-SUB-0000'
+    assert payload['submitted_at'] == '2026-03-06T14:32:00Z'
+    assert build_payload(dict(submission, updated_at='2026-04-01T00:00:00Z'))['report_id'] == payload['report_id']
+
+
+def test_select_in_pages_past_the_row_cap():
+    db = LocalTables({'job_store_skus': [{'id': f'x{i:05d}', 'job_id': 'j1'} for i in range(2500)]})
+    rows = _select_in(db, 'job_store_skus', 'id, job_id', 'job_id', ['j1'], order=('id',))
+    assert [r['id'] for r in rows] == [f'x{i:05d}' for i in range(2500)]
@@ -0,0 +1,82 @@
+"""Claims and the exactly-once path of report_poller.py, against LocalTables."""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from local_tables import LocalTables
+from report_poller import ReportPoller
+
+
+def _tables(approved=6, rejected=2):
+    now = datetime.now(timezone.utc)
+    subs = [{'id': f'sub-{i:04d}-aaaa', 'job_id': 'j1', 'store_id': 's1', 'sku_id': 'k1', 'contractor_id': 'u1',
+             'data': {'price': '3.99', 'stock_level': 'In Stock'}, 'files': [],
+             'review_outcome': 'approved' if i < approved else 'rejected',
+             'report_sent_at': None, 'report_claimed_by': None, 'report_claimed_at': None, 'report_attempts': 0,
+             'created_at': (now - timedelta(hours=2)).isoformat(),
+             'updated_at': (now - timedelta(minutes=60 - i)).isoformat()}
+            for i in range(approved + rejected)]
+    return LocalTables({
+        'job_submissions': subs,
+        'jobs':   [{'id': 'j1', 'title': 'Shelf Audit', 'brand_id': 'b1'}],
+        'brands': [{'id': 'b1', 'name': 'Bench Brand'}],
+        'stores': [{'id': 's1', 'STORE': 'H-E-B – Austin – TX – Lamar', 'city': 'Austin', 'state': 'TX'}],
+        'skus':   [{'id': 'k1', 'name': 'Original Boudain', 'upc': '736526115552'}],
+        'users':  [{'id': 'u1', 'full_name': 'Ann Lee'}],
+    })
+
+
+def _rows(db):
+    return {r['id']: r for r in db.tables['job_submissions']}
+
+
+def test_claim_new_takes_each_approval_once():
+    db = _tables()
+    first, second = ReportPoller(db, state={}), ReportPoller(db, state={})
+    claimed, newest = first.claim_new()
+    assert len(claimed) == 6 and newest
+    assert second.claim_new()[0] == []
+    for r in _rows(db).values():
+        if r['review_outcome'] == 'approved':
+            assert (r['report_claimed_by'], r['report_attempts']) == (first.token, 1)
+        else:
+            assert r['report_claimed_by'] is None
+
+
+def test_claim_skips_rows_claimed_since_they_were_read():
+    db = _tables()
+    first, second = ReportPoller(db, state={}), ReportPoller(db, state={})
+    rows = first._pending('id, report_attempts').execute().data
+    second.claim_new()
+    assert first._claim(rows) == []
+    assert {r['report_attempts'] for r in _rows(db).values() if r['report_claimed_by']} == {1}
+
+
+def test_abandoned_claims_are_taken_over_until_max_attempts():
+    db = _tables(approved=2, rejected=0)
+    old = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    rows = db.tables['job_submissions']
+    rows[0].update(report_claimed_by='dead:1:x', report_claimed_at=old, report_attempts=1)
+    rows[1].update(report_claimed_by='dead:1:x', report_claimed_at=old, report_attempts=5)
+    poller = ReportPoller(db, state={}, max_attempts=5)
+    assert [r['id'] for r in poller.claim_abandoned()] == [rows[0]['id']]
+    assert (rows[0]['report_claimed_by'], rows[0]['report_attempts']) == (poller.token, 2)
+    assert rows[1]['report_claimed_by'] == 'dead:1:x'
+
+
+def test_poll_sends_each_report_once(tmp_path):
+    db = _tables()
+    output = str(tmp_path / '{report_id}.pdf')
+    states = tmp_path / 'state'
+    states.mkdir()
+    totals = []
+    for n in range(2):
+        with ReportPoller(db, output, state_path=str(states / f'{n}.json'), batch_size=4, workers=1) as poller:
+            totals.append(poller.poll())
+    assert totals[0] == {'claimed': 6, 'sent': 6, 'failed': 0}
+    assert totals[1] == {'claimed': 0, 'sent': 0, 'failed': 0}
+    rows = _rows(db).values()
+    assert all(r['report_sent_at'] for r in rows if r['review_outcome'] == 'approved')
+    assert not any(r['report_sent_at'] for r in rows if r['review_outcome'] != 'approved')
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.pdf')]) == 6
@@ -0,0 +1,46 @@
+"""In-memory rendering and streamed uploads (generate_report.render_report, storage.py), against LocalStorage."""
+import io
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from generate_report import render_report
+from local_storage import serve_local_storage
+from storage import StorageClient
+
+DATA = {'job_title': 'Kroger Pearland Shelf Audit', 'brand_name': "DJ's Boudain", 'store_name': 'Kroger Pearland',
+        'sku_name': 'Original Boudain', 'submitted_at': '2026-03-06T14:32:00Z', 'photos': [],
+        'stock_level': 'In Stock', 'report_id': 'RPT-20260306-TEST'}
+
+
+class _Unsized(io.RawIOBase):
+    """A pipe-like stream: readable, not seekable, so uploads go out chunked."""
+
+    def __init__(self, data):
+        self.inner = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        chunk = self.inner.read(len(buf))
+        buf[:len(chunk)] = chunk
+        return len(chunk)
+
+
+def test_render_report_is_stable_with_generated_at():
+    at = datetime(2026, 3, 6, 15, 0, tzinfo=timezone.utc)
+    pdf = render_report(DATA, generated_at=at)
+    assert pdf.startswith(b'%PDF') and render_report(DATA, generated_at=at) == pdf
+
+
+def test_upload_bytes_and_streams_round_trip():
+    pdf = render_report(DATA)
+    with serve_local_storage() as (base_url, server):
+        client = StorageClient(base_url, 'dev')
+        client.upload('reports', 'a.pdf', pdf)
+        client.upload('reports', 'b.pdf', io.BytesIO(pdf))
+        client.upload('reports', 'c.pdf', _Unsized(pdf))
+        assert [client.download('reports', name) for name in ('a.pdf', 'b.pdf', 'c.pdf')] == [pdf] * 3
+        assert [o['name'] for o in client.list('reports')] == ['a.pdf', 'b.pdf', 'c.pdf']
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+ShelfAssured Command Line
+One entry point for the store import and report tools that starts fast.
+
+    plan     match the store sheet against the stores table and save the dry-run summary
+    apply    plan, then write the changes (asks first unless --yes)
+    report   render a report from JSON, or every payload in a JSON-lines file
+    bench    time each short invocation and check what it imports
+
+Nothing heavy is imported until the chosen code path needs it: pandas,
+supabase and the .env file wait for plan/apply, and reportlab and requests
+wait until a report really has to be rendered. With --skip-if-unchanged,
+a report whose manifest is current is skipped without loading the renderer
+(reports/report_manifest.py).
+
+bench runs each short invocation in fresh interpreters and fails (exit 1)
+when one takes more than --budget-ms over a bare interpreter start, or when
+one imports any of HEAVY_MODULES.
+
+Usage:
+    python3 shelfassured.py plan [--workers 16] [--geocoder none] [--excel sheet.xlsx]
+    python3 shelfassured.py apply [--yes] [--search-index site/store-index]
+    python3 shelfassured.py report '<json_data>' output.pdf [--note TEXT] [--generated-at ISO] [--skip-if-unchanged]
+    python3 shelfassured.py report payloads.jsonl 'reports/{report_id}.pdf' [--skip-if-unchanged]
+    python3 shelfassured.py bench [--budget-ms 50] [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+HERE          = os.path.dirname(os.path.abspath(__file__))
+IMPORTER      = os.path.join(HERE, 'store-reconciliation-import.py')
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'supabase', 'dotenv', 'reportlab', 'requests', 'PIL')
+BUDGET_MS     = 50
+
+
+def _importer():
+    """store-reconciliation-import.py as a module (its file name is not importable)."""
+    name = 'store_reconciliation_import'
+    if name not in sys.modules:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(name, IMPORTER)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module   # before exec: @dataclass looks its module up by name
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+# ── plan / apply ──────────────────────────────────────────────────────────────
+def cmd_plan(args):
+    _importer().plan(args)
+
+
+def cmd_apply(args):
+    importer = _importer()
+    importer.apply(*importer.plan(args), args, assume_yes=args.yes)
+
+
+# ── report ────────────────────────────────────────────────────────────────────
+def _payloads(source: str) -> list:
+    if os.path.isfile(source):
+        with open(source) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    return [json.loads(source)]
+
+
+def cmd_report(args):
+    sys.path.insert(0, os.path.join(HERE, 'reports'))
+    from report_manifest import check_report
+
+    payloads = _payloads(args.source)
+    kwargs, renderer = {}, {}
+    if args.generated_at:
+        from datetime import datetime
+        kwargs['generated_at'] = datetime.fromisoformat(args.generated_at.replace('Z', '+00:00'))
+
+    def render():
+        if not renderer:
+            import requests
+            from generate_report import generate_report, make_styles, render_report
+            renderer.update(generate=generate_report, render=render_report,
+                            styles=make_styles(), session=requests.Session())
+        return renderer
+
+    for data in payloads:
+        output = args.output.format(**data) if len(payloads) > 1 else args.output
+        if args.skip_if_unchanged and output != '-' and not output.startswith('storage://'):
+            if check_report(data, args.note, output, renderer.get('session'))[1]:
+                print(f"Report unchanged, skipped: {output}")
+                continue
+        r = render()
+        opts = dict(kwargs, styles=r['styles'], session=r['session'])
+        if output == '-':
+            r['generate'](data, sys.stdout.buffer, args.note, **opts)
+        elif output.startswith('storage://'):
+            from storage import StorageClient
+            bucket, _, object_path = output[len('storage://'):].partition('/')
+            url = StorageClient.from_env().upload(bucket, object_path, r['render'](data, args.note, **opts))
+            print(f"Report uploaded: {url}")
+        else:
+            r['generate'](data, output, args.note, skip_if_unchanged=args.skip_if_unchanged, **opts)
+
+
+# ── bench ─────────────────────────────────────────────────────────────────────
+BENCH_REPORT = {
+    'job_title': 'Start-up Bench — Shelf Audit', 'brand_name': 'Bench Brand', 'store_banner': 'H-E-B',
+    'store_name': 'H-E-B – Austin – TX – Lamar', 'store_address': '1000 N Lamar Blvd, Austin, TX 78703',
+    'sku_name': 'Original Boudain', 'sku_upc': '736526115552', 'shelfer_first_name': 'Bench',
+    'submitted_at': '2026-03-06T14:32:00Z', 'photos': [], 'price_verified': True, 'price_found': '5.99',
+    'price_expected': '5.99', 'stock_level': 'In Stock', 'shelfer_notes': '', 'report_id': 'RPT-BENCH',
+}
+
+
+def _imported(argv: list) -> set:
+    """Top-level packages imported by one run of this CLI."""
+    import subprocess
+    proc = subprocess.run([sys.executable, '-X', 'importtime', __file__, *argv], capture_output=True, text=True)
+    names = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            names.add(line.rsplit('|', 1)[1].strip().split('.')[0])
+    return names
+
+
+def _median_ms(argv: list, runs: int) -> float:
+    import subprocess
+    import time
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - started) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+def cmd_bench(args):
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'bench.pdf')
+        cached = ['report', json.dumps(BENCH_REPORT), output, '--skip-if-unchanged']
+        cmd_report(build_parser(cached).parse_args(cached))   # render once so the timed runs hit the manifest
+        commands = [['--help'], ['plan', '--help'], ['apply', '--help'], ['report', '--help'], cached]
+
+        baseline = _median_ms([sys.executable, '-c', 'pass'], args.runs)
+        print(f"\n⏱️  Interpreter start: {baseline:.0f}ms (budget: +{args.budget_ms:.0f}ms per command)")
+        failed = False
+        for argv in commands:
+            elapsed = _median_ms([sys.executable, __file__, *argv], args.runs)
+            heavy = sorted(_imported(argv) & set(HEAVY_MODULES))
+            ok = elapsed - baseline <= args.budget_ms and not heavy
+            failed |= not ok
+            label = ' '.join(a if len(a) < 30 else a[:12] + '…' for a in argv)
+            print(f"{'✅' if ok else '❌'} {label:<48} {elapsed:6.0f}ms  (+{elapsed - baseline:.0f}ms)"
+                  + (f"  imports {', '.join(heavy)}" if heavy else ''))
+    sys.exit(1 if failed else 0)
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+def build_parser(argv: list = None) -> argparse.ArgumentParser:
+    """
+    The importer module (and its dataclasses) is only loaded when argv
+    selects plan or apply; other commands never see its options.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    command = next((a for a in argv if not a.startswith('-')), None)
+    parser = argparse.ArgumentParser(prog='shelfassured.py', description='ShelfAssured store import and report tools.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    plan = commands.add_parser('plan', help='match the store sheet and save the dry-run summary')
+    apply = commands.add_parser('apply', help='plan, then write the changes')
+    if command in ('plan', 'apply'):
+        for sub in (plan, apply):
+            _importer().add_arguments(sub)
+    apply.add_argument('--yes', action='store_true', help='do not ask before writing')
+    plan.set_defaults(func=cmd_plan)
+    apply.set_defaults(func=cmd_apply)
+
+    report = commands.add_parser('report', help='render reports to PDF')
+    report.add_argument('source', help="'<json_data>' or a JSON-lines file of payloads")
+    report.add_argument('output', help="path, '-' or storage://bucket/path.pdf; {report_id} etc. for JSON lines")
+    report.add_argument('--note', default=None, help='personal note')
+    report.add_argument('--generated-at', default=None, help='pin the "Generated" date and PDF timestamps')
+    report.add_argument('--skip-if-unchanged', action='store_true', help='skip reports whose manifest is current')
+    report.set_defaults(func=cmd_report)
+
+    bench = commands.add_parser('bench', help='check start-up time and imports of the short invocations')
+    bench.add_argument('--budget-ms', type=float, default=BUDGET_MS, help='allowed time over a bare interpreter start')
+    bench.add_argument('--runs', type=int, default=5, help='runs per command (median is reported)')
+    bench.set_defaults(func=cmd_bench)
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    args.func(args)
@@ -12,21 +12,57 @@ Rules:
 - Generate new STORE names: {Banner} – {City} – {State} – {Street Fragment}
 - Save Store # in store_number column
 - Set is_active = false for stores not in spreadsheet
-- Produce dry-run summary before executing
+- Produce dry-run summary before executing; every planned insert, update
+  (with old -> new values), deactivation and conflict is also streamed to
+  store-reconciliation-diff.csv/.jsonl (stores/store_diff.py)
+- Record per-banner, per-state matched/new/deactivated/conflicted counts for
+  every run in store-reconciliation-metrics.db, and refuse to apply when a
+  group drifted past the thresholds (stores/store_drift.py, --allow-drift)
+
+Usage:
+    python3 store-reconciliation-import.py [--workers 16] [--search-index site/store-index]
+                                           [--geocoder census|none] [--zip-centroids zips.csv]
+                                           [--excel sheet.xlsx] [--sheet TAB]
+                                           [--diff-csv PATH] [--diff-jsonl PATH]
+
+    python3 shelfassured.py plan [options]          dry-run summary only
+    python3 shelfassured.py apply [--yes] [options] plan, then write
+
+With --workers, the match keys (the per-row normalization, most of the
+matching time) are computed in worker processes over contiguous slices of
+the sheet (stores/store_matching.py); the parent dedupes the keys, a dict
+insert per row, and matches the groups against the existing-stores index
+in sheet order. Results, stats and the deactivation set are the same as
+the serial run.
+
+New stores, and matched stores that have no coordinates yet, are geocoded
+before they are written (stores/store_geocoder.py). Answers are cached in
+store-geocode-cache.jsonl, so a re-import only looks up addresses it has
+never seen. --zip-centroids geocodes offline to ZIP centroids instead of
+calling the Census geocoder; --geocoder none skips the stage.
+
+With --search-index, a successful import finishes by rebuilding the static
+store search index the store picker loads (stores/store_search_index.py).
 """
 
+import argparse
 import os
 import sys
 import re
-import pandas as pd
+import time
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from collections import defaultdict
-from supabase import create_client, Client
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stores'))
+import store_diff
+import store_drift
+import store_loader
+from store_diff import DiffWriter
+from store_drift import DriftMetrics
+from store_matching import group_keys, group_records, key_fields, match_keys, record_match_key
+
+# pandas, supabase, dotenv and the process pool are imported where they are
+# first needed, so --help and the shelfassured.py CLI start without them
 
 @dataclass
 class StoreRecord:
@@ -43,44 +79,27 @@ class StoreRecord:
     zip: str
     metro: str
     phone: str
+    sheet_row: Optional[int] = None   # row number in the sheet (header is row 1)
     
     def normalize_banner(self) -> str:
         """Normalize banner for matching (lowercase, trimmed)"""
-        return (self.banner or '').strip().lower()
+        return store_loader.normalize_banner(self.banner)
     
     def normalize_address(self) -> str:
         """Normalize address for matching"""
-        if not self.address:
-            return ''
-        # Remove extra whitespace, lowercase, remove punctuation
-        addr = re.sub(r'\s+', ' ', self.address.strip().lower())
-        # Remove common suffixes that vary (St, Street, Rd, Road, etc.)
-        addr = re.sub(r'\b(st|street|rd|road|ave|avenue|blvd|boulevard|dr|drive|ln|lane|ct|court|pl|place)\b', '', addr)
-        # Remove suite/unit numbers
-        addr = re.sub(r'\b(ste|suite|unit|#)\s*\d*\b', '', addr)
-        # Remove punctuation
-        addr = re.sub(r'[^\w\s]', '', addr)
-        return addr.strip()
+        return store_loader.normalize_address(self.address)
     
     def normalize_city(self) -> str:
         """Normalize city for matching"""
-        return (self.city or '').strip().lower()
+        return store_loader.normalize_city(self.city)
     
     def normalize_state(self) -> str:
         """Normalize state (uppercase, 2 chars)"""
-        state = (self.state or '').strip().upper()
-        # Extract first 2 characters if longer
-        return state[:2] if len(state) >= 2 else state
+        return store_loader.normalize_state(self.state)
     
     def extract_zip5(self) -> str:
         """Extract clean 5-digit ZIP code"""
-        if not self.zip:
-            return ''
-        # Extract first 5 digits
-        zip_match = re.search(r'\d{5}', str(self.zip))
-        if zip_match:
-            return zip_match.group(0).zfill(5)  # Zero pad if needed
-        return ''
+        return store_loader.extract_zip5(self.zip)
     
     def extract_street_fragment(self) -> str:
         """Extract street name fragment for display name"""
@@ -118,20 +137,38 @@ class MatchResult:
     existing_store: Optional[Dict]
     action: str  # 'match', 'new', 'duplicate'
     conflicts: List[str]
+    row: Optional[int] = None  # index in records of the row kept for this match key (see group_records)
 
 class StoreReconciliationImporter:
     """Handles store reconciliation import"""
     
     def __init__(self, supabase_url: str, supabase_key: str):
-        self.supabase: Client = create_client(supabase_url, supabase_key)
+        from supabase import create_client
+        self.supabase = create_client(supabase_url, supabase_key)
         self.existing_stores: Dict[str, Dict] = {}
+        self.rejection_report = 'store-reconciliation-rejections.csv'
+        self.store_table = None     # path for a stores/store_table.py file of the stores; rewritten after an import
+        self.diff_csv = 'store-reconciliation-diff.csv'      # every planned action; None to skip
+        self.diff_jsonl = 'store-reconciliation-diff.jsonl'
+        self.metrics_db = store_drift.METRICS_DB    # per-banner/state counts of every run; None to skip
+        self.drift_thresholds = dict(store_drift.THRESHOLDS)
+        self.drift = DriftMetrics()
+        self.drift_violations: List[str] = []
+        self.run_id = None
+        self.geocoder = None        # store_geocoder backend; None skips geocoding
+        self.geocode_cache = None
         self.matches: List[MatchResult] = []
+        self.rejected: List[Dict] = []      # sheet rows store_validation rejected (cleaned values)
+        self.held_active: Dict[str, int] = {}   # store id -> rejected sheet row that may be that store
         self.stats = {
             'total_excel_rows': 0,
             'new_stores': 0,
             'matched_stores': 0,
             'duplicates': 0,
             'stores_to_deactivate': 0,
+            'held_active': 0,
+            'rejected_rows': 0,
+            'rejections': {},
             'conflicts': []
         }
     
@@ -139,108 +176,62 @@ class StoreReconciliationImporter:
         """Load all existing stores from Supabase (no filters, no limits, paginated)"""
         print("📥 Loading existing stores from Supabase...")
         
-        all_stores = []
-        page_size = 1000
-        offset = 0
-        
         # Paginate through all stores
-        while True:
-            response = self.supabase.table('stores').select('*', count='exact').range(offset, offset + page_size - 1).execute()
-            
-            if response.data:
-                all_stores.extend(response.data)
-                print(f"   Loaded {len(all_stores)} stores so far...", end='\r')
-                
-                # Check if we got all records
-                if len(response.data) < page_size:
-                    break
-                
-                offset += page_size
-            else:
-                break
-        
-        print()  # New line after progress
+        all_stores = store_loader.load_stores(self.supabase, progress=True)
         
         if all_stores:
             for store in all_stores:
-                # Create match key from normalized fields
-                banner_norm = self._normalize_banner(store.get('banner') or store.get('STORE') or '')
-                address_norm = self._normalize_address(store.get('address') or '')
-                city_norm = self._normalize_city(store.get('city') or '')
-                state_norm = self._normalize_state(store.get('state') or '')
-                zip5 = self._extract_zip5(store.get('zip_code') or '')
-                
-                # Create composite key for matching
-                match_key = f"{banner_norm}|{address_norm}|{city_norm}|{state_norm}|{zip5}"
-                
-                self.existing_stores[match_key] = store
+                # Create composite key from normalized fields
+                self.existing_stores[store_loader.match_key(store)] = store
             
             print(f"✅ Loaded {len(all_stores)} total stores from database")
             print(f"✅ Indexed {len(self.existing_stores)} stores for matching")
+            self.save_store_table(all_stores)
         else:
             print("⚠️  No existing stores found")
     
+    def save_store_table(self, stores: List[Dict] = None):
+        """Write self.store_table (if set) from stores, or from the stores table as it is now"""
+        if not self.store_table:
+            return
+        from store_table import TABLE_COLUMNS, write_store_table
+        if stores is None:
+            print("📥 Reloading stores for the store table...")
+            stores = store_loader.load_stores(self.supabase, TABLE_COLUMNS, progress=True)
+        write_store_table(stores, self.store_table)
+        print(f"💾 Store table saved to: {self.store_table}")
+    
     def _normalize_banner(self, banner: str) -> str:
         """Normalize banner for matching"""
-        return (banner or '').strip().lower()
+        return store_loader.normalize_banner(banner)
     
     def _normalize_address(self, address: str) -> str:
         """Normalize address for matching"""
-        if not address:
-            return ''
-        addr = re.sub(r'\s+', ' ', address.strip().lower())
-        addr = re.sub(r'\b(st|street|rd|road|ave|avenue|blvd|boulevard|dr|drive|ln|lane|ct|court|pl|place)\b', '', addr)
-        addr = re.sub(r'\b(ste|suite|unit|#)\s*\d*\b', '', addr)
-        addr = re.sub(r'[^\w\s]', '', addr)
-        return addr.strip()
+        return store_loader.normalize_address(address)
     
     def _normalize_city(self, city: str) -> str:
         """Normalize city for matching"""
-        return (city or '').strip().lower()
+        return store_loader.normalize_city(city)
     
     def _normalize_state(self, state: str) -> str:
         """Normalize state"""
-        state = (state or '').strip().upper()
-        return state[:2] if len(state) >= 2 else state
+        return store_loader.normalize_state(state)
     
     def _extract_zip5(self, zip_code: str) -> str:
         """Extract 5-digit ZIP"""
-        if not zip_code:
-            return ''
-        zip_match = re.search(r'\d{5}', str(zip_code))
-        return zip_match.group(0).zfill(5) if zip_match else ''
+        return store_loader.extract_zip5(zip_code)
     
     def match_store(self, record: StoreRecord) -> MatchResult:
         """Match a store record against existing stores"""
-        banner_norm = record.normalize_banner()
-        address_norm = record.normalize_address()
-        city_norm = record.normalize_city()
-        state_norm = record.normalize_state()
-        zip5 = record.extract_zip5()
-        
-        # Create match key
-        match_key = f"{banner_norm}|{address_norm}|{city_norm}|{state_norm}|{zip5}"
-        
-        # Check for exact match
-        if match_key in self.existing_stores:
-            existing = self.existing_stores[match_key]
-            return MatchResult(
-                store_id=existing['id'],
-                existing_store=existing,
-                action='match',
-                conflicts=[]
-            )
-        
-        # No match found
-        return MatchResult(
-            store_id=None,
-            existing_store=None,
-            action='new',
-            conflicts=[]
-        )
+        existing = self.existing_stores.get(record_match_key(record))
+        if existing is not None:
+            return MatchResult(store_id=existing['id'], existing_store=existing, action='match', conflicts=[])
+        return MatchResult(store_id=None, existing_store=None, action='new', conflicts=[])
     
     def load_excel_file(self, file_path: str, sheet_name: str) -> List[StoreRecord]:
         """Load store records from Excel file"""
+        import pandas as pd
+        import store_validation
         print(f"📖 Reading Excel file: {file_path}")
         print(f"   Tab: {sheet_name}")
         
@@ -254,27 +245,34 @@ class StoreReconciliationImporter:
             if missing_cols:
                 raise ValueError(f"Missing required columns: {missing_cols}")
             
-            records = []
-            for _, row in df.iterrows():
-                # Skip empty rows
-                if pd.isna(row.get('BANNER')) and pd.isna(row.get('ADDRESS')):
-                    continue
-                
-                record = StoreRecord(
-                    chain=str(row.get('CHAIN', '') or ''),
-                    division=str(row.get('DIVISION', '') or ''),
-                    banner=str(row.get('BANNER', '') or ''),
-                    store_location_name=str(row.get('STORE LOCATION NAME', '') or ''),
-                    store=str(row.get('STORE', '') or ''),
-                    store_number=str(row.get('Store #', '') or ''),
-                    address=str(row.get('ADDRESS', '') or ''),
-                    city=str(row.get('CITY', '') or ''),
-                    state=str(row.get('STATE', '') or ''),
-                    zip=str(row.get('ZIP', '') or ''),
-                    metro=str(row.get('METRO', '') or ''),
-                    phone=str(row.get('PHONE', '') or '')
+            # Validate column-wise; only accepted rows become records
+            accepted, rejected = store_validation.validate_sheet(df)
+            report_lines = store_validation.write_rejection_report(accepted, rejected, self.rejection_report)
+            self.stats['rejected_rows'] = len(rejected)
+            self.stats['rejections'] = store_validation.summarize(rejected)
+            self.rejected = rejected[['sheet_row'] + store_validation.TEXT_COLUMNS].to_dict('records')
+            if report_lines:
+                print(f"⚠️  {len(rejected)} rows rejected, {report_lines - len(rejected)} cleaned "
+                      f"(see {self.rejection_report})")
+            
+            records = [
+                StoreRecord(
+                    chain=row['CHAIN'],
+                    division=row['DIVISION'],
+                    banner=row['BANNER'],
+                    store_location_name=row['STORE LOCATION NAME'],
+                    store=row['STORE'],
+                    store_number=row['Store #'],
+                    address=row['ADDRESS'],
+                    city=row['CITY'],
+                    state=row['STATE'],
+                    zip=row['ZIP'],
+                    metro=row['METRO'],
+                    phone=row['PHONE'],
+                    sheet_row=row['sheet_row']
                 )
-                records.append(record)
+                for row in accepted[['sheet_row'] + store_validation.TEXT_COLUMNS].to_dict('records')
+            ]
             
             print(f"✅ Loaded {len(records)} store records from Excel")
             return records
@@ -283,8 +281,8 @@ class StoreReconciliationImporter:
             print(f"❌ Error reading Excel file: {e}")
             raise
     
-    def process_records(self, records: List[StoreRecord]) -> List[MatchResult]:
-        """Process all records and match against existing stores"""
+    def process_records(self, records: List[StoreRecord], workers: int = 0) -> List[MatchResult]:
+        """Process all records and match against existing stores (sharded by state with workers > 1)"""
         print("\n🔍 Matching records against existing stores...")
         
         # DEBUG: Print first 20 Excel rows with their match keys
@@ -347,31 +345,26 @@ class StoreReconciliationImporter:
         
         print("\n" + "=" * 80)
         
-        # Handle duplicates: group by match key, keep row with most complete data
-        record_groups = defaultdict(list)
-        for i, record in enumerate(records):
-            match_key = f"{record.normalize_banner()}|{record.normalize_address()}|{record.normalize_city()}|{record.normalize_state()}|{record.extract_zip5()}"
-            record_groups[match_key].append((i, record))
-        
-        # Process each group (handle duplicates)
+        started = time.perf_counter()
+        rows = [key_fields(i, record) for i, record in enumerate(records)]
+        if workers and workers > 1:
+            grouped = group_keys(self._match_keys_parallel(rows, workers))
+        else:
+            grouped = group_records(rows)
+
+        # Groups are in sheet order of their first row; match the row kept for each
         results = []
-        for match_key, group in record_groups.items():
-            if len(group) > 1:
-                # Duplicate found - keep row with store number
-                group.sort(key=lambda x: 1 if x[1].store_number else 0, reverse=True)
-                record = group[0][1]
-                self.stats['duplicates'] += len(group) - 1
-            else:
-                record = group[0][1]
-            
-            match_result = self.match_store(record)
-            results.append(match_result)
-            
-            if match_result.action == 'match':
+        for _, match_key, row in grouped['groups']:
+            existing = self.existing_stores.get(match_key)
+            if existing is not None:
+                results.append(MatchResult(store_id=existing['id'], existing_store=existing, action='match', conflicts=[], row=row))
                 self.stats['matched_stores'] += 1
-            elif match_result.action == 'new':
+            else:
+                results.append(MatchResult(store_id=None, existing_store=None, action='new', conflicts=[], row=row))
                 self.stats['new_stores'] += 1
-        
+        self.stats['duplicates'] += grouped['duplicates']
+        elapsed = time.perf_counter() - started
+
         self.stats['total_excel_rows'] = len(records)
         self.matches = results
         
@@ -379,9 +372,18 @@ class StoreReconciliationImporter:
         print(f"   - Matched: {self.stats['matched_stores']}")
         print(f"   - New: {self.stats['new_stores']}")
         print(f"   - Duplicates removed: {self.stats['duplicates']}")
+        print(f"   - Matched in {elapsed:.2f}s" + (f" on {workers} workers" if workers and workers > 1 else ""))
         
         return results
     
+    def _match_keys_parallel(self, rows: List[Tuple], workers: int) -> List[Tuple]:
+        """match_keys() over contiguous slices of the sheet on a process pool; the parent never normalizes a row"""
+        from concurrent.futures import ProcessPoolExecutor
+        size = -(-len(rows) // (workers * 4)) or 1   # a few slices per worker so a slow one does not run alone
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return [k for part in pool.map(match_keys, [rows[i:i + size] for i in range(0, len(rows), size)])
+                    for k in part]
+    
     def identify_stores_to_deactivate(self, matched_store_ids: set):
         """Identify stores that should be deactivated (not in Excel)"""
         print("\n🔍 Identifying stores to deactivate...")
@@ -389,15 +391,148 @@ class StoreReconciliationImporter:
         all_existing_ids = {store['id'] for store in self.existing_stores.values()}
         stores_to_deactivate = all_existing_ids - matched_store_ids
         
+        # A rejected row (bad ZIP, "Tex") is still in the sheet; don't turn its store off
+        self.held_active = self.stores_held_by_rejected_rows(stores_to_deactivate)
+        stores_to_deactivate -= set(self.held_active)
+        
         self.stats['stores_to_deactivate'] = len(stores_to_deactivate)
+        self.stats['held_active'] = len(self.held_active)
         print(f"✅ Found {len(stores_to_deactivate)} stores to deactivate")
+        if self.held_active:
+            print(f"⚠️  Kept {len(self.held_active)} stores active that rejected rows may refer to")
         
         return stores_to_deactivate
     
+    def stores_held_by_rejected_rows(self, store_ids: set) -> Dict[str, int]:
+        """
+        {store id: sheet row} for stores in store_ids that a rejected sheet row
+        could be: same banner, address and city, or same banner and Store #
+        """
+        if not self.rejected:
+            return {}
+        places, numbers = {}, {}
+        for row in self.rejected:
+            banner = store_loader.normalize_banner(row['BANNER'])
+            places.setdefault((banner, store_loader.normalize_address(row['ADDRESS']),
+                               store_loader.normalize_city(row['CITY'])), row['sheet_row'])
+            if row['Store #']:
+                numbers.setdefault((banner, str(row['Store #']).strip()), row['sheet_row'])
+        held = {}
+        for store in self.existing_stores.values():
+            if store['id'] not in store_ids:
+                continue
+            banner = store_loader.normalize_banner(store.get('banner'))
+            place = (banner, store_loader.normalize_address(store.get('address')),
+                     store_loader.normalize_city(store.get('city')))
+            sheet_row = places.get(place) or numbers.get((banner, str(store.get('store_number') or '').strip()))
+            if sheet_row is not None:
+                held[store['id']] = sheet_row
+        return held
+    
+    def planned(self, records: List[StoreRecord], results: List[MatchResult]) -> List[Tuple[StoreRecord, MatchResult]]:
+        """(sheet record, result) for each planned store; duplicates are already folded into the row kept"""
+        return [(records[result.row] if result.row is not None else record, result)
+                for record, result in zip(records, results)]
+    
+    def new_store_row(self, record: StoreRecord) -> Dict:
+        """stores row to insert for an unmatched sheet record"""
+        display_name = record.generate_store_display_name()
+        return {
+            'STORE': display_name,
+            'name': display_name,  # Also set name for compatibility
+            'banner': record.banner,
+            'store_chain': record.chain,  # Legacy field
+            'address': record.address,
+            'city': record.city,
+            'state': record.normalize_state(),
+            'zip_code': record.zip,
+            'zip5': record.extract_zip5(),
+            'metro': record.metro if record.metro else None,
+            'phone': record.phone if record.phone else None,
+            'store_number': record.store_number if record.store_number else None,
+            'latitude': None,   # filled in by the geocoding stage
+            'longitude': None,
+            'is_active': True
+            # created_at and updated_at will use database defaults
+        }
+    
+    def update_row(self, record: StoreRecord, existing: Dict) -> Dict:
+        """Fields written to a matched store; its STORE value is preserved"""
+        update_data = {
+            'banner': record.banner,
+            'store_chain': record.chain,
+            'address': record.address,
+            'city': record.city,
+            'state': record.normalize_state(),
+            'zip_code': record.zip,
+            'zip5': record.extract_zip5(),
+            'metro': record.metro if record.metro else existing.get('metro'),
+            'phone': record.phone if record.phone else existing.get('phone'),
+            'store_number': record.store_number if record.store_number else existing.get('store_number'),
+            'is_active': True
+            # updated_at will use database default/trigger
+        }
+        # Preserve existing STORE value
+        if 'STORE' in existing:
+            update_data['STORE'] = existing['STORE']
+        elif 'name' in existing:
+            update_data['STORE'] = existing['name']
+        return update_data
+    
+    def write_diff(self, records: List[StoreRecord], results: List[MatchResult], stores_to_deactivate: set) -> DiffWriter:
+        """Stream every planned action to the diff files in one pass; returns the writer (counts, samples)"""
+        drift = self.drift = DriftMetrics()
+        with DiffWriter(self.diff_csv, self.diff_jsonl) as diff:
+            for record, result in self.planned(records, results):
+                sheet = {'sheet_row': record.sheet_row, 'banner': record.banner, 'address': record.address,
+                         'city': record.city, 'state': record.normalize_state(), 'zip': record.zip}
+                drift.count(record.banner, record.state, 'new' if result.action == 'new' else 'matched')
+                if result.conflicts:
+                    drift.count(record.banner, record.state, 'conflicted')
+                if result.action == 'new':
+                    diff.write('insert', store=record.generate_store_display_name(), **sheet,
+                               note=f"Store #: {record.store_number or 'N/A'}")
+                elif result.action == 'match' and result.store_id:
+                    existing = result.existing_store
+                    changes = store_diff.field_changes(existing, self.update_row(record, existing))
+                    if changes:
+                        diff.write('update', store_id=result.store_id,
+                                   store=existing.get('STORE') or existing.get('name'), **sheet, changes=changes)
+                    else:
+                        diff.unchanged()
+                for conflict in result.conflicts:
+                    diff.write('conflict', store_id=result.store_id, **sheet, note=conflict)
+            for store in self.existing_stores.values():
+                active = store.get('is_active') is not False
+                if active:
+                    drift.count(store.get('banner'), store.get('state'), 'active')
+                if store['id'] in stores_to_deactivate:
+                    if active:
+                        drift.count(store.get('banner'), store.get('state'), 'deactivated')
+                    diff.write('deactivate', store_id=store['id'], store=store.get('STORE') or store.get('name'),
+                               banner=store.get('banner'), address=store.get('address'), city=store.get('city'),
+                               state=store.get('state'), zip=store.get('zip_code'),
+                               changes={'is_active': [store.get('is_active'), False]})
+            by_id = {store['id']: store for store in self.existing_stores.values()} if self.held_active else {}
+            for store_id, sheet_row in self.held_active.items():
+                store = by_id.get(store_id) or {}
+                drift.count(store.get('banner'), store.get('state'), 'conflicted')
+                diff.write('conflict', store_id=store_id, sheet_row=sheet_row,
+                           note=f"kept active: rejected sheet row {sheet_row} may be this store")
+            for conflict in self.stats['conflicts']:   # free text with no banner/state, so not in the drift counts
+                diff.write('conflict', note=conflict)
+        return diff
+    
     def generate_dry_run_summary(self, records: List[StoreRecord], results: List[MatchResult]) -> str:
-        """Generate dry-run summary report"""
+        """Write the full diff files and return the dry-run summary (counts plus the first entries per action)"""
         matched_ids = {r.store_id for r in results if r.store_id}
         stores_to_deactivate = self.identify_stores_to_deactivate(matched_ids)
+        diff = self.write_diff(records, results, stores_to_deactivate)
+        baseline = {}
+        if self.metrics_db:
+            with store_drift.MetricsStore(self.metrics_db) as db:
+                baseline = db.baseline()
+        self.drift_violations = store_drift.check_drift(self.drift, baseline, self.drift_thresholds)
         
         summary = []
         summary.append("=" * 80)
@@ -408,52 +543,64 @@ class StoreReconciliationImporter:
         # Statistics
         summary.append("📊 STATISTICS")
         summary.append(f"   Total rows in Excel: {self.stats['total_excel_rows']}")
+        summary.append(f"   Rows rejected by validation: {self.stats['rejected_rows']}")
+        for reason, n in sorted(self.stats['rejections'].items()):
+            summary.append(f"      {reason}: {n}")
         summary.append(f"   New stores to insert: {self.stats['new_stores']}")
         summary.append(f"   Existing stores matched: {self.stats['matched_stores']}")
+        summary.append(f"      with field changes: {diff.counts['update']}")
+        summary.append(f"      unchanged: {diff.counts['unchanged']}")
         summary.append(f"   Duplicate rows removed: {self.stats['duplicates']}")
         summary.append(f"   Stores to deactivate: {self.stats['stores_to_deactivate']}")
+        if self.stats['held_active']:
+            summary.append(f"   Kept active (a rejected row may be them): {self.stats['held_active']}")
+        summary.append(f"   Conflicts: {diff.counts['conflict']}")
         summary.append("")
         
-        # Sample new stores
-        if self.stats['new_stores'] > 0:
-            summary.append("🆕 SAMPLE NEW STORES (first 10):")
-            new_count = 0
-            for record, result in zip(records, results):
-                if result.action == 'new' and new_count < 10:
-                    display_name = record.generate_store_display_name()
-                    summary.append(f"   {new_count + 1}. {display_name}")
-                    summary.append(f"      Banner: {record.banner}")
-                    summary.append(f"      Address: {record.address}, {record.city}, {record.state} {record.zip}")
-                    summary.append(f"      Store #: {record.store_number or 'N/A'}")
-                    summary.append("")
-                    new_count += 1
-            if self.stats['new_stores'] > 10:
-                summary.append(f"   ... and {self.stats['new_stores'] - 10} more")
+        outputs = [path for path in (self.diff_csv, self.diff_jsonl) if path]
+        if outputs:
+            summary.append(f"📄 FULL DIFF (every action): {', '.join(outputs)}")
             summary.append("")
         
-        # Sample stores to deactivate
-        if stores_to_deactivate:
-            summary.append("⚠️  SAMPLE STORES TO DEACTIVATE (first 10):")
-            deactivate_count = 0
-            for store in self.existing_stores.values():
-                if store['id'] in stores_to_deactivate and deactivate_count < 10:
-                    store_name = store.get('STORE') or store.get('name') or 'Unknown'
-                    summary.append(f"   {deactivate_count + 1}. {store_name}")
-                    summary.append(f"      ID: {store['id']}")
-                    summary.append(f"      Address: {store.get('address', 'N/A')}, {store.get('city', 'N/A')}, {store.get('state', 'N/A')}")
-                    summary.append("")
-                    deactivate_count += 1
-            if len(stores_to_deactivate) > 10:
-                summary.append(f"   ... and {len(stores_to_deactivate) - 10} more")
-            summary.append("")
+        if self.drift_violations:
+            summary.append(f"🛑 DRIFT ({len(self.drift_violations)} banner/state groups over threshold; "
+                           f"apply is blocked without --allow-drift):")
+            for violation in self.drift_violations:
+                summary.append(f"   - {violation}")
+        else:
+            summary.append(f"📈 DRIFT: {len(self.drift.groups)} banner/state groups within thresholds"
+                           + ("" if baseline else " (no applied run to compare with yet)"))
+        summary.append("")
         
-        # Conflicts
-        if self.stats['conflicts']:
-            summary.append("⚠️  CONFLICTS FOUND:")
-            for conflict in self.stats['conflicts'][:10]:
-                summary.append(f"   - {conflict}")
-            if len(self.stats['conflicts']) > 10:
-                summary.append(f"   ... and {len(self.stats['conflicts']) - 10} more")
+        sections = [
+            ('insert', "🆕 SAMPLE NEW STORES"),
+            ('update', "✏️  SAMPLE UPDATES"),
+            ('deactivate', "⚠️  SAMPLE STORES TO DEACTIVATE"),
+            ('conflict', "⚠️  CONFLICTS FOUND"),
+        ]
+        for action, title in sections:
+            samples = diff.samples[action]
+            if not samples:
+                continue
+            summary.append(f"{title} (first {len(samples)}):")
+            for n, entry in enumerate(samples, 1):
+                if action == 'conflict':
+                    summary.append(f"   - {entry['note']}")
+                    continue
+                summary.append(f"   {n}. {entry.get('store') or 'Unknown'}")
+                if entry.get('store_id'):
+                    summary.append(f"      ID: {entry['store_id']}")
+                summary.append(f"      Address: {entry.get('address') or 'N/A'}, {entry.get('city') or 'N/A'}, "
+                               f"{entry.get('state') or 'N/A'} {entry.get('zip') or ''}".rstrip())
+                if action == 'insert':
+                    summary.append(f"      Banner: {entry['banner']}")
+                    summary.append(f"      {entry['note']}")
+                elif action == 'update':
+                    for field, (old, new) in entry['changes'].items():
+                        summary.append(f"      {field}: {old!r} → {new!r}")
+                summary.append("")
+            if diff.counts[action] > len(samples):
+                summary.append(f"   ... and {diff.counts[action] - len(samples)} more")
             summary.append("")
         
         summary.append("=" * 80)
@@ -462,6 +609,19 @@ class StoreReconciliationImporter:
         
         return "\n".join(summary)
     
+    def record_metrics(self, source: str = None):
+        """Save this run's per-banner/state counts (and any drift) to the metrics database"""
+        if not self.metrics_db:
+            return
+        with store_drift.MetricsStore(self.metrics_db) as db:
+            self.run_id = db.record_run(self.drift, source, self.drift_violations)
+    
+    def mark_applied(self):
+        """Make this run the baseline the next run's drift is measured against"""
+        if self.metrics_db and self.run_id is not None:
+            with store_drift.MetricsStore(self.metrics_db) as db:
+                db.mark_applied(self.run_id)
+    
     def ensure_store_number_column(self):
         """Ensure store_number column exists in stores table"""
         print("\n🔍 Checking for store_number column...")
@@ -483,6 +643,17 @@ class StoreReconciliationImporter:
                 print("✅ store_number column exists (or will be created)")
                 return True
     
+    def geocode(self, rows: List[Dict]):
+        """Fill latitude/longitude on rows that have none (no-op without a geocoder)"""
+        if self.geocoder is None or not rows:
+            return
+        from store_geocoder import geocode_stores
+        stats = geocode_stores(rows, self.geocoder, self.geocode_cache, progress=True)
+        print(f"   🌎 Geocoded {stats['found']} of {stats['missing']} stores without coordinates "
+              f"({stats['cached']} addresses cached, {stats['looked_up']} looked up)")
+        if stats['not_found'] or stats['failed']:
+            print(f"   ⚠️  {stats['missing'] - stats['found']} stores still have no coordinates")
+
     def execute_import(self, records: List[StoreRecord], results: List[MatchResult], confirm: bool = False):
         """Execute the import (only if confirmed)"""
         if not confirm:
@@ -495,31 +666,11 @@ class StoreReconciliationImporter:
         self.ensure_store_number_column()
         
         # 1. Insert new stores
-        new_stores = []
-        for record, result in zip(records, results):
-            if result.action == 'new':
-                display_name = record.generate_store_display_name()
-                zip5 = record.extract_zip5()
-                
-                new_store = {
-                    'STORE': display_name,
-                    'name': display_name,  # Also set name for compatibility
-                    'banner': record.banner,
-                    'store_chain': record.chain,  # Legacy field
-                    'address': record.address,
-                    'city': record.city,
-                    'state': record.normalize_state(),
-                    'zip_code': record.zip,
-                    'zip5': zip5,
-                    'metro': record.metro if record.metro else None,
-                    'phone': record.phone if record.phone else None,
-                    'store_number': record.store_number if record.store_number else None,
-                    'is_active': True
-                    # created_at and updated_at will use database defaults
-                }
-                new_stores.append(new_store)
+        new_stores = [self.new_store_row(record) for record, result in self.planned(records, results)
+                      if result.action == 'new']
         
         if new_stores:
+            self.geocode(new_stores)
             print(f"   Inserting {len(new_stores)} new stores...")
             try:
                 response = self.supabase.table('stores').insert(new_stores).execute()
@@ -530,31 +681,18 @@ class StoreReconciliationImporter:
         
         # 2. Update existing stores (preserve STORE, update other fields)
         matched_stores = []
-        for record, result in zip(records, results):
+        ungeocoded = []
+        for record, result in self.planned(records, results):
             if result.action == 'match' and result.store_id:
-                # Update fields but preserve existing STORE value
                 existing = result.existing_store
-                update_data = {
-                    'banner': record.banner,
-                    'store_chain': record.chain,
-                    'address': record.address,
-                    'city': record.city,
-                    'state': record.normalize_state(),
-                    'zip_code': record.zip,
-                    'zip5': record.extract_zip5(),
-                    'metro': record.metro if record.metro else existing.get('metro'),
-                    'phone': record.phone if record.phone else existing.get('phone'),
-                    'store_number': record.store_number if record.store_number else existing.get('store_number'),
-                    'is_active': True
-                    # updated_at will use database default/trigger
-                }
-                # Preserve existing STORE value
-                if 'STORE' in existing:
-                    update_data['STORE'] = existing['STORE']
-                elif 'name' in existing:
-                    update_data['STORE'] = existing['name']
+                update_data = self.update_row(record, existing)
                 
                 matched_stores.append((result.store_id, update_data))
+                if not store_loader.store_coordinates(existing):
+                    ungeocoded.append(update_data)
+        
+        # Backfill coordinates on matched stores that never had them
+        self.geocode(ungeocoded)
         
         if matched_stores:
             print(f"   Updating {len(matched_stores)} existing stores...")
@@ -565,10 +703,9 @@ class StoreReconciliationImporter:
                     print(f"   ⚠️  Error updating store {store_id}: {e}")
             print(f"   ✅ Updated {len(matched_stores)} stores")
         
-        # 3. Deactivate stores not in Excel
+        # 3. Deactivate stores not in Excel (nor possibly behind a rejected row)
         matched_ids = {r.store_id for r in results if r.store_id}
-        all_existing_ids = {store['id'] for store in self.existing_stores.values()}
-        stores_to_deactivate = all_existing_ids - matched_ids
+        stores_to_deactivate = self.identify_stores_to_deactivate(matched_ids)
         
         if stores_to_deactivate:
             print(f"   Deactivating {len(stores_to_deactivate)} stores...")
@@ -580,17 +717,52 @@ class StoreReconciliationImporter:
                 raise
         
         print("\n✅ Import complete!")
+        
+        # The table written at load time predates these inserts, updates and deactivations
+        self.save_store_table()
 
-def main():
-    """Main function"""
-    print("=" * 80)
-    print("STORE RECONCILIATION IMPORT")
-    print("=" * 80)
-    print()
-    
-    # Configuration
-    excel_file = "Master Texas and WFM 12132025.xlsx"
-    sheet_name = "SCRUBBED TEXAS + WFM US"
+EXCEL_FILE = "Master Texas and WFM 12132025.xlsx"
+SHEET_NAME = "SCRUBBED TEXAS + WFM US"
+SUMMARY_FILE = "store-reconciliation-dry-run-summary.txt"
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Import options, shared by main() and the plan/apply subcommands of shelfassured.py"""
+    parser.add_argument('--excel', default=EXCEL_FILE, help=f'store sheet (default: {EXCEL_FILE})')
+    parser.add_argument('--sheet', default=SHEET_NAME, help=f'tab to read (default: {SHEET_NAME})')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='match states in parallel on this many processes (default: serial)')
+    parser.add_argument('--geocoder', choices=['census', 'none'], default='census',
+                        help='geocoder for stores without coordinates (default: census)')
+    parser.add_argument('--zip-centroids', metavar='CSV', default=None,
+                        help='geocode to ZIP centroids from this zip,latitude,longitude CSV instead')
+    parser.add_argument('--geocode-cache', default='store-geocode-cache.jsonl')
+    parser.add_argument('--search-index', metavar='DIR', default=None,
+                        help='rebuild the static store search index in DIR after the import')
+    parser.add_argument('--store-table', metavar='PATH', default=None,
+                        help='also write the stores to this memory-mapped store table file (rewritten after an import)')
+    parser.add_argument('--diff-csv', metavar='PATH', default='store-reconciliation-diff.csv',
+                        help="full dry-run diff as CSV ('' to skip)")
+    parser.add_argument('--diff-jsonl', metavar='PATH', default='store-reconciliation-diff.jsonl',
+                        help="full dry-run diff as JSON lines ('' to skip)")
+    parser.add_argument('--metrics-db', metavar='PATH', default=store_drift.METRICS_DB,
+                        help="SQLite file of per-banner/state counts across runs ('' to skip)")
+    parser.add_argument('--max-deactivated-share', type=float, default=store_drift.THRESHOLDS['max_deactivated_share'],
+                        help="block apply when a banner/state group would lose more than this share of its active stores")
+    parser.add_argument('--max-drop-share', type=float, default=store_drift.THRESHOLDS['max_drop_share'],
+                        help="block apply when a group's sheet stores dropped by more than this since the last applied run")
+    parser.add_argument('--max-conflicted-share', type=float, default=store_drift.THRESHOLDS['max_conflicted_share'],
+                        help="block apply when more than this share of a group's sheet stores have conflicts")
+    parser.add_argument('--min-group-size', type=int, default=store_drift.THRESHOLDS['min_group_size'],
+                        help="do not check drift for banner/state groups smaller than this")
+    parser.add_argument('--allow-drift', action='store_true',
+                        help="apply even when drift is over the thresholds")
+
+
+def plan(args) -> Tuple[StoreReconciliationImporter, List[StoreRecord], List[MatchResult]]:
+    """Load, validate and match, then print and save the dry-run summary"""
+    from dotenv import load_dotenv
+    load_dotenv()
     
     # Get Supabase credentials
     supabase_url = os.getenv('SUPABASE_URL')
@@ -604,42 +776,89 @@ def main():
         sys.exit(1)
     
     # Check if Excel file exists
-    if not os.path.exists(excel_file):
-        print(f"❌ Error: Excel file not found: {excel_file}")
+    if not os.path.exists(args.excel):
+        print(f"❌ Error: Excel file not found: {args.excel}")
         print(f"   Please ensure the file is in the current directory")
         sys.exit(1)
     
     # Initialize importer
     importer = StoreReconciliationImporter(supabase_url, supabase_key)
+    importer.store_table = args.store_table
+    importer.diff_csv = args.diff_csv or None
+    importer.diff_jsonl = args.diff_jsonl or None
+    importer.metrics_db = args.metrics_db or None
+    importer.drift_thresholds = {name: getattr(args, name) for name in store_drift.THRESHOLDS}
+    if args.zip_centroids or args.geocoder != 'none':
+        import store_geocoder
+        importer.geocoder = (store_geocoder.ZipCentroidGeocoder.from_csv(args.zip_centroids) if args.zip_centroids
+                             else store_geocoder.CensusGeocoder())
+        importer.geocode_cache = store_geocoder.GeocodeCache(args.geocode_cache)
     
     # Load existing stores
     importer.load_existing_stores()
     
     # Load Excel file
-    records = importer.load_excel_file(excel_file, sheet_name)
+    records = importer.load_excel_file(args.excel, args.sheet)
     
     # Process records
-    results = importer.process_records(records)
+    results = importer.process_records(records, workers=args.workers)
     
     # Generate dry-run summary
     summary = importer.generate_dry_run_summary(records, results)
     print("\n" + summary)
     
     # Save summary to file
-    with open('store-reconciliation-dry-run-summary.txt', 'w') as f:
+    with open(SUMMARY_FILE, 'w') as f:
         f.write(summary)
-    print("\n💾 Dry-run summary saved to: store-reconciliation-dry-run-summary.txt")
+    print(f"\n💾 Dry-run summary saved to: {SUMMARY_FILE}")
+    for path in (importer.diff_csv, importer.diff_jsonl):
+        if path:
+            print(f"💾 Full diff saved to: {path}")
+    importer.record_metrics(args.excel)
+    if importer.metrics_db:
+        print(f"💾 Run metrics saved to: {importer.metrics_db}")
+    return importer, records, results
+
+
+def apply(importer: StoreReconciliationImporter, records: List[StoreRecord], results: List[MatchResult],
+          args, assume_yes: bool = False):
+    """Write a planned import (after a yes at the prompt unless assume_yes); refused while drift is over the thresholds"""
+    if importer.drift_violations and not args.allow_drift:
+        print(f"\n🛑 Import blocked: {len(importer.drift_violations)} banner/state groups drifted past the thresholds")
+        print("   Check the sheet, or re-run with --allow-drift (or looser --max-* thresholds) if the change is real")
+        return False
+    
+    if not assume_yes:
+        print("\n" + "=" * 80)
+        response = input("Do you want to execute the import? (yes/no): ").strip().lower()
+        if response != 'yes':
+            print("\n❌ Import cancelled by user")
+            print("   Review the dry-run summary and run again when ready")
+            return False
+    
+    importer.execute_import(records, results, confirm=True)
+    importer.mark_applied()
+    if args.search_index:
+        from store_search_index import publish_from_supabase
+        manifest = publish_from_supabase(importer.supabase, args.search_index)
+        print(f"💾 Store search index v{manifest['version']} ({manifest['stores']} active stores) "
+              f"saved to: {args.search_index}")
+    return True
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Reconcile the master store list with the stores table.')
+    add_arguments(parser)
+    args = parser.parse_args()
     
-    # Ask for confirmation
-    print("\n" + "=" * 80)
-    response = input("Do you want to execute the import? (yes/no): ").strip().lower()
+    print("=" * 80)
+    print("STORE RECONCILIATION IMPORT")
+    print("=" * 80)
+    print()
     
-    if response == 'yes':
-        importer.execute_import(records, results, confirm=True)
-    else:
-        print("\n❌ Import cancelled by user")
-        print("   Review the dry-run summary and run again when ready")
+    importer, records, results = plan(args)
+    apply(importer, records, results, args)
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,203 @@
+"""
+Store Visit Route Planner
+Orders the stores of a shelfer's job batch into a short visiting route.
+
+The route starts at the shelfer's location (or at the first store when none
+is given) and is built with nearest-neighbour, then improved with 2-opt
+moves on a precomputed drive-time matrix. Drive times are estimated from
+haversine distance times ROAD_FACTOR at AVG_SPEED_MPH; each visit adds
+VISIT_MINUTES. With a time budget, stops that do not fit are left off the
+end of the route and reported as deferred.
+
+Usage:
+    from route_planner import plan_route, plan_routes
+    plan = plan_route(stores, start=(30.27, -97.74), budget_minutes=240)
+    plans = plan_routes([{'shelfer': 'u1', 'store_ids': [...], 'start': '78703'}, ...], stores_by_id)
+
+    python3 route_planner.py --job JOB_ID [--start 30.27,-97.74|ZIP] [--budget-minutes 240]
+    python3 route_planner.py --stores ID ID ... [--start ...] [--stores-json stores.json]
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from store_geo import haversine_mi
+from store_loader import store_coordinates
+
+ROAD_FACTOR   = 1.3    # road miles per straight-line mile
+AVG_SPEED_MPH = 30.0
+VISIT_MINUTES = 15.0
+
+
+def drive_minutes(miles: float, speed_mph: float = AVG_SPEED_MPH) -> float:
+    return miles * ROAD_FACTOR / speed_mph * 60
+
+
+def _matrix(points: list, speed_mph: float) -> list:
+    n = len(points)
+    m = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        lat1, lon1 = points[i]
+        row = m[i]
+        for j in range(i + 1, n):
+            row[j] = m[j][i] = drive_minutes(haversine_mi(lat1, lon1, *points[j]), speed_mph)
+    return m
+
+
+def _nearest_neighbour(m: list, start: int, nodes: list) -> list:
+    order, remaining, current = [start], set(nodes), start
+    remaining.discard(start)
+    while remaining:
+        row = m[current]
+        current = min(remaining, key=row.__getitem__)
+        remaining.remove(current)
+        order.append(current)
+    return order
+
+
+def _two_opt(m: list, order: list, fixed_start: bool = True) -> list:
+    """Reverse segments while that shortens the open path; order[0] stays put if fixed_start."""
+    n = len(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1 if fixed_start else 0, n - 1):
+            for j in range(i + 1, n):
+                a, b, c = (order[i - 1] if i else None), order[i], order[j]
+                d = order[j + 1] if j + 1 < n else None
+                delta = 0.0
+                if a is not None:
+                    delta += m[a][c] - m[a][b]
+                if d is not None:
+                    delta += m[b][d] - m[c][d]
+                if delta < -1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+    return order
+
+
+def plan_route(stores: list, start=None, budget_minutes: float = None,
+               speed_mph: float = AVG_SPEED_MPH, visit_minutes: float = VISIT_MINUTES) -> dict:
+    """
+    Order stores (rows with id/latitude/longitude) into a route.
+
+    Returns {'stops': [{store_id, arrive_minute, drive_minutes, miles}], 'total_minutes',
+    'total_miles', 'deferred': [store ids over budget], 'unrouted': [store ids without coordinates]}.
+    """
+    routable, unrouted = [], []
+    for store in stores:
+        point = store_coordinates(store)
+        if point is None:
+            unrouted.append(store['id'])
+        else:
+            routable.append((store['id'], point))
+
+    if not routable:
+        return {'stops': [], 'total_minutes': 0.0, 'total_miles': 0.0, 'deferred': [], 'unrouted': unrouted}
+
+    # Node 0 is the start location when there is one; store nodes follow
+    offset = 1 if start is not None else 0
+    points = ([tuple(start)] if start is not None else []) + [p for _, p in routable]
+
+    m = _matrix(points, speed_mph)
+    order = _nearest_neighbour(m, 0, list(range(len(points))))
+    order = _two_opt(m, order, fixed_start=start is not None)
+
+    stops, clock, miles, deferred = [], 0.0, 0.0, []
+    prev = order[0] if start is not None else None
+    visits = order[offset:]
+    for node in visits:
+        leg = m[prev][node] if prev is not None else 0.0
+        if budget_minutes is not None and clock + leg + visit_minutes > budget_minutes:
+            deferred.extend(routable[n - offset][0] for n in visits[len(stops):])
+            break
+        leg_miles = leg / 60 * speed_mph   # road miles
+        clock += leg
+        stops.append({'store_id': routable[node - offset][0], 'arrive_minute': round(clock, 1),
+                      'drive_minutes': round(leg, 1), 'miles': round(leg_miles, 2)})
+        clock += visit_minutes
+        miles += leg_miles
+        prev = node
+
+    return {'stops': stops, 'total_minutes': round(clock, 1), 'total_miles': round(miles, 2),
+            'deferred': deferred, 'unrouted': unrouted}
+
+
+def _plan_one(args):
+    request, stores = args
+    plan = plan_route(stores, request.get('start'), request.get('budget_minutes'))
+    plan['shelfer'] = request.get('shelfer')
+    return plan
+
+
+def plan_routes(requests: list, stores_by_id: dict, workers: int = 0, resolve_start=None) -> list:
+    """
+    Plan many shelfers' routes at once. Each request is {'shelfer', 'store_ids',
+    'start' (optional (lat, lon) or anything resolve_start understands),
+    'budget_minutes' (optional)}. Unknown store ids are reported as unrouted.
+    """
+    jobs = []
+    for request in requests:
+        request = dict(request)
+        if request.get('start') is not None and resolve_start is not None:
+            request['start'] = resolve_start(request['start'])
+        stores = [stores_by_id.get(sid) or {'id': sid} for sid in request['store_ids']]
+        jobs.append((request, stores))
+    if workers and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_plan_one, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    return [_plan_one(job) for job in jobs]
+
+
+def load_job_store_ids(client, job_id: str) -> list:
+    rows = client.table('job_store_skus').select('store_id').eq('job_id', job_id).execute().data or []
+    return list(dict.fromkeys(r['store_id'] for r in rows if r.get('store_id')))
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plan a store visiting order.')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--job', help='route every store on this job')
+    group.add_argument('--stores', nargs='+', metavar='ID')
+    parser.add_argument('--start', help="'lat,lon' or ZIP5")
+    parser.add_argument('--budget-minutes', type=float, default=None)
+    parser.add_argument('--stores-json', help='read stores from a JSON array instead of Supabase')
+    args = parser.parse_args()
+
+    from store_geo import STORE_COLUMNS, StoreSpatialIndex
+    client = None
+    if args.stores_json:
+        with open(args.stores_json) as f:
+            all_stores = json.load(f)
+    else:
+        from store_loader import load_stores, supabase_from_env
+        client = supabase_from_env()
+        all_stores = load_stores(client, STORE_COLUMNS)
+    by_id = {s['id']: s for s in all_stores}
+
+    if args.job:
+        if client is None:
+            parser.error('--job needs Supabase; use --stores with --stores-json')
+        store_ids = load_job_store_ids(client, args.job)
+    else:
+        store_ids = args.stores
+
+    start = StoreSpatialIndex(all_stores).point_for(args.start) if args.start else None
+    started = time.perf_counter()
+    plan = plan_routes([{'store_ids': store_ids, 'start': start, 'budget_minutes': args.budget_minutes}], by_id)[0]
+    elapsed = (time.perf_counter() - started) * 1000
+
+    for n, stop in enumerate(plan['stops'], 1):
+        store = by_id[stop['store_id']]
+        print(f"{n:3}. +{stop['drive_minutes']:5.1f} min  @{stop['arrive_minute']:6.1f}  "
+              f"{store.get('STORE') or store.get('name')}  ({store.get('address')}, {store.get('city')})")
+    print(f"\n{len(plan['stops'])} stops, {plan['total_miles']} mi, {plan['total_minutes']} min "
+          f"(planned in {elapsed:.1f}ms)")
+    if plan['deferred']:
+        print(f"Deferred (over budget): {len(plan['deferred'])}")
+    if plan['unrouted']:
+        print(f"Unrouted (no coordinates): {len(plan['unrouted'])}", file=sys.stderr)
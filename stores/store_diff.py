@@ -0,0 +1,85 @@
+"""
+Store Reconciliation Diff
+Streams every action a reconciliation plan would take to CSV and/or
+JSON-lines files as the plan is computed, and keeps just enough (counts and
+the first few entries per action) for the human summary.
+
+    insert      sheet row with no matching store
+    update      matched store whose fields would change; changes = {field: [old, new]}
+    deactivate  active or inactive store missing from the sheet (is_active -> false)
+    conflict    anything the importer flagged for a person to look at
+
+Matched stores with nothing to change are only counted (unchanged).
+
+CSV columns are DIFF_COLUMNS; changed_fields is a ';'-separated list for
+filtering and changes is the JSON object. JSONL lines carry the same keys
+with changes as an object.
+
+Usage:
+    from store_diff import DiffWriter, field_changes
+    with DiffWriter('store-reconciliation-diff.csv', 'store-reconciliation-diff.jsonl') as diff:
+        diff.write('update', store_id=s['id'], sheet_row=12, changes=field_changes(s, update))
+    diff.counts, diff.samples['insert']
+"""
+
+import csv
+import json
+
+DIFF_COLUMNS = ['action', 'store_id', 'sheet_row', 'banner', 'store', 'address', 'city', 'state', 'zip',
+                'changed_fields', 'changes', 'note']
+ACTIONS = ['insert', 'update', 'deactivate', 'conflict']
+SAMPLES = 10
+
+
+def _comparable(value):
+    if value is None or isinstance(value, bool):
+        return value if value is not None else ''
+    return str(value).strip()
+
+
+def field_changes(existing: dict, update: dict) -> dict:
+    """{field: [old, new]} for the fields update would change (None and '' count as equal)."""
+    return {field: [existing.get(field), new] for field, new in update.items()
+            if _comparable(existing.get(field)) != _comparable(new)}
+
+
+class DiffWriter:
+    """Write plan entries as they are produced; counts and samples stay in memory."""
+
+    def __init__(self, csv_path: str = None, jsonl_path: str = None, samples: int = SAMPLES):
+        self.csv_path   = csv_path
+        self.jsonl_path = jsonl_path
+        self.sample_size = samples
+        self.counts  = {action: 0 for action in ACTIONS + ['unchanged']}
+        self.samples = {action: [] for action in ACTIONS}
+        self._csv = self._jsonl = None
+
+    def __enter__(self):
+        if self.csv_path:
+            self._csv_file = open(self.csv_path, 'w', newline='')
+            self._csv = csv.DictWriter(self._csv_file, DIFF_COLUMNS, extrasaction='ignore')
+            self._csv.writeheader()
+        if self.jsonl_path:
+            self._jsonl = open(self.jsonl_path, 'w')
+        return self
+
+    def __exit__(self, *exc):
+        if self._csv:
+            self._csv_file.close()
+        if self._jsonl:
+            self._jsonl.close()
+
+    def unchanged(self):
+        self.counts['unchanged'] += 1
+
+    def write(self, action: str, **fields):
+        entry = {'action': action, **fields}
+        self.counts[action] += 1
+        if len(self.samples[action]) < self.sample_size:
+            self.samples[action].append(entry)
+        if self._jsonl:
+            self._jsonl.write(json.dumps(entry, default=str) + '\n')
+        if self._csv:
+            changes = entry.get('changes') or {}
+            self._csv.writerow({**entry, 'changed_fields': ';'.join(changes),
+                                'changes': json.dumps(changes, default=str) if changes else ''})
@@ -0,0 +1,213 @@
+"""
+Store Reconciliation Drift
+Per-banner, per-state counts from every reconciliation run, kept in a local
+SQLite file so a sheet that suddenly drops a chunk of a banner's stores is
+caught before the deactivation step turns them off.
+
+    runs         id, planned_at, source, applied_at, violations (JSON list)
+    run_metrics  run_id, banner, state, matched, new, deactivated, conflicted, active
+
+banner is store_loader.normalize_banner and state normalize_state, so sheet
+rows and stores rows land in the same group. active is the number of active
+stores the group had before the run; deactivated only counts active stores
+the run would turn off.
+
+A run is compared with the last applied run and its own stores table:
+
+    max_deactivated_share  deactivated / active stores in a group
+    max_drop_share         drop in sheet stores (matched + new) since the last applied run
+    max_conflicted_share   conflicted / sheet stores
+    min_group_size         groups smaller than this (on the side being divided by) are not checked
+
+Usage:
+    from store_drift import DriftMetrics, MetricsStore
+    metrics = DriftMetrics()
+    metrics.count(banner, state, 'matched')          # in the pass that already visits each row
+    with MetricsStore('store-reconciliation-metrics.db') as db:
+        violations = check_drift(metrics, db.baseline())
+        run_id = db.record_run(metrics, 'sheet.xlsx', violations)
+        db.mark_applied(run_id)
+
+    python3 store_drift.py [--db store-reconciliation-metrics.db] [--banner h-e-b] [--state TX] [--runs 10]
+"""
+
+import argparse
+import json
+from datetime import datetime, timezone
+
+from store_loader import normalize_banner, normalize_state
+
+METRICS_DB = 'store-reconciliation-metrics.db'
+FIELDS     = ['matched', 'new', 'deactivated', 'conflicted', 'active']
+THRESHOLDS = {
+    'max_deactivated_share': 0.10,
+    'max_drop_share':        0.20,
+    'max_conflicted_share':  0.05,
+    'min_group_size':        10,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    planned_at  TEXT NOT NULL,
+    source      TEXT,
+    applied_at  TEXT,
+    violations  TEXT NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS run_metrics (
+    run_id      INTEGER NOT NULL REFERENCES runs (id),
+    banner      TEXT NOT NULL,
+    state       TEXT NOT NULL,
+    matched     INTEGER NOT NULL DEFAULT 0,
+    new         INTEGER NOT NULL DEFAULT 0,
+    deactivated INTEGER NOT NULL DEFAULT 0,
+    conflicted  INTEGER NOT NULL DEFAULT 0,
+    active      INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, banner, state)
+);
+CREATE INDEX IF NOT EXISTS idx_run_metrics_group ON run_metrics (banner, state, run_id);
+"""
+
+_INDEX = {field: i for i, field in enumerate(FIELDS)}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+class DriftMetrics:
+    """{(banner, state): [matched, new, deactivated, conflicted, active]}, filled one row at a time."""
+
+    def __init__(self):
+        self.groups = {}
+
+    def count(self, banner: str, state: str, field: str, n: int = 1):
+        key = (normalize_banner(banner), normalize_state(state))
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = [0] * len(FIELDS)
+        group[_INDEX[field]] += n
+
+    def get(self, banner: str, state: str) -> dict:
+        group = self.groups.get((normalize_banner(banner), normalize_state(state))) or [0] * len(FIELDS)
+        return dict(zip(FIELDS, group))
+
+    def rows(self) -> list:
+        return [{'banner': banner, 'state': state, **dict(zip(FIELDS, group))}
+                for (banner, state), group in sorted(self.groups.items())]
+
+
+def _share(part: int, whole: int) -> float:
+    return part / whole if whole else 0.0
+
+
+def check_drift(metrics: DriftMetrics, baseline: dict = None, thresholds: dict = None) -> list:
+    """
+    Messages for each group over a threshold; empty when the run is safe to
+    apply. baseline is {(banner, state): {field: n}} from the last applied run.
+    """
+    limits = dict(THRESHOLDS, **(thresholds or {}))
+    baseline = baseline or {}
+    minimum = limits['min_group_size']
+    violations = []
+    for banner, state in sorted(set(metrics.groups) | set(baseline)):
+        now = metrics.get(banner, state)
+        label = f"{banner or '(no banner)'}/{state or '??'}"
+        sheet = now['matched'] + now['new']
+
+        share = _share(now['deactivated'], now['active'])
+        if now['active'] >= minimum and share > limits['max_deactivated_share']:
+            violations.append(f"{label}: {now['deactivated']} of {now['active']} active stores would be "
+                              f"deactivated ({share:.0%} > {limits['max_deactivated_share']:.0%})")
+
+        before = baseline.get((banner, state))
+        if before:
+            previous = before['matched'] + before['new']
+            drop = _share(previous - sheet, previous)
+            if previous >= minimum and drop > limits['max_drop_share']:
+                violations.append(f"{label}: sheet has {sheet} stores, down from {previous} at the last "
+                                  f"applied run ({drop:.0%} > {limits['max_drop_share']:.0%})")
+
+        share = _share(now['conflicted'], sheet)
+        if sheet >= minimum and share > limits['max_conflicted_share']:
+            violations.append(f"{label}: {now['conflicted']} of {sheet} sheet stores have conflicts "
+                              f"({share:.0%} > {limits['max_conflicted_share']:.0%})")
+    return violations
+
+
+class MetricsStore:
+    """The runs and run_metrics tables in a local SQLite file (created on first use)."""
+
+    def __init__(self, path: str = METRICS_DB):
+        import sqlite3   # only when a run is recorded, so the CLI's --help stays fast
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def record_run(self, metrics: DriftMetrics, source: str = None, violations: list = None) -> int:
+        """Store one run's counts and return its id."""
+        with self.conn:
+            run_id = self.conn.execute('INSERT INTO runs (planned_at, source, violations) VALUES (?, ?, ?)',
+                                       (_now(), source, json.dumps(violations or []))).lastrowid
+            self.conn.executemany(
+                f"INSERT INTO run_metrics (run_id, banner, state, {', '.join(FIELDS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(FIELDS))})",
+                [(run_id, banner, state, *group) for (banner, state), group in metrics.groups.items()])
+        return run_id
+
+    def mark_applied(self, run_id: int):
+        with self.conn:
+            self.conn.execute('UPDATE runs SET applied_at = ? WHERE id = ?', (_now(), run_id))
+
+    def baseline(self) -> dict:
+        """{(banner, state): {field: n}} of the last applied run; {} before the first apply."""
+        row = self.conn.execute('SELECT id FROM runs WHERE applied_at IS NOT NULL '
+                                'ORDER BY applied_at DESC, id DESC LIMIT 1').fetchone()
+        if row is None:
+            return {}
+        return {(r['banner'], r['state']): {field: r[field] for field in FIELDS}
+                for r in self.conn.execute('SELECT * FROM run_metrics WHERE run_id = ?', (row['id'],))}
+
+    def history(self, banner: str = None, state: str = None, runs: int = 10) -> list:
+        """Totals per run (newest first), optionally for one banner and/or state."""
+        where, params = [], []
+        if banner:
+            where.append('m.banner = ?')
+            params.append(normalize_banner(banner))
+        if state:
+            where.append('m.state = ?')
+            params.append(normalize_state(state))
+        sums = ', '.join(f'COALESCE(SUM(m.{field}), 0) AS {field}' for field in FIELDS)
+        query = (f"SELECT r.id, r.planned_at, r.applied_at, r.source, r.violations, {sums} "
+                 f"FROM runs r LEFT JOIN run_metrics m ON m.run_id = r.id "
+                 f"{'AND ' + ' AND '.join(where) if where else ''} "
+                 f"GROUP BY r.id ORDER BY r.id DESC LIMIT ?")
+        return [dict(r) for r in self.conn.execute(query, (*params, runs))]
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Show reconciliation counts across runs.')
+    parser.add_argument('--db', default=METRICS_DB)
+    parser.add_argument('--banner', default=None)
+    parser.add_argument('--state', default=None)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with MetricsStore(args.db) as db:
+        rows = db.history(args.banner, args.state, args.runs)
+    print(f"{'run':>5}  {'planned':<25} {'applied':<8} " + ' '.join(f'{f:>11}' for f in FIELDS) + '  drift')
+    for r in rows:
+        blocked = len(json.loads(r['violations']))
+        print(f"{r['id']:>5}  {r['planned_at']:<25} {'yes' if r['applied_at'] else 'no':<8} "
+              + ' '.join(f"{r[f]:>11}" for f in FIELDS) + f"  {blocked or ''}")
@@ -0,0 +1,271 @@
+"""
+Store Duplicate Clusters
+Finds stores rows that are the same physical store and writes a merge plan.
+
+Stores are blocked by (state, zip5), or (state, city) when the ZIP is
+missing, using the importer's normalization, and only pairs within a block
+are compared. Two stores are duplicates when their banners agree and
+
+    address      the normalized addresses are equal (the importer's match rule)
+    similar      same house number and mostly the same street words
+    coordinates  they are within SAME_SITE_MILES of each other
+
+Duplicate pairs are merged into clusters with union-find. Each cluster keeps
+one survivor: active first, then the most complete row (store_number, phone,
+zip_code, metro, as in identify-true-duplicate-stores.sql), then the most
+referenced, then the lowest id. The plan lists which job_store_skus,
+job_submissions and brand_stores rows to repoint at the survivor, and which
+to delete because the survivor already has the same (job, sku) or brand.
+
+Nothing is changed in the database; --sql writes a script to review and run
+in the Supabase SQL editor, like merge-true-duplicate-stores-execute.sql.
+
+Usage:
+    python3 store_duplicates.py [--stores-json stores.json] [--plan plan.json] [--sql merge.sql]
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+
+from store_geo import haversine_mi
+from store_loader import (PAGE_SIZE, extract_zip5, normalize_address, normalize_banner, normalize_city,
+                          normalize_state, store_coordinates)
+
+SAME_SITE_MILES  = 0.05   # ~80 m
+STREET_OVERLAP   = 0.6    # Jaccard overlap of street words for 'similar'
+BATCH_SIZE       = 200
+
+STORE_COLUMNS = ('id, STORE, name, banner, banner_id, address, city, state, zip_code, '
+                 'latitude, longitude, is_active, store_number, phone, metro')
+
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        parent.setdefault(x, x)
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:      # path compression
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+    def groups(self) -> dict:
+        out = defaultdict(list)
+        for x in self.parent:
+            out[self.find(x)].append(x)
+        return out
+
+
+# ── Comparison ────────────────────────────────────────────────────────────────
+class _Candidate:
+    __slots__ = ('store', 'banner_id', 'banner', 'address', 'house', 'words', 'point')
+
+    def __init__(self, store):
+        self.store     = store
+        self.banner_id = store.get('banner_id')
+        self.banner    = normalize_banner(store.get('banner') or (store.get('STORE') or '').split(' – ')[0])
+        self.address   = normalize_address(store.get('address') or '')
+        tokens = self.address.split()
+        self.house     = tokens[0] if tokens and tokens[0].isdigit() else None
+        self.words     = frozenset(t for t in tokens if not t.isdigit())
+        self.point     = store_coordinates(store)
+
+
+def block_key(store: dict) -> tuple:
+    state = normalize_state(store.get('state') or '')
+    zip5 = extract_zip5(store.get('zip_code') or '')
+    return (state, zip5) if zip5 else (state, 'city:' + normalize_city(store.get('city') or ''))
+
+
+def duplicate_reason(a: _Candidate, b: _Candidate):
+    """Why a and b are the same store, or None."""
+    if a.banner_id and b.banner_id:
+        if a.banner_id != b.banner_id:
+            return None
+    elif a.banner != b.banner:
+        return None
+    if a.address and a.address == b.address:
+        return 'address'
+    if a.house and a.house == b.house and a.words and b.words:
+        if len(a.words & b.words) / len(a.words | b.words) >= STREET_OVERLAP:
+            return 'similar'
+    if a.point and b.point and haversine_mi(*a.point, *b.point) <= SAME_SITE_MILES:
+        return 'coordinates'
+    return None
+
+
+def find_clusters(stores: list) -> list:
+    """[[(store, reason), ...]] for every group of two or more duplicates."""
+    blocks = defaultdict(list)
+    for store in stores:
+        blocks[block_key(store)].append(_Candidate(store))
+
+    uf, reasons = UnionFind(), {}
+    for members in blocks.values():
+        for i in range(len(members)):
+            a = members[i]
+            for b in members[i + 1:]:
+                reason = duplicate_reason(a, b)
+                if reason:
+                    ida, idb = a.store['id'], b.store['id']
+                    uf.union(ida, idb)
+                    reasons.setdefault(ida, reason)
+                    reasons.setdefault(idb, reason)
+
+    by_id = {s['id']: s for s in stores}
+    return [[(by_id[i], reasons[i]) for i in sorted(ids)] for ids in uf.groups().values() if len(ids) > 1]
+
+
+# ── References ────────────────────────────────────────────────────────────────
+def _select_in(client, table, columns, column, values):
+    """Every row whose column is in values: BATCH_SIZE values per query, each paged by id (a busy store has >1000)."""
+    rows = []
+    values = list(values)
+    for i in range(0, len(values), BATCH_SIZE):
+        start = 0
+        while True:
+            page = client.table(table).select(columns).in_(column, values[i:i + BATCH_SIZE]) \
+                .order('id').range(start, start + PAGE_SIZE - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+    return rows
+
+
+def load_references(client, store_ids) -> dict:
+    """{table: [rows]} for every row pointing at one of store_ids."""
+    store_ids = list(store_ids)
+    return {
+        'job_store_skus':  _select_in(client, 'job_store_skus', 'id, job_id, store_id, sku_id', 'store_id', store_ids),
+        'job_submissions': _select_in(client, 'job_submissions', 'id, store_id', 'store_id', store_ids),
+        'brand_stores':    _select_in(client, 'brand_stores', 'id, brand_id, store_id', 'store_id', store_ids),
+    }
+
+
+def completeness(store: dict) -> int:
+    return sum(1 for col in ('store_number', 'phone', 'zip_code', 'metro') if (store.get(col) or '') != '')
+
+
+def merge_plan(clusters: list, references: dict = None) -> list:
+    """Pick survivors and work out the reference updates for each cluster."""
+    references = references or {}
+    ref_count = defaultdict(int)
+    by_store = {table: defaultdict(list) for table in ('job_store_skus', 'job_submissions', 'brand_stores')}
+    for table, rows in references.items():
+        for row in rows:
+            by_store[table][row['store_id']].append(row)
+            ref_count[row['store_id']] += 1
+
+    plan = []
+    for cluster in clusters:
+        stores = [s for s, _ in cluster]
+        survivor = min(stores, key=lambda s: (s.get('is_active') is False, -completeness(s),
+                                              -ref_count[s['id']], s['id']))
+        sid = survivor['id']
+        losers = [(s, reason) for s, reason in cluster if s['id'] != sid]
+
+        # Unique keys the survivor already holds; a loser row with the same key is deleted, not repointed
+        jss_keys = {(r['job_id'], r['sku_id']) for r in by_store['job_store_skus'][sid]}
+        brand_keys = {r['brand_id'] for r in by_store['brand_stores'][sid]}
+        repoint = {'job_store_skus': [], 'job_submissions': [], 'brand_stores': []}
+        delete = {'job_store_skus': [], 'brand_stores': []}
+        for store, _ in losers:
+            for r in by_store['job_store_skus'][store['id']]:
+                key = (r['job_id'], r['sku_id'])
+                (delete if key in jss_keys else repoint)['job_store_skus'].append(r['id'])
+                jss_keys.add(key)
+            for r in by_store['brand_stores'][store['id']]:
+                (delete if r['brand_id'] in brand_keys else repoint)['brand_stores'].append(r['id'])
+                brand_keys.add(r['brand_id'])
+            repoint['job_submissions'].extend(r['id'] for r in by_store['job_submissions'][store['id']])
+
+        plan.append({
+            'survivor_id':    sid,
+            'survivor_store': survivor.get('STORE') or survivor.get('name'),
+            'address':        survivor.get('address'),
+            'merge':          [{'id': s['id'], 'store': s.get('STORE') or s.get('name'), 'address': s.get('address'),
+                                'is_active': s.get('is_active'), 'reason': reason} for s, reason in losers],
+            'repoint':        repoint,
+            'delete':         delete,
+        })
+    return plan
+
+
+def _sql_list(ids):
+    return ', '.join(f"'{i}'" for i in ids)
+
+
+def plan_sql(plan: list) -> str:
+    """Merge script: repoint references, delete colliding ones, deactivate merged stores."""
+    lines = ['-- ========================================',
+             '-- Merge duplicate stores (generated by stores/store_duplicates.py)',
+             f'-- {len(plan)} clusters, {sum(len(c["merge"]) for c in plan)} stores to deactivate',
+             '-- Review the plan JSON before running',
+             '-- ========================================', '', 'BEGIN;', '']
+    for c in plan:
+        lines.append(f"-- {c['survivor_store'] or c['address']} ({c['survivor_id']}) <- {_sql_list(m['id'] for m in c['merge'])}")
+        for table in ('job_store_skus', 'brand_stores'):
+            if c['delete'][table]:
+                lines.append(f"DELETE FROM {table} WHERE id IN ({_sql_list(c['delete'][table])});")
+        for table in ('job_store_skus', 'job_submissions', 'brand_stores'):
+            if c['repoint'][table]:
+                lines.append(f"UPDATE {table} SET store_id = '{c['survivor_id']}' WHERE id IN ({_sql_list(c['repoint'][table])});")
+        lines.append(f"UPDATE stores SET is_active = FALSE, updated_at = NOW() "
+                     f"WHERE id IN ({_sql_list(m['id'] for m in c['merge'])});")
+        lines.append('')
+    lines += ['COMMIT;', '']
+    return '\n'.join(lines)
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find duplicate stores and write a merge plan.')
+    parser.add_argument('--stores-json', help='read stores from a JSON array instead of Supabase')
+    parser.add_argument('--plan', default='store-duplicate-merge-plan.json')
+    parser.add_argument('--sql', help='also write a merge script')
+    parser.add_argument('--no-references', action='store_true', help='skip loading job/brand references')
+    args = parser.parse_args()
+
+    client = None
+    if args.stores_json:
+        with open(args.stores_json) as f:
+            stores = json.load(f)
+    else:
+        from store_loader import load_stores, supabase_from_env
+        client = supabase_from_env()
+        print("📥 Loading stores from Supabase...")
+        stores = load_stores(client, STORE_COLUMNS, progress=True)
+
+    started = time.perf_counter()
+    clusters = find_clusters(stores)
+    elapsed = time.perf_counter() - started
+    print(f"🔍 {len(stores)} stores, {len(clusters)} duplicate clusters "
+          f"({sum(len(c) - 1 for c in clusters)} stores to merge) in {elapsed:.2f}s")
+
+    references = None
+    if client is not None and not args.no_references and clusters:
+        references = load_references(client, (s['id'] for c in clusters for s, _ in c))
+    elif client is None and not args.no_references:
+        print("  Warning: no Supabase client, merge plan has no reference updates", file=sys.stderr)
+    plan = merge_plan(clusters, references)
+
+    with open(args.plan, 'w') as f:
+        json.dump(plan, f, indent=2)
+    print(f"💾 Merge plan saved to: {args.plan}")
+    if args.sql:
+        with open(args.sql, 'w') as f:
+            f.write(plan_sql(plan))
+        print(f"💾 Merge script saved to: {args.sql}")
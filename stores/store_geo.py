@@ -0,0 +1,317 @@
+"""
+Store Spatial Index
+Answers "which active stores of banner X are within N miles of this point /
+ZIP" and "the k nearest stores" without scanning the stores table.
+
+Stores are placed in a KD-tree over their positions on the unit sphere
+(x, y, z), where straight-line (chord) distance orders points exactly like
+great-circle distance, so the tree needs no special cases for longitude
+wrap or high latitudes. Results are reported in haversine miles. Filtered
+queries (banner_id, active only) use a tree of just the matching stores,
+built on first use and cached, so a sparse banner does not pay for the
+dense ones.
+
+ZIP lookups use the centroid of the stores in that ZIP5 unless a ZIP
+centroid file (zip,latitude,longitude CSV) is supplied.
+
+Usage:
+    from store_geo import StoreSpatialIndex
+    index = StoreSpatialIndex.from_supabase(supabase)
+    index.within(30.27, -97.74, miles=10, banner_id=heb_id)   # [(miles, store), ...]
+    index.nearest(*index.point_for('78703'), k=5)
+
+    python3 store_geo.py 78703 --miles 10 [--banner-id ID] [--include-inactive]
+    python3 store_geo.py 30.27,-97.74 --nearest 5 [--stores stores.json | --store-table stores.sast]
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import math
+import sys
+import time
+from collections import defaultdict
+
+from store_loader import extract_zip5, store_coordinates
+
+EARTH_RADIUS_MI = 3958.8
+LEAF_SIZE       = 16
+
+STORE_COLUMNS = 'id, STORE, name, banner, banner_id, address, city, state, zip_code, latitude, longitude, is_active'
+
+
+def haversine_mi(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MI * math.asin(min(1.0, math.sqrt(a)))
+
+
+def unit_vector(lat: float, lon: float) -> tuple:
+    p, l = math.radians(lat), math.radians(lon)
+    return (math.cos(p) * math.cos(l), math.cos(p) * math.sin(l), math.sin(p))
+
+
+def chord_to_miles(chord: float) -> float:
+    return 2 * EARTH_RADIUS_MI * math.asin(min(1.0, chord / 2))
+
+
+def miles_to_chord(miles: float) -> float:
+    return 2 * math.sin(min(math.pi, miles / EARTH_RADIUS_MI) / 2)
+
+
+class KDTree:
+    """
+    Static 3-d tree over a list of points. Nodes live in flat lists:
+    an inner node splits on axis at value; a leaf holds up to LEAF_SIZE ids.
+    """
+
+    def __init__(self, points: list, ids: list, leaf_size: int = LEAF_SIZE):
+        self.points    = points
+        self.leaf_size = leaf_size
+        self.axis, self.value, self.left, self.right, self.leaf = [], [], [], [], []
+        self.root = self._build(list(ids)) if ids else None
+
+    def _node(self, axis=-1, value=0.0, leaf=None):
+        self.axis.append(axis)
+        self.value.append(value)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.leaf.append(leaf)
+        return len(self.axis) - 1
+
+    def _build(self, ids):
+        if len(ids) <= self.leaf_size:
+            return self._node(leaf=ids)
+        pts = self.points
+        spans = [max(pts[i][a] for i in ids) - min(pts[i][a] for i in ids) for a in range(3)]
+        axis = spans.index(max(spans))
+        ids.sort(key=lambda i: pts[i][axis])
+        mid = len(ids) // 2
+        node = self._node(axis, pts[ids[mid]][axis])
+        self.left[node] = self._build(ids[:mid])
+        self.right[node] = self._build(ids[mid:])
+        return node
+
+    def nearest(self, q, k: int, max_d2: float = float('inf')) -> list:
+        """[(squared chord, id)] of the k nearest points, nearest first."""
+        heap = []   # max-heap of (-d2, id)
+        pts, axis_, value, left, right, leaf = self.points, self.axis, self.value, self.left, self.right, self.leaf
+        qx, qy, qz = q
+
+        def visit(node):
+            ids = leaf[node]
+            if ids is not None:
+                for i in ids:
+                    p = pts[i]
+                    d2 = (p[0] - qx) ** 2 + (p[1] - qy) ** 2 + (p[2] - qz) ** 2
+                    if d2 > max_d2:
+                        continue
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-d2, i))
+                    elif d2 < -heap[0][0]:
+                        heapq.heapreplace(heap, (-d2, i))
+                return
+            diff = q[axis_[node]] - value[node]
+            near, far = (left[node], right[node]) if diff < 0 else (right[node], left[node])
+            visit(near)
+            bound = -heap[0][0] if len(heap) == k else max_d2
+            if diff * diff <= bound:
+                visit(far)
+
+        if self.root is not None and k > 0:
+            visit(self.root)
+        return sorted((-d2, i) for d2, i in heap)
+
+    def within(self, q, max_d2: float) -> list:
+        """[(squared chord, id)] of every point within sqrt(max_d2)."""
+        hits = []
+        pts, axis_, value, left, right, leaf = self.points, self.axis, self.value, self.left, self.right, self.leaf
+        qx, qy, qz = q
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            ids = leaf[node]
+            if ids is not None:
+                for i in ids:
+                    p = pts[i]
+                    d2 = (p[0] - qx) ** 2 + (p[1] - qy) ** 2 + (p[2] - qz) ** 2
+                    if d2 <= max_d2:
+                        hits.append((d2, i))
+                continue
+            diff = q[axis_[node]] - value[node]
+            near, far = (left[node], right[node]) if diff < 0 else (right[node], left[node])
+            stack.append(near)
+            if diff * diff <= max_d2:
+                stack.append(far)
+        return hits
+
+
+class StoreSpatialIndex:
+    def __init__(self, stores: list, zip_points: dict = None):
+        self.stores  = []
+        self.points  = []
+        self.skipped = 0   # rows without usable coordinates
+        by_zip = defaultdict(list)
+        for store in stores:
+            point = store_coordinates(store)
+            if point is None:
+                self.skipped += 1
+                continue
+            zip5 = extract_zip5(store.get('zip_code') or store.get('zip5'))
+            if zip5:
+                by_zip[zip5].append(point)
+            self.stores.append(store)
+            self.points.append(unit_vector(*point))
+        self._trees = {}
+
+        self.zip_points = dict(zip_points or {})
+        for zip5, members in by_zip.items():
+            self.zip_points.setdefault(zip5, (sum(p[0] for p in members) / len(members),
+                                              sum(p[1] for p in members) / len(members)))
+
+    @classmethod
+    def from_supabase(cls, client, **kwargs) -> 'StoreSpatialIndex':
+        from store_loader import load_stores
+        return cls(load_stores(client, STORE_COLUMNS), **kwargs)
+
+    @classmethod
+    def from_table(cls, table, zip_points: dict = None) -> 'StoreSpatialIndex':
+        """
+        Index over a store_table.StoreTable. Positions come straight from its
+        coordinate columns and store rows are decoded only when a query
+        returns (or filters on) them, so workers keep no copy of the rows.
+        """
+        import numpy as np
+        lat, lon = table.array('latitude'), table.array('longitude')
+        rows = np.flatnonzero(~np.isnan(lat))
+        index = cls([], zip_points)
+        index.stores  = _TableRows(table, rows)
+        index.points  = [unit_vector(a, o) for a, o in zip(lat[rows].tolist(), lon[rows].tolist())]
+        index.skipped = len(table) - len(rows)
+        zip_codes = table.array('col:zip_code')[rows]
+        by_zip = defaultdict(list)   # zip5 -> interned zip_code strings ('78703', '78703-1234', ...)
+        for code in np.unique(zip_codes).tolist():
+            by_zip[extract_zip5(table.string(code))].append(code)
+        by_zip.pop('', None)
+        for zip5, codes in by_zip.items():
+            if zip5 not in index.zip_points:
+                members = rows[np.isin(zip_codes, codes)]
+                index.zip_points[zip5] = (float(lat[members].mean()), float(lon[members].mean()))
+        return index
+
+    def __len__(self):
+        return len(self.stores)
+
+    def _tree(self, banner_id, active_only) -> KDTree:
+        key = (banner_id, active_only)
+        tree = self._trees.get(key)
+        if tree is None:
+            ids = [i for i, s in enumerate(self.stores)
+                   if (banner_id is None or s.get('banner_id') == banner_id)
+                   and (not active_only or s.get('is_active') is not False)]
+            tree = self._trees[key] = KDTree(self.points, ids)
+        return tree
+
+    def point_for(self, location):
+        """(lat, lon) for a ZIP5 string, a 'lat,lon' string or a (lat, lon) pair."""
+        if isinstance(location, (tuple, list)):
+            return float(location[0]), float(location[1])
+        text = str(location).strip()
+        if ',' in text:
+            lat, lon = text.split(',', 1)
+            return float(lat), float(lon)
+        zip5 = extract_zip5(text)
+        if zip5 not in self.zip_points:
+            raise KeyError(f'No coordinates for ZIP {text}')
+        return self.zip_points[zip5]
+
+    # ── Queries ───────────────────────────────────────────────────────────────
+    def within(self, lat: float, lon: float, miles: float, banner_id=None, active_only: bool = True,
+               limit: int = None) -> list:
+        """Stores within miles of (lat, lon), nearest first, as [(miles, store)]."""
+        hits = self._tree(banner_id, active_only).within(unit_vector(lat, lon), miles_to_chord(miles) ** 2)
+        hits.sort()
+        if limit is not None:
+            hits = hits[:limit]
+        return [(chord_to_miles(math.sqrt(d2)), self.stores[i]) for d2, i in hits]
+
+    def nearest(self, lat: float, lon: float, k: int = 1, banner_id=None, active_only: bool = True,
+                max_miles: float = None) -> list:
+        """The k nearest stores to (lat, lon), nearest first, as [(miles, store)]."""
+        max_d2 = miles_to_chord(max_miles) ** 2 if max_miles is not None else float('inf')
+        hits = self._tree(banner_id, active_only).nearest(unit_vector(lat, lon), k, max_d2)
+        return [(chord_to_miles(math.sqrt(d2)), self.stores[i]) for d2, i in hits]
+
+
+class _TableRows:
+    """Sequence of StoreTable rows, decoded on access."""
+
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows  = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        return self.table.row(int(self.rows[i]))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def load_zip_points(path: str) -> dict:
+    """zip,latitude,longitude CSV -> {zip5: (lat, lon)}"""
+    points = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            zip5 = extract_zip5(row.get('zip') or row.get('zip_code'))
+            if zip5:
+                points[zip5] = (float(row['latitude']), float(row['longitude']))
+    return points
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find stores near a ZIP or lat,lon.')
+    parser.add_argument('location', help="ZIP5 or 'lat,lon'")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--miles', type=float, default=None, help='radius search')
+    group.add_argument('--nearest', type=int, default=None, help='k-nearest search (default 5)')
+    parser.add_argument('--banner-id', default=None)
+    parser.add_argument('--include-inactive', action='store_true')
+    parser.add_argument('--stores', help='read stores from a JSON array instead of Supabase')
+    parser.add_argument('--store-table', help='read stores from a store_table.py file instead of Supabase')
+    parser.add_argument('--zip-centroids', help='zip,latitude,longitude CSV')
+    args = parser.parse_args()
+
+    zip_points = load_zip_points(args.zip_centroids) if args.zip_centroids else None
+    started = time.perf_counter()
+    if args.store_table:
+        from store_table import StoreTable
+        index = StoreSpatialIndex.from_table(StoreTable.open(args.store_table), zip_points)
+    else:
+        if args.stores:
+            with open(args.stores) as f:
+                rows = json.load(f)
+        else:
+            from store_loader import load_stores, supabase_from_env
+            rows = load_stores(supabase_from_env(), STORE_COLUMNS)
+        started = time.perf_counter()
+        index = StoreSpatialIndex(rows, zip_points=zip_points)
+    index._tree(args.banner_id, not args.include_inactive)
+    print(f"Indexed {len(index)} stores in {(time.perf_counter() - started) * 1000:.0f}ms "
+          f"({index.skipped} without coordinates)", file=sys.stderr)
+
+    lat, lon = index.point_for(args.location)
+    started = time.perf_counter()
+    if args.miles is not None:
+        results = index.within(lat, lon, args.miles, args.banner_id, not args.include_inactive)
+    else:
+        results = index.nearest(lat, lon, args.nearest or 5, args.banner_id, not args.include_inactive)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    for miles, store in results:
+        print(f"{miles:7.2f} mi  {store.get('STORE') or store.get('name')}  ({store.get('address')}, {store.get('city')}, {store.get('state')})")
+    print(f"{len(results)} stores in {elapsed:.2f}ms", file=sys.stderr)
@@ -0,0 +1,296 @@
+"""
+Store Geocoder
+Fills in latitude/longitude for stores that have an address but no
+coordinates, so new stores are routable (store_geo.py, route_planner.py)
+the day they are imported.
+
+Addresses are keyed by address_key() (lowercased street, city, state and
+ZIP5 with punctuation and extra spaces removed) and every answer, found or
+not, is kept in a JSON-lines cache file with the backend that gave it. A
+batch geocodes only the unique keys that are neither on the store nor
+answered in the cache for this backend, so re-imports never look up a known
+address twice. A cached point is reused only by a backend no more precise
+than the one that found it (PRECISION), so Census runs replace ZIP
+centroids; a not-found answer is only reused by its own backend, and only
+for NOT_FOUND_TTL_S. Lookups go to a pluggable backend in batches, on a
+few threads, no faster than the backend's rate:
+
+    CensusGeocoder         US Census batch geocoder (no key, up to 10k rows a request)
+    ZipCentroidGeocoder    ZIP5 centroids from a zip,latitude,longitude CSV; offline
+
+A backend is any object with name, batch_size, rate (batches per second)
+and geocode(queries) -> [(lat, lon) or None] in query order.
+
+Usage:
+    from store_geocoder import GeocodeCache, CensusGeocoder, geocode_stores
+    stats = geocode_stores(new_stores, CensusGeocoder(), GeocodeCache('store-geocode-cache.jsonl'))
+
+    python3 store_geocoder.py [--cache store-geocode-cache.jsonl] [--zip-centroids zips.csv] [--dry-run]
+                              [--retry-not-found]
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from store_loader import extract_zip5, normalize_state, store_coordinates
+
+CACHE_FILE    = 'store-geocode-cache.jsonl'
+CENSUS_URL    = 'https://geocoding.geo.census.gov/geocoder/locations/addressbatch'
+GEOCODE_COLUMNS = 'id, address, city, state, zip_code, latitude, longitude'
+PRECISION     = {'zip_centroid': 0, 'census': 1}   # higher replaces lower; unknown backends rank as census
+NOT_FOUND_TTL_S = 30 * 86400                       # retry addresses a backend could not find after this
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+# ── Keys ──────────────────────────────────────────────────────────────────────
+def _clean(text) -> str:
+    return _NON_ALNUM.sub(' ', str(text or '').lower()).strip()
+
+
+def address_key(address: str, city: str, state: str, zip_code) -> str:
+    """Cache key for one street address: street|city|ST|zip5, or '' when there is no street."""
+    street = _clean(address)
+    if not street:
+        return ''
+    return '|'.join((street, _clean(city), normalize_state(state), extract_zip5(zip_code)))
+
+
+def store_query(store: dict) -> dict:
+    """The geocoder query for a stores row (or new-store dict)."""
+    return {
+        'key':     address_key(store.get('address'), store.get('city'), store.get('state'), store.get('zip_code')),
+        'address': (store.get('address') or '').strip(),
+        'city':    (store.get('city') or '').strip(),
+        'state':   normalize_state(store.get('state') or ''),
+        'zip5':    extract_zip5(store.get('zip_code') or ''),
+    }
+
+
+# ── Cache ─────────────────────────────────────────────────────────────────────
+def _precision(source: str) -> int:
+    return PRECISION.get(source, PRECISION['census'])
+
+
+class GeocodeCache:
+    """
+    {address key: {backend: ((lat, lon) or None, answered at)}}, persisted as
+    one JSON line per answer. Appends are flushed as they happen, so an
+    interrupted run keeps what it resolved; the last line for a key and
+    backend wins.
+    """
+
+    def __init__(self, path: str = CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue   # torn last line from an interrupted run
+                    point = entry.get('point')
+                    self.entries.setdefault(entry['key'], {})[entry.get('source') or 'census'] = \
+                        (tuple(point) if point else None, entry.get('at') or 0)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def answer(self, key: str, source: str, not_found_ttl: float = NOT_FOUND_TTL_S) -> tuple:
+        """
+        (answered, point) for a lookup through backend source: the most
+        precise point from source or a more precise backend, else source's
+        own not-found answer while it is younger than not_found_ttl seconds.
+        """
+        answers = self.entries.get(key) or {}
+        found = [(_precision(s), point) for s, (point, _) in answers.items()
+                 if point and _precision(s) >= _precision(source)]
+        if found:
+            return True, max(found)[1]
+        point, at = answers.get(source, (None, None))
+        if at is not None and time.time() - at < not_found_ttl:
+            return True, None
+        return False, None
+
+    def put_many(self, answers: dict, source: str):
+        """Record {key: (lat, lon) or None} from one backend batch."""
+        at = round(time.time())
+        with self.lock:
+            for key, point in answers.items():
+                self.entries.setdefault(key, {})[source] = (point, at)
+            if self.path:
+                with open(self.path, 'a') as f:
+                    for key, point in answers.items():
+                        f.write(json.dumps({'key': key, 'point': list(point) if point else None,
+                                            'source': source, 'at': at}) + '\n')
+
+
+# ── Backends ──────────────────────────────────────────────────────────────────
+class CensusGeocoder:
+    """US Census Bureau batch address geocoder (public, no API key)."""
+
+    name = 'census'
+
+    def __init__(self, batch_size: int = 1000, rate: float = 1.0, timeout: int = 300,
+                 benchmark: str = 'Public_AR_Current', session=None):
+        import requests
+        self.batch_size = batch_size
+        self.rate       = rate
+        self.timeout    = timeout
+        self.benchmark  = benchmark
+        self.session    = session or requests.Session()
+
+    def geocode(self, queries: list) -> list:
+        body = io.StringIO()
+        writer = csv.writer(body)
+        for n, q in enumerate(queries):
+            writer.writerow([n, q['address'], q['city'], q['state'], q['zip5']])
+        resp = self.session.post(CENSUS_URL, data={'benchmark': self.benchmark},
+                                 files={'addressFile': ('stores.csv', body.getvalue(), 'text/csv')},
+                                 timeout=self.timeout)
+        resp.raise_for_status()
+        points = [None] * len(queries)
+        # id, input address, Match/No_Match/Tie, Exact/Non_Exact, matched address, "lon,lat", tiger id, side
+        for row in csv.reader(io.StringIO(resp.text)):
+            if len(row) >= 6 and row[2] == 'Match' and row[5]:
+                lon, lat = (float(v) for v in row[5].split(','))
+                points[int(row[0])] = (round(lat, 6), round(lon, 6))
+        return points
+
+
+class ZipCentroidGeocoder:
+    """ZIP5 centroid for each address; needs no network, good to a few miles."""
+
+    name = 'zip_centroid'
+
+    def __init__(self, zip_points: dict, batch_size: int = 5000, rate: float = 0.0):
+        self.zip_points = zip_points
+        self.batch_size = batch_size
+        self.rate       = rate
+
+    @classmethod
+    def from_csv(cls, path: str, **kwargs):
+        from store_geo import load_zip_points
+        return cls(load_zip_points(path), **kwargs)
+
+    def geocode(self, queries: list) -> list:
+        return [self.zip_points.get(q['zip5']) for q in queries]
+
+
+class _RateLimiter:
+    """Spaces batch starts at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_at  = 0.0
+        self.lock     = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_at)
+            self.next_at = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+# ── Batch stage ───────────────────────────────────────────────────────────────
+def geocode_stores(stores: list, geocoder, cache: GeocodeCache, workers: int = 4, progress: bool = False,
+                   not_found_ttl: float = NOT_FOUND_TTL_S) -> dict:
+    """
+    Set latitude/longitude in place on the stores that have an address but
+    no coordinates. Each unique address the cache has no answer for (see
+    GeocodeCache.answer; not_found_ttl=0 retries every not-found address) is
+    sent to the geocoder once; a failed batch is left out of the cache so
+    the next run retries it.
+    """
+    stats = {'missing': 0, 'cached': 0, 'looked_up': 0, 'found': 0, 'not_found': 0, 'failed': 0}
+    waiting = {}   # key -> [stores]
+    queries = {}
+    for store in stores:
+        if store_coordinates(store):
+            continue
+        query = store_query(store)
+        if not query['key']:
+            continue
+        stats['missing'] += 1
+        waiting.setdefault(query['key'], []).append(store)
+        if not cache.answer(query['key'], geocoder.name, not_found_ttl)[0]:
+            queries.setdefault(query['key'], query)
+    stats['cached'] = len(waiting) - len(queries)
+
+    todo = list(queries.values())
+    batches = [todo[i:i + geocoder.batch_size] for i in range(0, len(todo), geocoder.batch_size)]
+    limiter = _RateLimiter(geocoder.rate)
+
+    def run(batch):
+        limiter.wait()
+        return batch, geocoder.geocode(batch)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as pool:
+        for future in as_completed([pool.submit(run, b) for b in batches]):
+            try:
+                batch, points = future.result()
+            except Exception as e:
+                print(f"  Warning: geocoding batch failed: {e}", file=sys.stderr)
+                stats['failed'] += 1
+                continue
+            cache.put_many({q['key']: p for q, p in zip(batch, points)}, geocoder.name)
+            stats['looked_up'] += len(batch)
+            if progress:
+                print(f"   Geocoded {stats['looked_up']}/{len(todo)} addresses...", end='\r')
+    if progress and todo:
+        print()
+
+    for key, rows in waiting.items():
+        answered, point = cache.answer(key, geocoder.name, not_found_ttl)
+        if not answered:
+            continue
+        stats['found' if point else 'not_found'] += len(rows)
+        if point:
+            for store in rows:
+                store['latitude'], store['longitude'] = point
+    return stats
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Geocode stores that have an address but no coordinates.')
+    parser.add_argument('--cache', default=CACHE_FILE)
+    parser.add_argument('--zip-centroids', help='use ZIP centroids from this CSV instead of the Census geocoder')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent geocoder batches')
+    parser.add_argument('--dry-run', action='store_true', help='geocode and cache, but do not update stores')
+    parser.add_argument('--retry-not-found', action='store_true', help='look up again addresses cached as not found')
+    args = parser.parse_args()
+
+    from store_loader import load_stores, supabase_from_env
+    client = supabase_from_env()
+    print("📥 Loading stores from Supabase...")
+    stores = [s for s in load_stores(client, GEOCODE_COLUMNS, progress=True) if not store_coordinates(s)]
+    geocoder = ZipCentroidGeocoder.from_csv(args.zip_centroids) if args.zip_centroids else CensusGeocoder()
+    cache = GeocodeCache(args.cache)
+    print(f"🌎 Geocoding {len(stores)} stores without coordinates ({len(cache)} addresses cached)...")
+    stats = geocode_stores(stores, geocoder, cache, args.workers, progress=True,
+                           not_found_ttl=0 if args.retry_not_found else NOT_FOUND_TTL_S)
+    print(f"✅ {stats['found']} located, {stats['not_found']} not found "
+          f"({stats['cached']} addresses from cache, {stats['looked_up']} looked up, {stats['failed']} batches failed)")
+    if args.dry_run:
+        sys.exit(0)
+    updated = 0
+    for store in stores:
+        if store_coordinates(store):
+            client.table('stores').update({'latitude': store['latitude'], 'longitude': store['longitude']}) \
+                .eq('id', store['id']).execute()
+            updated += 1
+    print(f"💾 Updated coordinates on {updated} stores")
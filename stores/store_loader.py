@@ -0,0 +1,114 @@
+"""
+Store Loader
+The store normalization rules and the paginated stores load used by
+store-reconciliation-import.py, shared so that every store tool keys and
+loads stores exactly the way the importer does.
+
+Match key:  banner|address|city|state|zip5   (see normalize_* below)
+
+Usage:
+    from store_loader import supabase_from_env, load_stores, match_key
+    stores = load_stores(supabase_from_env())
+"""
+
+import os
+import re
+
+PAGE_SIZE = 1000
+
+_STREET_SUFFIXES = re.compile(r'\b(st|street|rd|road|ave|avenue|blvd|boulevard|dr|drive|ln|lane|ct|court|pl|place)\b')
+_UNIT            = re.compile(r'\b(ste|suite|unit|#)\s*\d*\b')
+
+
+# ── Normalization ─────────────────────────────────────────────────────────────
+def normalize_banner(banner: str) -> str:
+    """Normalize banner for matching (lowercase, trimmed)"""
+    return (banner or '').strip().lower()
+
+
+def normalize_address(address: str) -> str:
+    """Normalize address for matching"""
+    if not address:
+        return ''
+    # Remove extra whitespace, lowercase
+    addr = re.sub(r'\s+', ' ', address.strip().lower())
+    # Remove common suffixes that vary (St, Street, Rd, Road, etc.)
+    addr = _STREET_SUFFIXES.sub('', addr)
+    # Remove suite/unit numbers
+    addr = _UNIT.sub('', addr)
+    # Remove punctuation
+    addr = re.sub(r'[^\w\s]', '', addr)
+    return addr.strip()
+
+
+def normalize_city(city: str) -> str:
+    """Normalize city for matching"""
+    return (city or '').strip().lower()
+
+
+def normalize_state(state: str) -> str:
+    """Normalize state (uppercase, 2 chars)"""
+    state = (state or '').strip().upper()
+    return state[:2] if len(state) >= 2 else state
+
+
+def extract_zip5(zip_code) -> str:
+    """Extract clean 5-digit ZIP code"""
+    if not zip_code:
+        return ''
+    zip_match = re.search(r'\d{5}', str(zip_code))
+    return zip_match.group(0).zfill(5) if zip_match else ''
+
+
+def match_key(store: dict) -> str:
+    """Composite match key for an existing stores row"""
+    return '|'.join((
+        normalize_banner(store.get('banner') or store.get('STORE') or ''),
+        normalize_address(store.get('address') or ''),
+        normalize_city(store.get('city') or ''),
+        normalize_state(store.get('state') or ''),
+        extract_zip5(store.get('zip_code') or ''),
+    ))
+
+
+def store_coordinates(store: dict):
+    """(lat, lon) as floats, or None when either is missing or unparseable"""
+    try:
+        lat, lon = float(store['latitude']), float(store['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        return None
+    return lat, lon
+
+
+# ── Loading ───────────────────────────────────────────────────────────────────
+def supabase_from_env():
+    """Supabase client from SUPABASE_URL and the service-role (or anon) key in the environment / .env"""
+    from dotenv import load_dotenv
+    from supabase import create_client
+    load_dotenv()
+    url = os.getenv('SUPABASE_URL')
+    key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
+    if not url or not key:
+        raise RuntimeError('SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY (or SUPABASE_ANON_KEY) must be set')
+    return create_client(url, key)
+
+
+def load_stores(client, columns: str = '*', page_size: int = PAGE_SIZE, progress: bool = False) -> list:
+    """Load all stores (no filters, no limits, paginated)"""
+    all_stores = []
+    offset = 0
+    while True:
+        response = client.table('stores').select(columns, count='exact').range(offset, offset + page_size - 1).execute()
+        if not response.data:
+            break
+        all_stores.extend(response.data)
+        if progress:
+            print(f"   Loaded {len(all_stores)} stores so far...", end='\r')
+        if len(response.data) < page_size:
+            break
+        offset += page_size
+    if progress:
+        print()  # New line after progress
+    return all_stores
@@ -0,0 +1,68 @@
+"""
+Store Sheet Match Keys
+The sheet-side half of store reconciliation: match keys for sheet rows
+(the same format as store_loader.match_key for stores rows) and the dedupe
+of rows that share one. store-reconciliation-import.py runs match_keys on a
+process pool with --workers, so these live in an importable module that
+spawned workers can unpickle.
+
+    key_fields    (row number, banner, address, city, state, zip, has Store #) per sheet row
+    match_keys    [(row number, match key, has Store #)]; the per-row cost
+    group_keys    {'groups': [(first row, match key, row kept)], 'duplicates': n}
+
+Usage:
+    from store_matching import group_records, key_fields
+    grouped = group_records([key_fields(i, record) for i, record in enumerate(records)])
+"""
+
+from typing import Dict, List, Tuple
+
+from store_loader import extract_zip5, normalize_address, normalize_banner, normalize_city, normalize_state
+
+
+def fields_match_key(banner: str, address: str, city: str, state: str, zip_code: str) -> str:
+    """Match key from raw sheet values; same format as store_loader.match_key for stores rows"""
+    return '|'.join((normalize_banner(banner), normalize_address(address), normalize_city(city),
+                     normalize_state(state), extract_zip5(zip_code)))
+
+
+def record_match_key(record) -> str:
+    return fields_match_key(record.banner, record.address, record.city, record.state, record.zip)
+
+
+def key_fields(i: int, record) -> Tuple:
+    """(row number, banner, address, city, state, zip, has Store #): all group_records needs, cheap to send to a worker"""
+    return (i, record.banner, record.address, record.city, record.state, record.zip,
+            bool(str(record.store_number or '').strip()))
+
+
+def match_keys(rows: List[Tuple]) -> List[Tuple]:
+    """[(row number, match key, has Store #)] for key_fields() tuples; the per-row cost, run in the workers"""
+    return [(i, fields_match_key(banner, address, city, state, zip_code), has_store_number)
+            for i, banner, address, city, state, zip_code, has_store_number in rows]
+
+
+def group_keys(keyed: List[Tuple]) -> Dict:
+    """
+    Dedupe match_keys() output (in sheet order) by match key.
+
+    Returns {'groups': [(row number of the group's first row, match key, row number kept)],
+    'duplicates': rows dropped}, in order of first appearance. The row kept
+    is the first one with a Store #, or the first row when none has one.
+    """
+    # Handle duplicates: one group per match key (the key alone decides the match)
+    record_groups = {}
+    for i, match_key, has_store_number in keyed:
+        record_groups.setdefault(match_key, []).append((i, has_store_number))
+
+    out = {'groups': [], 'duplicates': 0}
+    for match_key, group in record_groups.items():
+        out['duplicates'] += len(group) - 1
+        kept = next((i for i, has_store_number in group if has_store_number), group[0][0])
+        out['groups'].append((group[0][0], match_key, kept))
+    return out
+
+
+def group_records(rows: List[Tuple]) -> Dict:
+    """group_keys() for key_fields() tuples in sheet order"""
+    return group_keys(match_keys(rows))
@@ -0,0 +1,302 @@
+"""
+Store Search Index
+Builds the static store search index the job-creation store picker loads
+instead of paging the stores table: one small file per state with the
+active stores and their search postings, plus a routing table that says
+which states can match a query.
+
+    <out>/manifest.json                       current version, states, counts
+    <out>/v<version>/states/TX.json           rows + postings for one state
+    <out>/v<version>/routes.json              gram -> state indexes
+
+Rows are [id, name, banner, city, zip5, store_number, lat, lon] (see
+ROW_FIELDS; banner is a position in routes.json's banner_ids). Search text
+is the display name, city, ZIP5 and store number, lowercased, with
+punctuation inside a word dropped (H-E-B -> heb) and other punctuation
+turned into spaces. Each state file posts every
+trigram of every token plus the one- and two-character prefixes of each
+token ('^a', '^ab'), as delta-encoded lists of row positions, so any query
+substring of three or more characters (or a token start of one or two) is
+an intersection of a few lists. routes.json maps the same grams to the
+states that have them, so a search across states fetches only the state
+files that can match.
+
+Version directories are named by a hash of their content and never change
+once written, so they can be cached forever; manifest.json is the only
+file that changes and should be served without caching. The previous
+KEEP_VERSIONS versions are kept for clients that loaded an older manifest.
+
+Usage:
+    python3 store_search_index.py OUT_DIR [--stores-json stores.json]
+    python3 store_search_index.py OUT_DIR --query "heb lamar" [--state TX]
+
+    from store_search_index import build_search_index
+    manifest = build_search_index(active_stores, 'site/store-index')
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from store_loader import extract_zip5, normalize_state, store_coordinates
+
+ROW_FIELDS    = ['id', 'name', 'banner', 'city', 'zip5', 'store_number', 'lat', 'lon']
+INDEX_COLUMNS = 'id, STORE, name, banner_id, city, state, zip_code, store_number, latitude, longitude, is_active'
+KEEP_VERSIONS = 2
+UNKNOWN_STATE = 'XX'
+
+_JOINERS     = re.compile(r"(?<=[0-9a-z])['\u2019.-](?=[0-9a-z])")   # H-E-B -> heb, Joe's -> joes
+_NON_ALNUM   = re.compile(r'[^0-9a-z]+')
+_VERSION_DIR = re.compile(r'v[0-9a-f]{12}(\.tmp)?')   # v<version> and a crashed build's staging dir
+
+
+# ── Text ──────────────────────────────────────────────────────────────────────
+def search_tokens(text: str) -> list:
+    return _NON_ALNUM.sub(' ', _JOINERS.sub('', (text or '').lower())).split()
+
+
+def token_grams(token: str) -> set:
+    """Trigrams of a token plus its one- and two-character prefixes."""
+    grams = {'^' + token[:n] for n in (1, 2) if len(token) >= n}
+    grams.update(token[i:i + 3] for i in range(len(token) - 2))
+    return grams
+
+
+def query_grams(token: str) -> set:
+    """Grams a query token's matches must all contain."""
+    if len(token) < 3:
+        return {'^' + token}
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _delta(ids: list) -> list:
+    return [ids[0]] + [b - a for a, b in zip(ids, ids[1:])]
+
+
+def _undelta(deltas: list) -> list:
+    out, total = [], 0
+    for d in deltas:
+        total += d
+        out.append(total)
+    return out
+
+
+# ── Build ─────────────────────────────────────────────────────────────────────
+def _row(store: dict, banners: dict) -> list:
+    point = store_coordinates(store)
+    banner_id = store.get('banner_id')
+    return [
+        store['id'],
+        store.get('STORE') or store.get('name') or '',
+        banners.setdefault(banner_id, len(banners)) if banner_id else None,
+        store.get('city') or '',
+        extract_zip5(store.get('zip_code') or ''),
+        store.get('store_number') or '',
+        round(point[0], 5) if point else None,
+        round(point[1], 5) if point else None,
+    ]
+
+
+def _row_text(row: list) -> str:
+    return ' '.join(str(v) for v in (row[1], row[3], row[4], row[5]) if v)
+
+
+def build_state_shard(rows: list) -> dict:
+    """{'fields', 'rows', 'grams': {gram: delta-encoded positions}} for one state's rows."""
+    postings = defaultdict(list)
+    for pos, row in enumerate(rows):
+        grams = set()
+        for token in search_tokens(_row_text(row)):
+            grams |= token_grams(token)
+        for gram in grams:
+            postings[gram].append(pos)
+    return {'fields': ROW_FIELDS, 'rows': rows, 'grams': {g: _delta(ids) for g, ids in sorted(postings.items())}}
+
+
+def _dump(obj) -> bytes:
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def _write(path: str, payload: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(payload)
+    os.replace(path + '.tmp', path)
+
+
+def build_search_index(stores: list, out_dir: str, keep_versions: int = KEEP_VERSIONS) -> dict:
+    """
+    Write the index for the active stores among stores and point
+    manifest.json at it. An unchanged store set keeps the current version.
+    """
+    by_state, banners = defaultdict(list), {}
+    for store in sorted(stores, key=lambda s: str(s['id'])):
+        if store.get('is_active') is False:
+            continue
+        by_state[normalize_state(store.get('state') or '') or UNKNOWN_STATE].append(_row(store, banners))
+    states = sorted(by_state)
+    for state in states:
+        by_state[state].sort(key=lambda r: (r[1].lower(), str(r[0])))
+
+    shards = {state: _dump(build_state_shard(by_state[state])) for state in states}
+    routes = defaultdict(set)
+    for n, state in enumerate(states):
+        for row in by_state[state]:
+            for token in search_tokens(_row_text(row)):
+                for gram in token_grams(token):
+                    routes[gram].add(n)
+    routes_payload = _dump({'states': states, 'banner_ids': list(banners),
+                            'routes': {k: sorted(v) for k, v in sorted(routes.items())}})
+
+    digest = hashlib.sha256(routes_payload)
+    for state in states:
+        digest.update(shards[state])
+    version = digest.hexdigest()[:12]
+
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    previous = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    version_dir = os.path.join(out_dir, 'v' + version)
+    if not os.path.isdir(version_dir):
+        staging = version_dir + '.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        for state, payload in shards.items():
+            _write(os.path.join(staging, 'states', f'{state}.json'), payload)
+        _write(os.path.join(staging, 'routes.json'), routes_payload)
+        os.replace(staging, version_dir)
+
+    manifest = {
+        'version':  version,
+        'built_at': (previous or {}).get('built_at') if (previous or {}).get('version') == version
+                    else datetime.now(timezone.utc).isoformat(),
+        'stores':   sum(len(rows) for rows in by_state.values()),
+        'fields':   ROW_FIELDS,
+        'routes':   f'v{version}/routes.json',
+        'states':   {state: {'file': f'v{version}/states/{state}.json', 'stores': len(by_state[state]),
+                             'bytes': len(shards[state])} for state in states},
+        'previous': [v for v in [(previous or {}).get('version')] + (previous or {}).get('previous', [])
+                     if v and v != version][:keep_versions],
+    }
+    _write(manifest_path, _dump(manifest))
+
+    keep = {'v' + v for v in [version] + manifest['previous']}
+    for name in os.listdir(out_dir):
+        if _VERSION_DIR.fullmatch(name) and os.path.isdir(os.path.join(out_dir, name)) and name not in keep:
+            shutil.rmtree(os.path.join(out_dir, name))
+    return manifest
+
+
+def publish_from_supabase(client, out_dir: str) -> dict:
+    """Load the stores table and rebuild the index (the importer's last step)."""
+    from store_loader import load_stores
+    return build_search_index(load_stores(client, INDEX_COLUMNS), out_dir)
+
+
+# ── Search (same algorithm as the picker) ─────────────────────────────────────
+class StaticSearchIndex:
+    """Reads a built index the way the picker does: manifest, routes, then state files on demand."""
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        with open(os.path.join(out_dir, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self._routes = None
+        self._shards = {}
+
+    def _load(self, rel):
+        with open(os.path.join(self.out_dir, rel)) as f:
+            return json.load(f)
+
+    def shard(self, state: str) -> dict:
+        if state not in self._shards:
+            self._shards[state] = self._load(self.manifest['states'][state]['file'])
+        return self._shards[state]
+
+    def _routes_table(self):
+        if self._routes is None:
+            self._routes = self._load(self.manifest['routes'])
+        return self._routes
+
+    def banner_ids(self) -> list:
+        return self._routes_table()['banner_ids']
+
+    def states_for(self, tokens: list) -> list:
+        self._routes_table()
+        candidates = set(range(len(self._routes['states'])))
+        for token in tokens:
+            for gram in query_grams(token):
+                candidates &= set(self._routes['routes'].get(gram, ()))
+        return [self._routes['states'][n] for n in sorted(candidates)]
+
+    def search(self, query: str, state: str = None, limit: int = 50) -> list:
+        """Rows (as dicts) whose search text contains every query token, by name."""
+        tokens = search_tokens(query)
+        if not tokens:
+            return []
+        states = [normalize_state(state)] if state else self.states_for(tokens)
+        hits = []
+        for st in states:
+            if st not in self.manifest['states']:
+                continue
+            shard = self.shard(st)
+            ids = None
+            for token in tokens:
+                for gram in query_grams(token):
+                    posting = set(_undelta(shard['grams'].get(gram, [])))
+                    ids = posting if ids is None else ids & posting
+            for pos in sorted(ids or ()):
+                row = shard['rows'][pos]
+                words = search_tokens(_row_text(row))
+                text = ' '.join(words)
+                if all(token in text if len(token) >= 3 else any(w.startswith(token) for w in words)
+                       for token in tokens):
+                    hit = dict(zip(ROW_FIELDS, row), state=st)
+                    hit['banner_id'] = None if hit.pop('banner') is None else self.banner_ids()[row[2]]
+                    hits.append(hit)
+                    if len(hits) >= limit:
+                        return hits
+        return hits
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or query the static store search index.')
+    parser.add_argument('out_dir')
+    parser.add_argument('--stores-json', help='read stores from a JSON array instead of Supabase')
+    parser.add_argument('--query', help='search an existing index instead of building one')
+    parser.add_argument('--state', default=None)
+    args = parser.parse_args()
+
+    if args.query:
+        index = StaticSearchIndex(args.out_dir)
+        started = time.perf_counter()
+        hits = index.search(args.query, args.state)
+        elapsed = (time.perf_counter() - started) * 1000
+        for hit in hits:
+            print(f"{hit['name']}  ({hit['city']}, {hit['state']} {hit['zip5']})  {hit['id']}")
+        print(f"{len(hits)} stores in {elapsed:.1f}ms", file=sys.stderr)
+        sys.exit(0)
+
+    if args.stores_json:
+        with open(args.stores_json) as f:
+            stores = json.load(f)
+    else:
+        from store_loader import load_stores, supabase_from_env
+        print("📥 Loading stores from Supabase...")
+        stores = load_stores(supabase_from_env(), INDEX_COLUMNS, progress=True)
+    started = time.perf_counter()
+    manifest = build_search_index(stores, args.out_dir)
+    total_bytes = sum(s['bytes'] for s in manifest['states'].values())
+    print(f"✅ {manifest['stores']} active stores in {len(manifest['states'])} state files "
+          f"({total_bytes / 1e6:.1f} MB, largest {max((s['bytes'] for s in manifest['states'].values()), default=0) / 1e6:.2f} MB) "
+          f"in {time.perf_counter() - started:.1f}s")
+    print(f"💾 Search index v{manifest['version']} saved to: {args.out_dir}")
@@ -0,0 +1,299 @@
+"""
+Store Table File
+The stores reference table written once to a memory-mapped columnar file,
+so process-pool workers (parallel matching, store_geo lookups, report
+payloads) open it zero-copy instead of each loading and parsing every
+store from Supabase.
+
+    magic       b'SASTORE1', then a uint32 header length and the JSON header
+    ids         uint8[n, 16] UUID bytes (or fixed-width S<n> text ids)
+    id_hash     uint64[n]  sorted blake2b-64 hashes of the ids; id_order[i] is the row of id_hash[i]
+    key_hash    uint64[n]  the same for store_loader.match_key (key_order)
+    latitude    float64[n] NaN when missing (longitude likewise)
+    is_active   int8[n]    1, 0, or -1 for NULL
+    <column>    uint32[n]  codes into one interned string table (0 is NULL)
+    strings     uint64 offsets into one UTF-8 blob
+
+Every section is 64-byte aligned and read with numpy.frombuffer over a
+read-only mmap, so opening the file costs the header parse, pages are
+shared through the page cache by every process that maps it, and nothing
+is decoded until a row is asked for. Lookups by id or match key are a
+binary search over the sorted hashes, confirmed against the row.
+
+The file is written to a temporary name and renamed into place, so a
+rebuild never changes a file that workers have open. Long-running readers
+call refresh() (a stat) to pick up a rebuilt file; an open table keeps
+serving the rows it was opened with.
+
+Usage:
+    from store_table import StoreTable, write_store_table
+    write_store_table(load_stores(client, TABLE_COLUMNS), 'stores.sast')
+    table = StoreTable.open('stores.sast')      # in each worker
+    table.get(store_id)                          # {'id', 'STORE', 'banner', ...} or None
+    table.find(match_key(row))                   # row number or -1
+    table = table.refresh()                      # reopened if the file was rebuilt
+
+    python3 store_table.py build stores.sast [--stores stores.json]
+    python3 store_table.py info stores.sast
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+from store_loader import match_key, store_coordinates
+
+MAGIC        = b'SASTORE1'
+ALIGN        = 64
+TEXT_COLUMNS = ['STORE', 'name', 'banner', 'banner_id', 'store_chain', 'address', 'city', 'state',
+                'zip_code', 'metro', 'store_number', 'phone']
+TABLE_COLUMNS = 'id, ' + ', '.join(TEXT_COLUMNS) + ', latitude, longitude, is_active'
+TABLE_FILE   = 'stores.sast'
+
+
+def text_hash(text: str) -> int:
+    """64-bit hash that is the same in every process (unlike hash())."""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'little')
+
+
+def _file_stamp(stat) -> tuple:
+    # a rebuild renames a new file into place, so the inode changes even within one mtime tick
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _uuid_bytes(ids: list):
+    try:
+        return [uuid.UUID(str(i)).bytes for i in ids]
+    except ValueError:
+        return None
+
+
+# ── Writing ───────────────────────────────────────────────────────────────────
+def write_store_table(stores: list, path: str = TABLE_FILE) -> dict:
+    """Write stores rows (any columns; missing ones are NULL) to path and return the header."""
+    n = len(stores)
+    ids = [str(s['id']) for s in stores]
+    raw_ids = _uuid_bytes(ids)
+    if raw_ids is not None:
+        id_kind, id_array = 'uuid', np.frombuffer(b''.join(raw_ids), dtype=np.uint8).reshape(n, 16)
+    else:
+        width = max((len(i.encode()) for i in ids), default=1)
+        id_kind, id_array = 'text', np.array([i.encode() for i in ids], dtype=f'S{width}')
+
+    pool, strings = {}, [b'']   # code 0 is NULL
+    codes = {}
+    for col in TEXT_COLUMNS:
+        column = np.zeros(n, dtype=np.uint32)
+        for r, store in enumerate(stores):
+            value = store.get(col)
+            if value is None:
+                continue
+            value = str(value)
+            code = pool.get(value)
+            if code is None:
+                code = pool[value] = len(strings)
+                strings.append(value.encode())
+            column[r] = code
+        codes[col] = column
+    offsets = np.zeros(len(strings) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in strings], out=offsets[1:])
+
+    points = [store_coordinates(s) for s in stores]
+    id_hash  = np.array([text_hash(i) for i in ids], dtype=np.uint64)
+    key_hash = np.array([text_hash(match_key(s)) for s in stores], dtype=np.uint64)
+    id_order, key_order = np.argsort(id_hash, kind='stable'), np.argsort(key_hash, kind='stable')
+    sections = {
+        'ids':       id_array,
+        'id_hash':   id_hash[id_order],
+        'id_order':  id_order.astype(np.uint32),
+        'key_hash':  key_hash[key_order],
+        'key_order': key_order.astype(np.uint32),
+        'latitude':  np.array([p[0] if p else np.nan for p in points], dtype=np.float64),
+        'longitude': np.array([p[1] if p else np.nan for p in points], dtype=np.float64),
+        'is_active': np.array([-1 if s.get('is_active') is None else int(bool(s['is_active'])) for s in stores],
+                              dtype=np.int8),
+        **{f'col:{col}': codes[col] for col in TEXT_COLUMNS},
+        'str_offsets': offsets,
+        'str_blob':  np.frombuffer(b''.join(strings), dtype=np.uint8),
+    }
+
+    layout, position = {}, 0
+    for name, array in sections.items():
+        layout[name] = {'offset': position, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        position += -(-array.nbytes // ALIGN) * ALIGN
+    header = {'version': 1, 'rows': n, 'id_kind': id_kind, 'columns': TEXT_COLUMNS, 'strings': len(strings),
+              'built_at': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'sections': layout}
+    blob = json.dumps(header).encode()
+    data_start = -(-(len(MAGIC) + 4 + len(blob)) // ALIGN) * ALIGN
+
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + len(blob).to_bytes(4, 'little') + blob)
+        for name, array in sections.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + position)
+    os.replace(tmp, path)
+    return header
+
+
+# ── Reading ───────────────────────────────────────────────────────────────────
+class StoreTable:
+    """Read-only view of a store table file; cheap to open in every worker."""
+
+    def __init__(self, buffer, header: dict, data_start: int, path: str = None, stamp: tuple = None):
+        self.header  = header
+        self.columns = header['columns']
+        self.path    = path
+        self._stamp  = stamp
+        self._buf    = buffer
+        self._data   = data_start
+        self._arrays = {}
+
+    @classmethod
+    def open(cls, path: str = TABLE_FILE) -> 'StoreTable':
+        with open(path, 'rb') as f:
+            stamp = _file_stamp(os.fstat(f.fileno()))
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a store table file')
+        size = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 4], 'little')
+        header = json.loads(buffer[len(MAGIC) + 4:len(MAGIC) + 4 + size])
+        data_start = -(-(len(MAGIC) + 4 + size) // ALIGN) * ALIGN
+        return cls(buffer, header, data_start, path, stamp)
+
+    def refresh(self) -> 'StoreTable':
+        """This table, or the file opened again if it has been rebuilt since."""
+        if self.path is None:
+            return self
+        try:
+            stamp = _file_stamp(os.stat(self.path))
+        except OSError:
+            return self   # mid-rename or removed: keep serving what is mapped
+        return self if stamp == self._stamp else StoreTable.open(self.path)
+
+    def __len__(self) -> int:
+        return self.header['rows']
+
+    def array(self, name: str) -> np.ndarray:
+        """A section as a read-only numpy view of the mapped file."""
+        array = self._arrays.get(name)
+        if array is None:
+            spec = self.header['sections'][name]
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'])) if spec['shape'] else 1
+            array = np.frombuffer(self._buf, dtype=dtype, count=count,
+                                  offset=self._data + spec['offset']).reshape(spec['shape'])
+            self._arrays[name] = array
+        return array
+
+    def string(self, code: int):
+        if not code:
+            return None
+        offsets = self.array('str_offsets')
+        start = self._data + self.header['sections']['str_blob']['offset']
+        return self._buf[start + int(offsets[code]):start + int(offsets[code + 1])].decode()
+
+    def id_of(self, row: int) -> str:
+        raw = self.array('ids')[row]
+        return str(uuid.UUID(bytes=raw.tobytes())) if self.header['id_kind'] == 'uuid' else raw.decode()
+
+    def value(self, row: int, column: str):
+        return self.string(int(self.array(f'col:{column}')[row]))
+
+    def coordinates(self, row: int):
+        lat, lon = self.array('latitude')[row], self.array('longitude')[row]
+        return None if np.isnan(lat) else (float(lat), float(lon))
+
+    def row(self, row: int) -> dict:
+        """One stores row as a dict, like load_stores returns it."""
+        out = {'id': self.id_of(row)}
+        for column in self.columns:
+            out[column] = self.value(row, column)
+        point = self.coordinates(row)
+        out['latitude'], out['longitude'] = point if point else (None, None)
+        active = int(self.array('is_active')[row])
+        out['is_active'] = None if active < 0 else bool(active)
+        return out
+
+    def rows(self):
+        for r in range(len(self)):
+            yield self.row(r)
+
+    # ── Lookups ───────────────────────────────────────────────────────────────
+    def _candidates(self, hashes: str, order: str, text: str):
+        sorted_hashes, target = self.array(hashes), np.uint64(text_hash(text))
+        lo = int(np.searchsorted(sorted_hashes, target, 'left'))
+        hi = int(np.searchsorted(sorted_hashes, target, 'right'))
+        return [int(r) for r in self.array(order)[lo:hi]]
+
+    def index_of(self, store_id) -> int:
+        """Row number of a store id, or -1."""
+        store_id = str(store_id)
+        for r in self._candidates('id_hash', 'id_order', store_id):
+            if self.id_of(r) == store_id:
+                return r
+        return -1
+
+    def get(self, store_id):
+        r = self.index_of(store_id)
+        return self.row(r) if r >= 0 else None
+
+    def find(self, key: str) -> int:
+        """Row number of the first store whose match_key is key, or -1."""
+        for r in self._candidates('key_hash', 'key_order', key):
+            if match_key(self.row(r)) == key:
+                return r
+        return -1
+
+    def find_all(self, keys) -> np.ndarray:
+        """Row numbers (or -1) for many match keys with one vectorized search."""
+        keys = list(keys)
+        order, sorted_keys = self.array('key_order'), self.array('key_hash')
+        targets = np.array([text_hash(k) for k in keys], dtype=np.uint64)
+        pos = np.minimum(np.searchsorted(sorted_keys, targets), max(len(order) - 1, 0))
+        out = np.full(len(keys), -1, dtype=np.int64)
+        if not len(order):
+            return out
+        hit = sorted_keys[pos] == targets
+        for n in np.flatnonzero(hit):   # confirm, and fall back to the slow path on a hash collision
+            r = int(order[pos[n]])
+            out[n] = r if match_key(self.row(r)) == keys[n] else self.find(keys[n])
+        return out
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or inspect the memory-mapped store table file.')
+    parser.add_argument('command', choices=['build', 'info'])
+    parser.add_argument('path', nargs='?', default=TABLE_FILE)
+    parser.add_argument('--stores', help='read stores from a JSON array instead of Supabase')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if args.stores:
+            with open(args.stores) as f:
+                stores = json.load(f)
+        else:
+            from store_loader import load_stores, supabase_from_env
+            print("📥 Loading stores from Supabase...")
+            stores = load_stores(supabase_from_env(), TABLE_COLUMNS, progress=True)
+        started = time.perf_counter()
+        header = write_store_table(stores, args.path)
+        print(f"✅ {header['rows']} stores, {header['strings']} distinct strings "
+              f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+        print(f"💾 Store table ({os.path.getsize(args.path) / 1e6:.1f} MB) saved to: {args.path}")
+    else:
+        started = time.perf_counter()
+        table = StoreTable.open(args.path)
+        opened = (time.perf_counter() - started) * 1000
+        print(json.dumps({k: v for k, v in table.header.items() if k != 'sections'}, indent=2))
+        print(f"Opened in {opened:.2f}ms", file=sys.stderr)
@@ -0,0 +1,158 @@
+"""
+Store Sheet Validation
+Checks the master store sheet column by column before anything is matched
+or written, and splits it into accepted and rejected rows.
+
+Every text column is cleaned first: blank and NaN cells become '' (never
+the string 'nan'), whitespace is stripped, and whole numbers Excel stored
+as floats ('1234.0') lose the '.0'. Then the rules run over whole columns:
+
+    banner_missing    BANNER is blank
+    address_missing   ADDRESS is blank
+    state_invalid     STATE is not a US state/territory code or name (names become codes)
+    zip_invalid       ZIP is not 5 digits or ZIP+4 (4-digit numeric ZIPs get their leading 0 back)
+    phone_invalid     PHONE is not 10 digits (11 with a leading 1); the phone is cleared, the row kept
+
+Rows failing any rule except phone_invalid are rejected. Rows with neither
+BANNER nor ADDRESS are blank lines and are dropped without a report line.
+
+Usage:
+    from store_validation import validate_sheet, write_rejection_report
+    accepted, rejected = validate_sheet(df)
+    write_rejection_report(accepted, rejected, 'store-reconciliation-rejections.csv')
+
+    python3 store_validation.py sheet.xlsx [--sheet "SCRUBBED TEXAS + WFM US"] [--report rejections.csv]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+TEXT_COLUMNS = ['CHAIN', 'DIVISION', 'BANNER', 'STORE LOCATION NAME', 'STORE',
+                'Store #', 'ADDRESS', 'CITY', 'STATE', 'ZIP', 'METRO', 'PHONE']
+REPORT_COLUMNS = ['sheet_row', 'action', 'reasons', 'BANNER', 'ADDRESS', 'CITY', 'STATE', 'ZIP', 'PHONE']
+WARNINGS = {'phone_invalid'}   # fixed in place instead of rejecting the row
+
+STATE_CODES = {
+    'AL': 'Alabama', 'AK': 'Alaska', 'AZ': 'Arizona', 'AR': 'Arkansas', 'CA': 'California',
+    'CO': 'Colorado', 'CT': 'Connecticut', 'DE': 'Delaware', 'DC': 'District of Columbia',
+    'FL': 'Florida', 'GA': 'Georgia', 'HI': 'Hawaii', 'ID': 'Idaho', 'IL': 'Illinois',
+    'IN': 'Indiana', 'IA': 'Iowa', 'KS': 'Kansas', 'KY': 'Kentucky', 'LA': 'Louisiana',
+    'ME': 'Maine', 'MD': 'Maryland', 'MA': 'Massachusetts', 'MI': 'Michigan', 'MN': 'Minnesota',
+    'MS': 'Mississippi', 'MO': 'Missouri', 'MT': 'Montana', 'NE': 'Nebraska', 'NV': 'Nevada',
+    'NH': 'New Hampshire', 'NJ': 'New Jersey', 'NM': 'New Mexico', 'NY': 'New York',
+    'NC': 'North Carolina', 'ND': 'North Dakota', 'OH': 'Ohio', 'OK': 'Oklahoma', 'OR': 'Oregon',
+    'PA': 'Pennsylvania', 'RI': 'Rhode Island', 'SC': 'South Carolina', 'SD': 'South Dakota',
+    'TN': 'Tennessee', 'TX': 'Texas', 'UT': 'Utah', 'VT': 'Vermont', 'VA': 'Virginia',
+    'WA': 'Washington', 'WV': 'West Virginia', 'WI': 'Wisconsin', 'WY': 'Wyoming',
+    'PR': 'Puerto Rico', 'GU': 'Guam', 'VI': 'Virgin Islands',
+}
+_STATE_LOOKUP = {**{code: code for code in STATE_CODES}, **{name.upper(): code for code, name in STATE_CODES.items()}}
+_NULLS = ['NAN', 'NONE', 'NULL', 'N/A', 'NA', '#N/A', '-']
+
+try:   # Arrow-backed strings run the column rules in C; plain 'string' is the fallback
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = 'string[pyarrow]'
+except ImportError:
+    TEXT_DTYPE = 'string'
+
+
+# ── Cleaning ──────────────────────────────────────────────────────────────────
+def clean_text(col: pd.Series) -> pd.Series:
+    """Strings with NaN/None/'nan' as '', stripped, and '1234.0' as '1234'."""
+    out = col.astype(TEXT_DTYPE).fillna('').str.strip()
+    out = out.str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+    return out.mask(out.str.upper().isin(_NULLS), '')
+
+
+def clean_sheet(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.copy()
+    for col in TEXT_COLUMNS:
+        out[col] = clean_text(df[col]) if col in df.columns else ''
+    return out
+
+
+# ── Rules ─────────────────────────────────────────────────────────────────────
+def _zip_column(raw: pd.Series, cleaned: pd.Series) -> pd.Series:
+    """ZIP5 or ZIP+4 as text; numeric cells that lost a leading zero get it back."""
+    numeric = pd.to_numeric(raw, errors='coerce').notna()
+    short = numeric & cleaned.str.fullmatch(r'\d{3,4}')
+    return cleaned.where(~short, cleaned.str.zfill(5))
+
+
+def validate_sheet(df: pd.DataFrame) -> tuple:
+    """
+    (accepted, rejected) frames. accepted has cleaned text columns, STATE as
+    a two-letter code and a reasons column (phone warnings); rejected keeps
+    the cleaned values plus sheet_row and reasons. Both keep df's index.
+    """
+    clean = clean_sheet(df)
+    blank = (clean['BANNER'] == '') & (clean['ADDRESS'] == '')
+    clean = clean[~blank]
+    raw = df.loc[clean.index]
+
+    state = clean['STATE'].str.upper().str.replace('.', '', regex=False).map(_STATE_LOOKUP)
+    zip_code = _zip_column(raw['ZIP'] if 'ZIP' in raw else clean['ZIP'], clean['ZIP'])
+    phone_digits = clean['PHONE'].str.replace(r'\D', '', regex=True)
+    phone_digits = phone_digits.where(~((phone_digits.str.len() == 11) & phone_digits.str.startswith('1')),
+                                      phone_digits.str[1:])
+
+    checks = {
+        'banner_missing':  clean['BANNER'] == '',
+        'address_missing': clean['ADDRESS'] == '',
+        'state_invalid':   state.isna(),
+        'zip_invalid':     ~zip_code.str.fullmatch(r'\d{5}(-?\d{4})?'),
+        'phone_invalid':   (clean['PHONE'] != '') & (phone_digits.str.len() != 10),
+    }
+    names = np.array(list(checks))
+    failed = np.column_stack([checks[n].to_numpy(dtype=bool) for n in names])
+    codes = failed @ (1 << np.arange(len(names)))   # one bit per rule; few distinct combinations
+    labels = {code: ';'.join(names[[code >> i & 1 == 1 for i in range(len(names))]]) for code in np.unique(codes)}
+    reasons = pd.Series(codes, index=clean.index).map(labels)
+    reject = failed[:, [n not in WARNINGS for n in names]].any(axis=1)
+
+    clean = clean.assign(STATE=state.fillna(clean['STATE']), ZIP=zip_code,
+                         PHONE=clean['PHONE'].where(~checks['phone_invalid'], ''), reasons=reasons)
+    clean = clean.astype({col: object for col in TEXT_COLUMNS})
+    clean.insert(0, 'sheet_row', clean.index + 2)   # header is sheet row 1
+    return clean[~reject], clean[reject]
+
+
+def write_rejection_report(accepted: pd.DataFrame, rejected: pd.DataFrame, path: str) -> int:
+    """CSV of rejected rows and of accepted rows that were cleaned; returns the number of lines."""
+    cleaned = accepted[accepted['reasons'] != '']
+    report = pd.concat([rejected.assign(action='rejected'), cleaned.assign(action='cleaned')])
+    report = report.sort_values('sheet_row')[REPORT_COLUMNS]
+    report.to_csv(path, index=False)
+    return len(report)
+
+
+def summarize(rejected: pd.DataFrame) -> dict:
+    """{reason: rows} over rejected rows; warnings (WARNINGS) on those rows are not reasons."""
+    if not len(rejected):
+        return {}
+    reasons = rejected['reasons'].str.split(';').explode()
+    return reasons[~reasons.isin(WARNINGS)].value_counts().to_dict()
+
+
+# ── CLI entry point ────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Validate a store sheet and write a rejection report.')
+    parser.add_argument('sheet', help='.xlsx or .csv')
+    parser.add_argument('--sheet', dest='sheet_name', default='SCRUBBED TEXAS + WFM US')
+    parser.add_argument('--report', default='store-reconciliation-rejections.csv')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.sheet, dtype=object) if args.sheet.endswith('.csv') \
+        else pd.read_excel(args.sheet, sheet_name=args.sheet_name)
+    started = time.perf_counter()
+    accepted, rejected = validate_sheet(df)
+    elapsed = (time.perf_counter() - started) * 1000
+    lines = write_rejection_report(accepted, rejected, args.report)
+    print(f"✅ {len(accepted)} rows accepted, {len(rejected)} rejected in {elapsed:.0f}ms", file=sys.stderr)
+    for reason, n in sorted(summarize(rejected).items()):
+        print(f"   {reason}: {n}", file=sys.stderr)
+    print(f"💾 Rejection report ({lines} rows) saved to: {args.report}", file=sys.stderr)
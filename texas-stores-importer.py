@@ -2,12 +2,83 @@
 """
 Texas Stores Data Importer
 This script helps import the complete Texas stores dataset from Google Sheets
+
+The generated SQL upserts straight into stores on the stores_unique_norm
+index (banner_id, street_norm, city_norm, state, zip5). street_norm,
+city_norm and zip5 are what normalize_store_trigger
+(enhanced-store-matching.sql) writes on every insert and update, so each
+statement computes them with the trigger's own SQL expressions and keeps
+one row per key (row_number) before the ON CONFLICT. banner_id comes from
+an alias,banner_id CSV, e.g. exported with:
+
+    \copy (SELECT alias, banner_id FROM retailer_banner_aliases) TO 'banner-aliases.csv' CSV HEADER
+
+The same rules are mirrored in Python (db_street_norm etc.) to drop sheet
+duplicates and report them; rows are sent in batches of BATCH_SIZE, so a
+full Texas load is a handful of indexed merges and re-running it only
+touches rows that changed. Rows with an unknown banner, no address or no
+ZIP5 are listed in the SQL header and left out.
+
+Usage:
+    python3 texas-stores-importer.py --aliases banner-aliases.csv [--csv texas.csv] [--batch-size 500]
 """
 
+import argparse
 import csv
-import json
+import io
+import os
+import re
+import sys
 import requests
-from typing import List, Dict
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stores'))
+import store_loader
+
+BATCH_SIZE     = 500
+KEY_COLUMNS    = ['banner_id', 'street_norm', 'city_norm', 'state', 'zip5']   # stores_unique_norm
+VALUE_COLUMNS  = ['banner_id', 'state', 'name', 'STORE', 'banner', 'store_chain', 'address', 'city', 'zip_code',
+                  'metro', 'phone', 'store_number', 'is_active']
+INSERT_COLUMNS = KEY_COLUMNS + [c for c in VALUE_COLUMNS if c not in KEY_COLUMNS]
+UPDATE_COLUMNS = ['banner', 'store_chain', 'address', 'city', 'zip_code', 'metro', 'phone',
+                  'store_number', 'is_active']   # display names (name, STORE) are kept, as in the reconciliation import
+
+# normalize_store_data() in enhanced-store-matching.sql, applied in this order
+STREET_RULES = [
+    (r'\b(rd|road)\b', 'road'),
+    (r'\b(st|street)\b', 'street'),
+    (r'\b(ave|avenue)\b', 'avenue'),
+    (r'\b(blvd|boulevard)\b', 'boulevard'),
+    (r'\b(ste|suite)\s*#?\d*', ''),
+]
+
+def _pg_regexp_replace(text: str, pattern: str, replacement: str) -> str:
+    """regexp_replace(text, pattern, replacement, 'gi') as Postgres runs it"""
+    # In Postgres regexes \b is a backspace (\y is the word boundary), so these rules rarely fire
+    return re.sub(pattern.replace(r'\b', '\x08'), replacement, text, flags=re.IGNORECASE)
+
+def db_street_norm(address: str) -> str:
+    for pattern, replacement in STREET_RULES:
+        address = _pg_regexp_replace(address, pattern, replacement)
+    return address.lower()
+
+def db_city_norm(city: str) -> str:
+    return city.strip(' ').lower()
+
+def db_zip5(zip_code: str) -> str:
+    match = re.search(r'\d{5}', zip_code)
+    return match.group(0) if match else ''
+
+def sql_key_expressions(alias: str) -> Dict[str, str]:
+    """SQL for street_norm, city_norm and zip5 over the alias's address, city and zip_code"""
+    street = f'{alias}.address'
+    for pattern, replacement in STREET_RULES:
+        street = f"regexp_replace({street}, '{pattern}', '{replacement}', 'gi')"
+    return {
+        'street_norm': f'lower({street})',
+        'city_norm':   f'lower(trim({alias}.city))',
+        'zip5':        f"substring({alias}.zip_code, '\\d{{5}}')",
+    }
 
 def download_google_sheet_as_csv(sheet_id: str, gid: str = "0") -> str:
     """
@@ -23,108 +94,125 @@ def download_google_sheet_as_csv(sheet_id: str, gid: str = "0") -> str:
         print(f"Error downloading sheet: {e}")
         return ""
 
-def parse_csv_to_sql(csv_content: str) -> str:
+def load_banner_aliases(path: str) -> Dict[str, str]:
+    """
+    alias,banner_id CSV (an export of retailer_banner_aliases) -> {normalized alias: banner_id}
+    """
+    aliases = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            alias = store_loader.normalize_banner(row.get('alias'))
+            if alias and row.get('banner_id'):
+                aliases[alias] = row['banner_id'].strip()
+    return aliases
+
+def sql_literal(value) -> str:
+    """Quote a value for a SQL VALUES list ('' and None become NULL)"""
+    if value is None or value == '':
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return "'" + str(value).replace("'", "''") + "'"
+
+def store_rows(csv_content: str, aliases: Dict[str, str], state: str = 'TX') -> Dict:
     """
-    Convert CSV content to SQL INSERT statements
+    Parse the sheet (chain, division, banner, store_name, store_number, address,
+    city, state, zip, metro, country, phone, ...) into stores rows keyed the way
+    the stores_unique_norm index is: (banner_id, street_norm, city_norm, state, zip5),
+    with street_norm, city_norm and zip5 as the database's trigger computes them.
+
+    Returns {'rows': [...], 'duplicates': n, 'skipped': [(line, reason)]}.
     """
-    lines = csv_content.strip().split('\n')
-    if len(lines) < 2:
+    reader = csv.reader(io.StringIO(csv_content))
+    next(reader, None)  # header
+    rows, seen, duplicates, skipped = [], set(), 0, []
+    for line, values in enumerate(reader, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        values = [v.strip() for v in values] + [''] * (12 - len(values))
+        chain, _, banner, store_name, store_number, address, city, st, zip_code, metro, _, phone = values[:12]
+        row_state = store_loader.normalize_state(st)
+        if state and row_state != state:
+            continue
+        key = (
+            aliases.get(store_loader.normalize_banner(banner)),
+            db_street_norm(address),
+            db_city_norm(city),
+            row_state,
+            db_zip5(zip_code),
+        )
+        missing = [name for name, part in zip(KEY_COLUMNS, key) if not part]
+        if missing:
+            # NULL key parts are outside the partial unique index, so these would duplicate on every run
+            skipped.append((line, f"missing {', '.join(missing)}" + (f" (banner '{banner}')" if not key[0] else '')))
+            continue
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        name = store_name or banner or 'Unknown Store'
+        rows.append(dict(zip(KEY_COLUMNS, key), line=line, **{
+            'name': name, 'STORE': name, 'banner': banner, 'store_chain': chain,
+            'address': address, 'city': city, 'zip_code': zip_code, 'metro': metro,
+            'phone': phone, 'store_number': store_number, 'is_active': True,
+        }))
+    return {'rows': rows, 'duplicates': duplicates, 'skipped': skipped}
+
+def parse_csv_to_sql(csv_content: str, aliases: Dict[str, str], batch_size: int = BATCH_SIZE) -> str:
+    """
+    Convert CSV content to batched upserts on the stores_unique_norm index.
+
+    Each statement computes the key columns with the trigger's expressions,
+    keeps the first sheet row per key (so no statement touches a row twice)
+    and merges with one indexed ON CONFLICT; rows whose other columns are
+    unchanged are not rewritten, so re-running the same file is close to a
+    no-op.
+    """
+    parsed = store_rows(csv_content, aliases)
+    rows = parsed['rows']
+    if not rows:
         return "-- No data found"
     
-    # Skip header row
-    data_lines = lines[1:]
-    
     sql_statements = []
     sql_statements.append("-- Texas Stores Import (Generated from Google Sheets)")
     sql_statements.append("-- Data source: https://docs.google.com/spreadsheets/d/18E6OfiZ4ikihL8jL98SdKlbyruBHkZPbZJ9QJ7VPCfU/edit?usp=sharing")
+    sql_statements.append(f"-- {len(rows)} stores in {(len(rows) + batch_size - 1) // batch_size} statements; "
+                          f"{parsed['duplicates']} duplicate rows dropped, {len(parsed['skipped'])} rows skipped")
+    for line, reason in parsed['skipped']:
+        sql_statements.append(f"--   skipped sheet line {line}: {reason}")
     sql_statements.append("")
-    sql_statements.append("-- Create temporary table for import")
-    sql_statements.append("CREATE TEMP TABLE temp_texas_stores (")
-    sql_statements.append("    chain VARCHAR(100),")
-    sql_statements.append("    division VARCHAR(100),")
-    sql_statements.append("    banner VARCHAR(100),")
-    sql_statements.append("    store_name VARCHAR(200),")
-    sql_statements.append("    store_number VARCHAR(50),")
-    sql_statements.append("    address VARCHAR(500),")
-    sql_statements.append("    city VARCHAR(100),")
-    sql_statements.append("    state VARCHAR(10),")
-    sql_statements.append("    zip VARCHAR(20),")
-    sql_statements.append("    metro VARCHAR(200),")
-    sql_statements.append("    country VARCHAR(10),")
-    sql_statements.append("    phone VARCHAR(20),")
-    sql_statements.append("    state_norm VARCHAR(10)")
-    sql_statements.append(");")
-    sql_statements.append("")
-    
-    # Add INSERT statements
-    sql_statements.append("-- Insert all Texas stores")
-    sql_statements.append("INSERT INTO temp_texas_stores VALUES")
-    
-    for i, line in enumerate(data_lines):
-        if not line.strip():
-            continue
-            
-        # Parse CSV line (handle commas in values)
-        reader = csv.reader([line])
-        row = next(reader)
-        
-        # Ensure we have enough columns
-        while len(row) < 13:
-            row.append('')
-        
-        # Escape single quotes in values
-        escaped_row = []
-        for value in row:
-            if value is None:
-                escaped_row.append('')
-            else:
-                escaped_row.append(str(value).replace("'", "''"))
-        
-        # Create VALUES clause
-        values_clause = f"('{escaped_row[0]}', '{escaped_row[1]}', '{escaped_row[2]}', '{escaped_row[3]}', '{escaped_row[4]}', '{escaped_row[5]}', '{escaped_row[6]}', '{escaped_row[7]}', '{escaped_row[8]}', '{escaped_row[9]}', '{escaped_row[10]}', '{escaped_row[11]}', '{escaped_row[12]}')"
-        
-        if i < len(data_lines) - 1:
-            values_clause += ","
-        else:
-            values_clause += ";"
-        
-        sql_statements.append(values_clause)
     
+    quote = lambda c: f'"{c}"' if c != c.lower() else c
+    columns = ', '.join(quote(c) for c in INSERT_COLUMNS)
+    keys = sql_key_expressions('v')
+    partition = ', '.join(keys.get(c, f'v.{c}') for c in KEY_COLUMNS)
+    value_columns = ', '.join(['line'] + [quote(c) for c in VALUE_COLUMNS])
+    updates = ',\n    '.join(f"{c} = EXCLUDED.{c}" for c in UPDATE_COLUMNS)
+    changed = ', '.join(f"stores.{c}" for c in UPDATE_COLUMNS)
+    excluded = ', '.join(f"EXCLUDED.{c}" for c in UPDATE_COLUMNS)
+    sql_statements.append("BEGIN;")
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        sql_statements.append("")
+        sql_statements.append(f"INSERT INTO stores ({columns}, created_at, updated_at)")
+        sql_statements.append(f"SELECT {columns}, NOW(), NOW() FROM (")
+        sql_statements.append("    SELECT v.*, " + ', '.join(f'{expr} AS {c}' for c, expr in keys.items()) + ",")
+        sql_statements.append(f"           row_number() OVER (PARTITION BY {partition} ORDER BY v.line) AS n")
+        sql_statements.append("    FROM (VALUES")
+        sql_statements.append(',\n'.join(
+            '(' + ', '.join([str(row['line'])] + [sql_literal(row[c]) + ('::uuid' if c == 'banner_id' else '')
+                                                  for c in VALUE_COLUMNS]) + ')' for row in batch))
+        sql_statements.append(f"    ) AS v ({value_columns})")
+        sql_statements.append(") AS s")
+        sql_statements.append("WHERE n = 1")
+        sql_statements.append(f"ON CONFLICT ({', '.join(KEY_COLUMNS)})")
+        sql_statements.append(f"WHERE {' AND '.join(f'{c} IS NOT NULL' for c in KEY_COLUMNS)}")
+        sql_statements.append("DO UPDATE SET")
+        sql_statements.append(f"    {updates},")
+        sql_statements.append("    updated_at = NOW()")
+        sql_statements.append(f"WHERE ({changed}) IS DISTINCT FROM ({excluded});")
     sql_statements.append("")
-    sql_statements.append("-- Insert into stores table")
-    sql_statements.append("INSERT INTO stores (")
-    sql_statements.append("    name,")
-    sql_statements.append("    address,")
-    sql_statements.append("    city,")
-    sql_statements.append("    state,")
-    sql_statements.append("    zip_code,")
-    sql_statements.append("    phone,")
-    sql_statements.append("    is_active,")
-    sql_statements.append("    created_at,")
-    sql_statements.append("    updated_at")
-    sql_statements.append(")")
-    sql_statements.append("SELECT ")
-    sql_statements.append("    CASE ")
-    sql_statements.append("        WHEN store_name IS NOT NULL AND store_name != '' THEN store_name")
-    sql_statements.append("        WHEN banner IS NOT NULL AND banner != '' THEN banner")
-    sql_statements.append("        ELSE 'Unknown Store'")
-    sql_statements.append("    END as name,")
-    sql_statements.append("    address,")
-    sql_statements.append("    city,")
-    sql_statements.append("    state,")
-    sql_statements.append("    zip,")
-    sql_statements.append("    phone,")
-    sql_statements.append("    true as is_active,")
-    sql_statements.append("    NOW() as created_at,")
-    sql_statements.append("    NOW() as updated_at")
-    sql_statements.append("FROM temp_texas_stores")
-    sql_statements.append("WHERE state = 'TX'")
-    sql_statements.append("ON CONFLICT (name, address) DO UPDATE SET")
-    sql_statements.append("    phone = EXCLUDED.phone,")
-    sql_statements.append("    updated_at = NOW();")
-    sql_statements.append("")
-    sql_statements.append("-- Clean up")
-    sql_statements.append("DROP TABLE temp_texas_stores;")
+    sql_statements.append("COMMIT;")
     
     return '\n'.join(sql_statements)
 
@@ -132,26 +220,45 @@ def main():
     """
     Main function to download and convert the Texas stores data
     """
+    parser = argparse.ArgumentParser(description='Convert the Texas stores sheet to batched stores upserts.')
+    parser.add_argument('--aliases', default='banner-aliases.csv', help='alias,banner_id CSV')
+    parser.add_argument('--csv', default=None, help='read the sheet from this CSV instead of Google Sheets')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows per INSERT statement')
+    parser.add_argument('--output', default='texas-stores-complete-import.sql')
+    args = parser.parse_args()
+    
     print("🏪 Texas Stores Data Importer")
     print("=" * 50)
     
-    # Google Sheet ID from your URL
-    sheet_id = "18E6OfiZ4ikihL8jL98SdKlbyruBHkZPbZJ9QJ7VPCfU"
+    if not os.path.exists(args.aliases):
+        print(f"❌ Banner alias file not found: {args.aliases}")
+        print("   Export it with: \\copy (SELECT alias, banner_id FROM retailer_banner_aliases) "
+              "TO 'banner-aliases.csv' CSV HEADER")
+        return
+    aliases = load_banner_aliases(args.aliases)
+    print(f"✅ Loaded {len(aliases)} banner aliases")
     
-    print(f"📥 Downloading data from Google Sheet...")
-    csv_content = download_google_sheet_as_csv(sheet_id)
+    if args.csv:
+        with open(args.csv, newline='') as f:
+            csv_content = f.read()
+    else:
+        # Google Sheet ID from your URL
+        sheet_id = "18E6OfiZ4ikihL8jL98SdKlbyruBHkZPbZJ9QJ7VPCfU"
+        
+        print(f"📥 Downloading data from Google Sheet...")
+        csv_content = download_google_sheet_as_csv(sheet_id)
     
     if not csv_content:
         print("❌ Failed to download data")
         return
     
-    print(f"✅ Downloaded {len(csv_content.split())} lines of data")
+    print(f"✅ Downloaded {len(csv_content.splitlines())} lines of data")
     
     print("🔄 Converting to SQL...")
-    sql_content = parse_csv_to_sql(csv_content)
+    sql_content = parse_csv_to_sql(csv_content, aliases, args.batch_size)
     
     # Save to file
-    output_file = "texas-stores-complete-import.sql"
+    output_file = args.output
     with open(output_file, 'w') as f:
         f.write(sql_content)
     
@@ -160,8 +267,8 @@ def main():
     print("")
     print("Next steps:")
     print("1. Open Supabase SQL Editor")
-    print("2. Copy and paste the contents of texas-stores-complete-import.sql")
-    print("3. Run the script")
+    print(f"2. Copy and paste the contents of {output_file}")
+    print("3. Run the script (check the header for skipped rows)")
     print("4. Verify the import with: SELECT COUNT(*) FROM stores WHERE state = 'TX';")
 
 if __name__ == "__main__":